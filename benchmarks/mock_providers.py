@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""
+🔱 TCC - Proveedores simulados para benchmarks
+Servidor HTTP local que imita las APIs de Anthropic, OpenAI y Gemini (mismas rutas,
+mismos formatos de respuesta, streaming SSE y uso de tokens) con latencia, tasa de
+errores, largo de respuesta y ritmo de streaming configurables. El tiempo de generación
+(chunks × chunk_delay) se cobra igual con o sin streaming, como en las APIs reales.
+Determinista: la latencia y los errores de cada request salen de un RNG sembrado con
+(semilla, proveedor, prompt, intento), así que dos corridas con la misma carga ven las
+mismas respuestas.
+
+También imita las APIs de batch (Anthropic Message Batches; OpenAI Files + Batch): un
+job termina tras `batch_polls` consultas de estado y sus resultados salen del mismo plan
+que un request en vivo. `drop_results` corta a la mitad las primeras N descargas de
+resultados, para ejercitar el volcado al-menos-una-vez.
+
+Uso: python benchmarks/mock_providers.py [--profile realistic] [--port 8765]
+     y apuntar TRINITY_ANTHROPIC_URL / TRINITY_OPENAI_URL / TRINITY_GEMINI_URL a él.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+# Perfiles de comportamiento. latency: (distribución, parámetros en segundos) hasta el
+#   primer byte; fixed: (s,) | uniform: (min, max) | lognormal: (mediana, sigma)
+# reply_chars: largo de cada respuesta (0 = la respuesta fija tal cual)
+PROFILES = {
+    'instant': {'latency': ('fixed', (0.0,)), 'error_rate': 0.0, 'reply_chars': 0,
+                'chunks': 4, 'chunk_delay': 0.0},
+    'fast': {'latency': ('uniform', (0.005, 0.02)), 'error_rate': 0.0, 'reply_chars': 0,
+             'chunks': 4, 'chunk_delay': 0.002},
+    'realistic': {'latency': ('lognormal', (0.05, 0.5)), 'error_rate': 0.01, 'reply_chars': 2000,
+                  'chunks': 20, 'chunk_delay': 0.02},
+    'flaky': {'latency': ('lognormal', (0.05, 0.8)), 'error_rate': 0.10, 'reply_chars': 2000,
+              'chunks': 20, 'chunk_delay': 0.02}
+}
+DEFAULT_PROFILE = 'fast'
+# Comportamiento de las APIs de batch (igual para todos los perfiles)
+BATCH_DEFAULTS = {'batch_polls': 2, 'drop_results': 0}
+
+# Multiplicador de latencia por proveedor (para que race/hedged tengan algo que decidir)
+PROVIDER_SPEED = {'claude': 1.0, 'codex': 0.7, 'gemini': 1.3}
+# Status de las fallas simuladas, en orden de aparición
+ERROR_STATUSES = (500, 503, 429)
+MAX_LATENCY = 30.0
+
+# Respuestas fijas; algunas disparan la extracción de aprendizajes (import / optimize / error)
+REPLIES = [
+    "Use a connection pool and optimize the hot path before adding caching.",
+    "import asyncio\n\nasync def main():\n    await asyncio.sleep(0)",
+    "The error comes from a missing await; handle the exception at the boundary.",
+    "Split the work into independent steps so they can run concurrently.",
+    "Measure first: the latency is dominated by the network round-trip."
+]
+
+
+class MockProviders:
+    """
+    Servidor de proveedores simulados. start() lo levanta en un thread propio (con su
+    event loop) y devuelve la URL base; stop() lo detiene. stats() cuenta requests,
+    errores inyectados y streams por proveedor.
+    """
+
+    def __init__(self, profile: str = DEFAULT_PROFILE, seed: int = 0,
+                 host: str = '127.0.0.1', port: int = 0, **overrides):
+        self.profile = {**BATCH_DEFAULTS, **PROFILES[profile],
+                        **{k: v for k, v in overrides.items() if v is not None}}
+        self.seed = seed
+        self.host = host
+        self.port = port
+        self.attempts: Dict[Tuple[str, str], int] = {}
+        self.counters: Dict[str, Dict[str, int]] = {}
+        self.batches: Dict[str, Dict] = {}
+        self.files: Dict[str, bytes] = {}
+        self.dropped = 0
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.runner: Optional[web.AppRunner] = None
+        self.thread: Optional[threading.Thread] = None
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post('/v1/messages', self.handle_claude)
+        app.router.add_post('/v1/chat/completions', self.handle_openai)
+        app.router.add_post('/v1beta/models/{model}', self.handle_gemini)
+        app.router.add_post('/v1/messages/batches', self.handle_claude_batch_create)
+        app.router.add_get('/v1/messages/batches/{id}', self.handle_claude_batch)
+        app.router.add_get('/v1/messages/batches/{id}/results', self.handle_claude_batch_results)
+        app.router.add_post('/v1/files', self.handle_file_upload)
+        app.router.add_get('/v1/files/{id}/content', self.handle_file_content)
+        app.router.add_post('/v1/batches', self.handle_openai_batch_create)
+        app.router.add_get('/v1/batches/{id}', self.handle_openai_batch)
+        return app
+
+    # ---- comportamiento determinista ----
+
+    def plan(self, provider: str, prompt: str) -> Dict:
+        """Latencia, error y respuesta de este request (reintentar el mismo prompt avanza el intento)"""
+        key = (provider, prompt)
+        attempt = self.attempts.get(key, 0)
+        self.attempts[key] = attempt + 1
+        digest = hashlib.sha256(f"{self.seed}:{provider}:{attempt}:{prompt}".encode()).digest()
+        rng = random.Random(digest)
+
+        kind, params = self.profile['latency']
+        if kind == 'fixed':
+            latency = params[0]
+        elif kind == 'uniform':
+            latency = rng.uniform(*params)
+        elif kind == 'lognormal':
+            median, sigma = params
+            latency = rng.lognormvariate(0, sigma) * median
+        else:
+            raise ValueError(f"unknown latency distribution: {kind}")
+
+        counters = self.counters.setdefault(provider, {'requests': 0, 'errors': 0, 'streams': 0,
+                                                       'batches': 0})
+        counters['requests'] += 1
+        error = None
+        if rng.random() < self.profile['error_rate']:
+            error = ERROR_STATUSES[counters['errors'] % len(ERROR_STATUSES)]
+            counters['errors'] += 1
+        reply = REPLIES[digest[0] % len(REPLIES)]
+        if self.profile['reply_chars']:
+            reply = ((reply + " ") * (self.profile['reply_chars'] // (len(reply) + 1) + 1))[:self.profile['reply_chars']]
+        return {
+            'latency': min(latency * PROVIDER_SPEED.get(provider, 1.0), MAX_LATENCY),
+            'error': error,
+            'reply': reply,
+            'input_tokens': max(1, len(prompt) // 4)
+        }
+
+    def chunks(self, reply: str):
+        """La respuesta partida en profile['chunks'] fragmentos"""
+        count = max(1, self.profile['chunks'])
+        size = -(-len(reply) // count)
+        return [reply[i:i + size] for i in range(0, len(reply), size)]
+
+    async def respond(self, request: web.Request, provider: str, prompt: str, stream: bool,
+                      full, event, first=None, final=None):
+        """Esperar la latencia del plan y responder completo, en streaming o con un error"""
+        plan = self.plan(provider, prompt)
+        await asyncio.sleep(plan['latency'])
+        if plan['error']:
+            return web.json_response({'error': {'message': f"simulated {plan['error']}"}},
+                                     status=plan['error'])
+        output_tokens = max(1, len(plan['reply']) // 4)
+        if not stream:
+            # Sin streaming la respuesta llega recién cuando terminó de generarse
+            pieces = len(self.chunks(plan['reply']))
+            if self.profile['chunk_delay']:
+                await asyncio.sleep(self.profile['chunk_delay'] * pieces)
+            return web.json_response(full(plan['reply'], plan['input_tokens'], output_tokens))
+
+        self.counters[provider]['streams'] += 1
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+        try:
+            for line in (first(plan['input_tokens']) if first else []):
+                await response.write(f"data: {line}\n\n".encode())
+            for piece in self.chunks(plan['reply']):
+                await response.write(f"data: {json.dumps(event(piece, plan['input_tokens']))}\n\n".encode())
+                if self.profile['chunk_delay']:
+                    await asyncio.sleep(self.profile['chunk_delay'])
+            for line in (final(plan['input_tokens'], output_tokens) if final else []):
+                await response.write(f"data: {line}\n\n".encode())
+            await response.write_eof()
+        except ConnectionResetError:
+            pass  # el cliente cortó el stream (race, hedged, pipelined cancelan llamadas)
+        return response
+
+    # ---- rutas de cada API ----
+
+    async def handle_claude(self, request: web.Request):
+        body = await request.json()
+        prompt = body['messages'][-1]['content']
+        return await self.respond(
+            request, 'claude', prompt, body.get('stream', False),
+            full=claude_message,
+            event=lambda text, tin: {'type': 'content_block_delta',
+                                     'delta': {'type': 'text_delta', 'text': text}},
+            first=lambda tin: [
+                json.dumps({'type': 'message_start', 'message': {'usage': {'input_tokens': tin, 'output_tokens': 1}}})
+            ],
+            final=lambda tin, tout: [
+                json.dumps({'type': 'message_delta', 'usage': {'output_tokens': tout}}),
+                json.dumps({'type': 'message_stop'})
+            ]
+        )
+
+    async def handle_openai(self, request: web.Request):
+        body = await request.json()
+        prompt = body['messages'][-1]['content']
+        include_usage = body.get('stream_options', {}).get('include_usage')
+
+        def final(tin, tout):
+            usage = [json.dumps({'choices': [], 'usage': {'prompt_tokens': tin, 'completion_tokens': tout}})]
+            return (usage if include_usage else []) + ['[DONE]']
+
+        return await self.respond(
+            request, 'codex', prompt, body.get('stream', False),
+            full=openai_completion,
+            event=lambda text, tin: {'choices': [{'delta': {'content': text}}]},
+            final=final
+        )
+
+    async def handle_gemini(self, request: web.Request):
+        body = await request.json()
+        prompt = body['contents'][-1]['parts'][0]['text']
+
+        def payload(text, tin, tout=None):
+            data = {'candidates': [{'content': {'parts': [{'text': text}]}}]}
+            data['usageMetadata'] = {'promptTokenCount': tin, 'candidatesTokenCount': tout or 1}
+            return data
+
+        return await self.respond(
+            request, 'gemini', prompt, 'streamGenerateContent' in request.path,
+            full=payload, event=payload
+        )
+
+    # ---- APIs de batch ----
+
+    def create_batch(self, provider: str, requests: List[Tuple[str, str]]) -> str:
+        """Registrar un job con sus (custom_id, prompt); los resultados se deciden ya"""
+        batch_id = f"batch_{len(self.batches) + 1:06d}"
+        self.batches[batch_id] = {
+            'provider': provider,
+            'results': [(custom_id, self.plan(provider, prompt)) for custom_id, prompt in requests],
+            'polls': 0
+        }
+        self.counters[provider]['batches'] += 1
+        return batch_id
+
+    def poll_batch(self, batch_id: str) -> Dict:
+        """Job por id (404 si no existe); termina tras profile['batch_polls'] consultas"""
+        job = self.batches.get(batch_id)
+        if job is None:
+            raise web.HTTPNotFound(text=json.dumps({'error': {'message': 'batch not found'}}),
+                                   content_type='application/json')
+        job['polls'] += 1
+        job['ended'] = job['polls'] > self.profile['batch_polls']
+        return job
+
+    async def send_jsonl(self, request: web.Request, lines: List[Dict]) -> web.StreamResponse:
+        """Resultados en JSONL; las primeras profile['drop_results'] descargas se cortan a la mitad"""
+        drop = self.dropped < self.profile['drop_results']
+        if drop:
+            self.dropped += 1
+        response = web.StreamResponse(headers={'Content-Type': 'application/jsonl'})
+        await response.prepare(request)
+        for index, line in enumerate(lines):
+            if drop and index == len(lines) // 2:
+                request.transport.close()  # conexión caída a mitad de la descarga
+                return response
+            await response.write((json.dumps(line) + "\n").encode())
+        await response.write_eof()
+        return response
+
+    async def handle_claude_batch_create(self, request: web.Request):
+        body = await request.json()
+        batch_id = self.create_batch('claude', [(item['custom_id'], item['params']['messages'][-1]['content'])
+                                                for item in body['requests']])
+        return web.json_response({'id': batch_id, 'type': 'message_batch',
+                                  'processing_status': 'in_progress', 'results_url': None})
+
+    async def handle_claude_batch(self, request: web.Request):
+        job = self.poll_batch(request.match_info['id'])
+        data = {'id': request.match_info['id'], 'type': 'message_batch',
+                'processing_status': 'ended' if job['ended'] else 'in_progress', 'results_url': None}
+        if job['ended']:
+            data['results_url'] = f"{self.url}/v1/messages/batches/{data['id']}/results"
+        return web.json_response(data)
+
+    async def handle_claude_batch_results(self, request: web.Request):
+        job = self.batches.get(request.match_info['id'])
+        if job is None or not job.get('ended'):
+            return web.json_response({'error': {'message': 'results not available'}}, status=404)
+        lines = []
+        for custom_id, plan in job['results']:
+            if plan['error']:
+                result = {'type': 'errored',
+                          'error': {'type': 'api_error', 'message': f"simulated {plan['error']}"}}
+            else:
+                result = {'type': 'succeeded', 'message': claude_message(
+                    plan['reply'], plan['input_tokens'], max(1, len(plan['reply']) // 4))}
+            lines.append({'custom_id': custom_id, 'result': result})
+        return await self.send_jsonl(request, lines)
+
+    async def handle_file_upload(self, request: web.Request):
+        form = await request.post()
+        file_id = f"file-{len(self.files) + 1:06d}"
+        self.files[file_id] = form['file'].file.read()
+        return web.json_response({'id': file_id, 'object': 'file', 'purpose': form.get('purpose')})
+
+    async def handle_file_content(self, request: web.Request):
+        content = self.files.get(request.match_info['id'])
+        if content is None:
+            return web.json_response({'error': {'message': 'file not found'}}, status=404)
+        return await self.send_jsonl(request, [json.loads(line) for line in content.splitlines() if line.strip()])
+
+    async def handle_openai_batch_create(self, request: web.Request):
+        body = await request.json()
+        content = self.files.get(body.get('input_file_id'))
+        if content is None:
+            return web.json_response({'error': {'message': 'input file not found'}}, status=400)
+        requests = [json.loads(line) for line in content.splitlines() if line.strip()]
+        batch_id = self.create_batch('codex', [(item['custom_id'], item['body']['messages'][-1]['content'])
+                                               for item in requests])
+        return web.json_response({'id': batch_id, 'object': 'batch', 'status': 'validating'})
+
+    async def handle_openai_batch(self, request: web.Request):
+        batch_id = request.match_info['id']
+        job = self.poll_batch(batch_id)
+        data = {'id': batch_id, 'object': 'batch', 'status': 'in_progress',
+                'output_file_id': None, 'error_file_id': None}
+        if job['ended']:
+            output, errors = [], []
+            for custom_id, plan in job['results']:
+                if plan['error']:
+                    errors.append({'custom_id': custom_id, 'response': {
+                        'status_code': plan['error'],
+                        'body': {'error': {'message': f"simulated {plan['error']}"}}}})
+                else:
+                    output.append({'custom_id': custom_id, 'response': {
+                        'status_code': 200, 'body': openai_completion(
+                            plan['reply'], plan['input_tokens'], max(1, len(plan['reply']) // 4))}})
+            data['status'] = 'completed'
+            for field, lines in (('output_file_id', output), ('error_file_id', errors)):
+                if lines:
+                    data[field] = f"file-{batch_id}-{field.split('_')[0]}"
+                    self.files[data[field]] = "\n".join(json.dumps(line) for line in lines).encode()
+        return web.json_response(data)
+
+    # ---- ciclo de vida ----
+
+    def start(self) -> str:
+        """Levantar el servidor en un thread y devolver su URL base"""
+        ready = threading.Event()
+
+        def serve():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            self.runner = web.AppRunner(self.app(), access_log=None)
+            self.loop.run_until_complete(self.runner.setup())
+            site = web.TCPSite(self.runner, self.host, self.port)
+            self.loop.run_until_complete(site.start())
+            self.port = self.runner.addresses[0][1]
+            ready.set()
+            self.loop.run_forever()
+            self.loop.run_until_complete(self.runner.cleanup())
+            self.loop.close()
+
+        self.thread = threading.Thread(target=serve, name='mock-providers', daemon=True)
+        self.thread.start()
+        ready.wait()
+        return self.url
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def stop(self):
+        if self.loop and self.thread:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.thread = None
+
+    def stats(self) -> Dict:
+        return {provider: dict(counters) for provider, counters in sorted(self.counters.items())}
+
+
+def claude_message(text: str, input_tokens: int, output_tokens: int) -> Dict:
+    """Respuesta completa de Anthropic Messages"""
+    return {'content': [{'type': 'text', 'text': text}],
+            'usage': {'input_tokens': input_tokens, 'output_tokens': output_tokens}}
+
+
+def openai_completion(text: str, input_tokens: int, output_tokens: int) -> Dict:
+    """Respuesta completa de OpenAI Chat Completions"""
+    return {'choices': [{'message': {'content': text}}],
+            'usage': {'prompt_tokens': input_tokens, 'completion_tokens': output_tokens}}
+
+
+def parse_latency(text: str) -> Tuple[str, Tuple[float, ...]]:
+    """'lognormal:0.05:0.5' -> ('lognormal', (0.05, 0.5))"""
+    kind, *params = text.split(':')
+    return kind, tuple(float(p) for p in params)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Trinity Cortex mock provider server')
+    parser.add_argument('--profile', choices=sorted(PROFILES), default=DEFAULT_PROFILE)
+    parser.add_argument('--latency', type=parse_latency, help="override, e.g. 'uniform:0.01:0.05'")
+    parser.add_argument('--error-rate', type=float, help='fraction of requests answered with an error')
+    parser.add_argument('--reply-chars', type=int, help='length of each response (0 = short fixed reply)')
+    parser.add_argument('--chunks', type=int, help='streamed chunks per response')
+    parser.add_argument('--chunk-delay', type=float, help='seconds between streamed chunks')
+    parser.add_argument('--batch-polls', type=int, help='status polls before a batch job ends')
+    parser.add_argument('--drop-results', type=int, help='cut the first N batch result downloads halfway')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    mock = MockProviders(args.profile, args.seed, port=args.port, latency=args.latency,
+                         error_rate=args.error_rate, reply_chars=args.reply_chars, chunks=args.chunks, chunk_delay=args.chunk_delay,
+                         batch_polls=args.batch_polls, drop_results=args.drop_results)
+    print(f"🔱 Mock providers ({args.profile}) on {mock.url}")
+    print(f"   export TRINITY_ANTHROPIC_URL={mock.url} TRINITY_OPENAI_URL={mock.url} "
+          f"TRINITY_GEMINI_URL={mock.url}")
+    web.run_app(mock.app(), host=mock.host, port=args.port, print=None, access_log=None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+🔱 TCC - Benchmark de orquestación
+Corre TrinityCortex.orchestrate contra los proveedores simulados de mock_providers.py
+(sin red ni API keys reales) para cada modo y nivel de concurrencia, y mide
+throughput, latencia p50/p95/p99, errores, crecimiento de la memoria en disco y tasa
+de aciertos del cache. Cada escenario corre en un proceso nuevo con un HOME temporal,
+así que parte de una memoria y un cache vacíos. La carga (queries y repeticiones) y
+el comportamiento de los proveedores salen de --seed: dos corridas son comparables.
+
+Uso: python benchmarks/orchestration.py [--profile fast] [--modes parallel,race]
+         [--concurrency 1,4,16] [--requests 40] [--json resultados.json]
+         [--compare base.json]
+Con --compare sale con código 1 si algún escenario empeora más que REGRESSION_TOLERANCE.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+from mock_providers import MockProviders, PROFILES, DEFAULT_PROFILE
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CORE_DIR = os.path.join(BENCH_DIR, '..', 'core')
+
+# 'stream' es el modo parallel con on_chunk (respuestas en streaming)
+MODES = ('parallel', 'stream', 'sequential', 'consensus', 'specialized', 'race', 'hedged', 'routed',
+         'pipelined')
+CONCURRENCY_LEVELS = (1, 4, 16)
+REQUESTS_PER_SCENARIO = 40
+WARMUP_REQUESTS = 2            # no cuentan en la latencia (abren el pool HTTP)
+REPEAT_FRACTION = 0.25         # fracción de queries repetidas (ejercita el cache)
+SCENARIO_TIMEOUT = 600         # segundos máximos por escenario
+
+# Comparación con una corrida anterior: empeorar más que esto es una regresión
+REGRESSION_TOLERANCE = 0.20
+LATENCY_NOISE_MS = 2.0         # diferencias de p95 menores a esto se ignoran
+
+# Vocabulario de la carga: mezcla temas de código, estrategia e investigación
+# para que el modo specialized reparta entre proveedores
+TOPICS = ['implement a cache', 'design the architecture', 'research vector databases',
+          'debug a race condition', 'optimize a SQL query', 'plan a migration',
+          'write a parser', 'compare queue systems', 'refactor the API client']
+SUBJECTS = ['for the billing service', 'in Python', 'for a mobile backend', 'with asyncio',
+            'for 10k users', 'behind a load balancer', 'for the search index']
+
+
+def workload(requests: int, seed: int, prefix: str = '') -> List[str]:
+    """Queries deterministas; una fracción REPEAT_FRACTION repite queries anteriores"""
+    rng = random.Random(seed)
+    queries: List[str] = []
+    for i in range(requests):
+        if queries and rng.random() < REPEAT_FRACTION:
+            queries.append(rng.choice(queries))
+        else:
+            queries.append(f"{prefix}{rng.choice(TOPICS)} {rng.choice(SUBJECTS)} (#{i})")
+    return queries
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Percentil por rango más cercano (valores ya ordenados)"""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, int(round(p * len(values) + 0.5)) - 1))]
+
+
+def directory_bytes(path: str, prefix: str) -> int:
+    """Bytes de los archivos de `path` que empiezan con `prefix` (base + -wal + -shm)"""
+    if not os.path.isdir(path):
+        return 0
+    return sum(os.path.getsize(os.path.join(path, name))
+               for name in os.listdir(path) if name.startswith(prefix))
+
+
+def succeeded(result: Dict) -> bool:
+    """Al menos una respuesta exitosa (consensus anida su resumen en 'consensus')"""
+    summary = result.get('summary') or result.get('consensus', {}).get('summary', {})
+    return summary.get('successful', 0) > 0
+
+
+# ---- worker: un escenario en un proceso nuevo ----
+
+async def run_scenario(spec: Dict) -> Dict:
+    sys.path.insert(0, CORE_DIR)
+    import tcc_v3
+
+    # Los límites de requests/min de los proveedores reales no aplican al servidor simulado
+    tcc_v3.PROVIDER_RATE_LIMITS = {}
+    tcc_v3.DEFAULT_RATE_LIMIT = (10 ** 9, 10 ** 12)
+
+    mode = 'parallel' if spec['mode'] == 'stream' else spec['mode']
+    on_chunk = (lambda llm, chunk: None) if spec['mode'] == 'stream' else None
+    queries = workload(spec['requests'], spec['seed'])
+    warmup = workload(spec['warmup'], spec['seed'] + 1, prefix='warmup: ')
+
+    cortex = tcc_v3.TrinityCortex()
+    db_before = directory_bytes(tcc_v3.TRINITY_HOME, 'trinity_memory.db')
+    for query in warmup:
+        await cortex.orchestrate(query, mode, on_chunk=on_chunk)
+    cortex.memory.flush()
+    stats_before = cortex.stats()
+    cache_before = stats_before['cache'] or {}
+
+    semaphore = asyncio.Semaphore(spec['concurrency'])
+    latencies: List[float] = []
+    failures = 0
+
+    async def one(query: str):
+        nonlocal failures
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                result = await cortex.orchestrate(query, mode, on_chunk=on_chunk)
+                ok = succeeded(result)
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                failures += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(query) for query in queries))
+    elapsed = time.perf_counter() - started
+
+    stats = cortex.stats()
+    cache = stats['cache'] or {}
+    stages = {row['stage']: {'p50_ms': row['p50'] * 1000, 'p95_ms': row['p95'] * 1000}
+              for row in cortex.metrics.grouped('trinity_stage_seconds', 'stage')}
+    await cortex.close()
+    db_after = directory_bytes(tcc_v3.TRINITY_HOME, 'trinity_memory.db')
+
+    latencies.sort()
+    hits = (cache.get('hits', 0) + cache.get('near_hits', 0)
+            - cache_before.get('hits', 0) - cache_before.get('near_hits', 0))
+    lookups = hits + cache.get('misses', 0) - cache_before.get('misses', 0)
+    interactions = stats['total_interactions'] - stats_before['total_interactions']
+    return {
+        'mode': spec['mode'],
+        'concurrency': spec['concurrency'],
+        'requests': len(queries),
+        'errors': failures,
+        'seconds': round(elapsed, 4),
+        'throughput_rps': round(len(queries) / elapsed, 2) if elapsed else None,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'cache_hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+        'interactions': interactions,
+        'db_bytes': db_after,
+        'db_growth_bytes': db_after - db_before,
+        'db_bytes_per_request': round((db_after - db_before) / len(queries), 1) if queries else 0,
+        'prompts': {name: dict(usage) for name, usage in stats['prompts'].items()},
+        'stages': {name: {k: round(v, 3) for k, v in row.items()} for name, row in stages.items()}
+    }
+
+
+def worker(spec: Dict):
+    """Correr un escenario y escribir su resultado (JSON) en stdout; la salida de TCC se descarta"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        result = asyncio.run(run_scenario(spec))
+    sys.stdout.write(json.dumps(result) + "\n")
+
+
+# ---- coordinador ----
+
+def scenario(spec: Dict, base_url: str) -> Dict:
+    """Lanzar el worker de un escenario con un HOME temporal apuntando al servidor simulado"""
+    with tempfile.TemporaryDirectory() as home:
+        env = dict(os.environ)
+        env.update(
+            HOME=home, TRINITY_CACHE='1', TRINITY_TRACE_FILE='',
+            TRINITY_DAEMON_PORT='1', TRINITY_SOCKET=os.path.join(home, 'none.sock'),
+            TRINITY_ANTHROPIC_URL=base_url, TRINITY_OPENAI_URL=base_url, TRINITY_GEMINI_URL=base_url,
+            ANTHROPIC_API_KEY='mock', OPENAI_API_KEY='mock', GEMINI_API_KEY='mock'
+        )
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', json.dumps(spec)],
+                              env=env, capture_output=True, text=True, timeout=SCENARIO_TIMEOUT)
+    if proc.returncode != 0:
+        raise RuntimeError(f"scenario {spec['mode']}/{spec['concurrency']} failed:\n{proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def git_commit() -> Optional[str]:
+    try:
+        proc = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR,
+                              capture_output=True, text=True, check=True)
+        return proc.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: List[Dict], baseline_path: str) -> Tuple[int, List[str]]:
+    """(escenarios comparados, regresiones): p95 o throughput peor que la base más REGRESSION_TOLERANCE"""
+    with open(baseline_path) as f:
+        baseline = {(r['mode'], r['concurrency']): r for r in json.load(f)['results']}
+    regressions = []
+    compared = 0
+    for result in results:
+        base = baseline.get((result['mode'], result['concurrency']))
+        if not base:
+            continue
+        compared += 1
+        name = f"{result['mode']}/c{result['concurrency']}"
+        if result['p95_ms'] > base['p95_ms'] * (1 + REGRESSION_TOLERANCE) + LATENCY_NOISE_MS:
+            regressions.append(f"{name} p95 {base['p95_ms']:.1f} -> {result['p95_ms']:.1f} ms")
+        if result['throughput_rps'] < base['throughput_rps'] * (1 - REGRESSION_TOLERANCE):
+            regressions.append(f"{name} throughput {base['throughput_rps']:.1f} -> "
+                               f"{result['throughput_rps']:.1f} req/s")
+    return compared, regressions
+
+
+def csv_list(text: str) -> List[str]:
+    return [item.strip() for item in text.split(',') if item.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Trinity Cortex orchestration benchmark')
+    parser.add_argument('--profile', choices=sorted(PROFILES), default=DEFAULT_PROFILE,
+                        help='mock provider behaviour (latency, errors, streaming)')
+    parser.add_argument('--modes', type=csv_list, default=list(MODES), help='comma-separated modes')
+    parser.add_argument('--concurrency', type=lambda t: [int(c) for c in csv_list(t)],
+                        default=list(CONCURRENCY_LEVELS), help='comma-separated concurrency levels')
+    parser.add_argument('--requests', type=int, default=REQUESTS_PER_SCENARIO, help='orchestrations per scenario')
+    parser.add_argument('--warmup', type=int, default=WARMUP_REQUESTS)
+    parser.add_argument('--error-rate', type=float, help='override the profile error rate')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='write machine-readable results to this file')
+    parser.add_argument('--compare', help='baseline results (--json of an earlier run) to check against')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(json.loads(args.worker))
+        return
+
+    unknown = [mode for mode in args.modes if mode not in MODES]
+    if unknown:
+        parser.error(f"unknown modes: {', '.join(unknown)} (choose from {', '.join(MODES)})")
+
+    mock = MockProviders(args.profile, args.seed, error_rate=args.error_rate)
+    base_url = mock.start()
+    print(f"\n🔱 Orchestration benchmark — profile '{args.profile}', {args.requests} requests/scenario, "
+          f"seed {args.seed}")
+    print(f"\n  {'mode':<12} {'conc':>4} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'errors':>6} {'cache':>6} {'DB B/req':>9}")
+
+    results: List[Dict] = []
+    try:
+        for mode in args.modes:
+            for concurrency in args.concurrency:
+                spec = {'mode': mode, 'concurrency': concurrency, 'requests': args.requests,
+                        'warmup': args.warmup, 'seed': args.seed}
+                result = scenario(spec, base_url)
+                results.append(result)
+                print(f"  {mode:<12} {concurrency:>4} {result['throughput_rps']:>8.1f} "
+                      f"{result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} "
+                      f"{result['errors']:>6} {result['cache_hit_rate']:>6.0%} "
+                      f"{result['db_bytes_per_request']:>9.0f}")
+    finally:
+        mock.stop()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'commit': git_commit(),
+                'python': sys.version.split()[0],
+                'profile': {'name': args.profile, **mock.profile},
+                'seed': args.seed,
+                'requests': args.requests,
+                'providers': mock.stats(),
+                'results': results
+            }, f, indent=2)
+        print(f"\n📄 Results written to {args.json}")
+
+    if args.compare:
+        compared, regressions = compare(results, args.compare)
+        if not compared:
+            print(f"\n⏭️  No scenario in common with {args.compare}")
+        elif regressions:
+            print("\n❌ Regressions against " + args.compare + ":")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        else:
+            print(f"\n✅ No regressions in {compared} scenarios against {args.compare}")
+
+
+if __name__ == '__main__':
+    main()
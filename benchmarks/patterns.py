@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+🔱 TCC - Microbenchmark del clasificador de patrones
+Compara el matcher compilado de tcc_patterns con los escaneos `any(word in texto)`
+anteriores sobre la carga de una orquestación (una query: especialidades e intención;
+tres respuestas de ~1024 tokens: aprendizajes), verifica que den exactamente el mismo
+resultado y repite la medición con un registro grande (--registry-words) para mostrar
+cómo escala cada enfoque. Incluye como referencia una sola regex compilada con todas
+las palabras. Sale con código 1 si algún resultado difiere.
+
+Uso: python benchmarks/patterns.py [--runs N] [--registry-words 200] [--json resultados.json]
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'core'))
+from tcc_patterns import PatternMatcher, load_registry
+
+QUERIES = 200
+RESPONSES = 60
+RESPONSE_WORDS = 800           # ~1024 tokens
+RESPONSES_PER_ORCHESTRATION = 3
+
+VOCABULARY = ("the a to of and in is for that this with you it be on as are we can should will "
+              "service request cache latency database user response model token queue worker "
+              "retry timeout index shard replica network memory budget throughput").split()
+KEYWORDS = ['design', 'plan', 'implement', 'function', 'api', 'research', 'compare', 'Optimize',
+            'improvement', 'error', 'debugging', 'explain', 'story', 'solve', 'rapid', 'planet']
+CODE_SNIPPETS = ["import asyncio", "def handler(request):", "class Worker:", "Import the module",
+                 "the Class hierarchy"]
+
+
+# ---- implementación anterior (referencia) ----
+
+def legacy_specialties(query: str) -> List[str]:
+    specialties = []
+    query_lower = query.lower()
+    if any(word in query_lower for word in ['strategy', 'plan', 'analyze', 'design']):
+        specialties.append('strategy')
+    if any(word in query_lower for word in ['code', 'implement', 'function', 'api', 'script']):
+        specialties.append('code')
+    if any(word in query_lower for word in ['research', 'optimize', 'improve', 'compare']):
+        specialties.append('research')
+    return specialties
+
+
+def legacy_intent(query: str) -> str:
+    query_lower = query.lower()
+    if any(word in query_lower for word in ['create', 'write', 'imagine', 'story']):
+        return 'creative'
+    elif any(word in query_lower for word in ['analyze', 'explain', 'compare']):
+        return 'analytical'
+    elif any(word in query_lower for word in ['calculate', 'solve', 'math']):
+        return 'mathematical'
+    return 'general'
+
+
+def legacy_learnings(response: str) -> List[str]:
+    learnings = []
+    if "import" in response or "def " in response or "class " in response:
+        learnings.append('code_structure')
+    if "error" in response.lower() or "bug" in response.lower():
+        learnings.append('error_handling')
+    if "optimize" in response.lower() or "improve" in response.lower():
+        learnings.append('optimization')
+    return learnings
+
+
+def legacy_scan(registry: Dict, category: str, text: str) -> List[str]:
+    """Un `any(word in texto)` por etiqueta, como el código anterior (minúsculas una sola vez)"""
+    text_lower = text.lower()
+    return [label for label, spec in registry[category].items()
+            if any(word in text_lower for word in spec['words'])]
+
+
+def regex_scan(pattern, text: str) -> set:
+    return {match.lower() for match in pattern.findall(text)}
+
+
+# ---- carga ----
+
+def corpus(seed: int):
+    rng = random.Random(seed)
+
+    def sentence(words: int, keyword_rate: float) -> str:
+        out = []
+        for _ in range(words):
+            if rng.random() < keyword_rate:
+                out.append(rng.choice(KEYWORDS))
+            elif rng.random() < keyword_rate / 4:
+                out.append(rng.choice(CODE_SNIPPETS))
+            else:
+                out.append(rng.choice(VOCABULARY))
+        return " ".join(out)
+
+    queries = [sentence(rng.randint(6, 16), 0.12) for _ in range(QUERIES)]
+    responses = [sentence(RESPONSE_WORDS, rng.choice([0.0, 0.002, 0.01])) for _ in range(RESPONSES)]
+    return queries, responses
+
+
+def large_registry(words: int, seed: int) -> Dict:
+    """Registro por defecto más `words` palabras sintéticas repartidas en 20 etiquetas"""
+    rng = random.Random(seed)
+    registry = load_registry(None)
+    extra = registry.setdefault('topic', {})
+    stems = [w for w in VOCABULARY if len(w) > 3]
+    for i in range(words):
+        label = f"topic_{i % 20}"
+        word = rng.choice(stems) + rng.choice(['ing', 'ed', 'er', 'ize', 'less', 'ful', 'ity', 'ness'])
+        extra.setdefault(label, {'words': [], 'case_sensitive': False})['words'].append(word)
+    return registry
+
+
+def best_us(fn: Callable[[], None], calls: int, runs: int) -> float:
+    """Mejor tiempo por llamada (µs) de `runs` repeticiones"""
+    best = float('inf')
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best / calls * 1e6
+
+
+def report(name: str, legacy: float, compiled: float, results: List[Dict], **extra):
+    speedup = legacy / compiled if compiled else 0.0
+    results.append({'name': name, 'legacy_us': round(legacy, 2), 'compiled_us': round(compiled, 2),
+                    'speedup': round(speedup, 2), **extra})
+    print(f"  {name:<34} {legacy:9.1f} µs {compiled:9.1f} µs   {speedup:5.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Trinity Cortex pattern matcher microbenchmark')
+    parser.add_argument('--runs', type=int, default=5, help='repetitions per measurement (best is kept)')
+    parser.add_argument('--registry-words', type=int, default=200, help='size of the large synthetic registry')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='write machine-readable results to this file')
+    args = parser.parse_args()
+
+    queries, responses = corpus(args.seed)
+    registry = load_registry(None)     # sin el archivo del usuario: resultados comparables
+    matcher = PatternMatcher(registry)
+    results: List[Dict] = []
+
+    # Equivalencia con la implementación anterior
+    mismatches = 0
+    for query in queries:
+        found = matcher.scan(query, ('specialty', 'intent'))
+        mismatches += found['specialty'] != legacy_specialties(query)
+        mismatches += (found['intent'][:1] or ['general'])[0] != legacy_intent(query)
+    for response in responses:
+        mismatches += matcher.scan(response, ('learning',))['learning'] != legacy_learnings(response)
+
+    print(f"\n🔱 Pattern matcher — {len(queries)} queries, {len(responses)} responses "
+          f"(~{RESPONSE_WORDS} words), best of {args.runs}")
+    print(f"\n  {'workload':<34} {'legacy':>12} {'compiled':>12}   speedup")
+
+    def legacy_queries():
+        for query in queries:
+            legacy_specialties(query)
+            legacy_intent(query)
+
+    def compiled_queries():
+        for query in queries:
+            matcher.scan(query, ('specialty', 'intent'))
+
+    def legacy_responses():
+        for response in responses:
+            legacy_learnings(response)
+
+    def compiled_responses():
+        for response in responses:
+            matcher.scan(response, ('learning',))
+
+    query_legacy = best_us(legacy_queries, len(queries), args.runs)
+    query_compiled = best_us(compiled_queries, len(queries), args.runs)
+    response_legacy = best_us(legacy_responses, len(responses), args.runs)
+    response_compiled = best_us(compiled_responses, len(responses), args.runs)
+    report("query (specialty + intent)", query_legacy, query_compiled, results)
+    report("response (learnings)", response_legacy, response_compiled, results)
+    report("orchestration (1 query + 3 resp.)",
+           query_legacy + RESPONSES_PER_ORCHESTRATION * response_legacy,
+           query_compiled + RESPONSES_PER_ORCHESTRATION * response_compiled, results)
+
+    # Registro grande: el costo de los escaneos anteriores crece con cada palabra
+    big = large_registry(args.registry_words, args.seed)
+    big_matcher = PatternMatcher(big)
+    for response in responses:
+        mismatches += big_matcher.scan(response, ('topic',))['topic'] != legacy_scan(big, 'topic', response)
+    report(f"response, {args.registry_words}-word registry",
+           best_us(lambda: [legacy_scan(big, 'topic', r) for r in responses], len(responses), args.runs),
+           best_us(lambda: [big_matcher.scan(r, ('topic',)) for r in responses], len(responses), args.runs),
+           results, registry_words=args.registry_words)
+
+    # Referencia: una sola regex con todas las palabras (alternativa descartada)
+    words = sorted({w for spec in registry['learning'].values() for w in spec['words']}, key=len, reverse=True)
+    pattern = re.compile("|".join(map(re.escape, words)), re.IGNORECASE)
+    regex_us = best_us(lambda: [regex_scan(pattern, r) for r in responses], len(responses), args.runs)
+    results.append({'name': 'response (single regex)', 'us': round(regex_us, 2)})
+    print(f"  {'response (single regex, reference)':<34} {'':>12} {regex_us:9.1f} µs")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'runs': args.runs, 'mismatches': mismatches,
+                       'results': results}, f, indent=2)
+
+    print(f"\n{'❌ ' + str(mismatches) + ' results differ from the previous implementation' if mismatches else '✅ Same results as the previous implementation'}")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+🔱 TCC - Benchmark de arranque
+Mide el costo de importación de los módulos de core/ (python -X importtime), verifica
+que las dependencias pesadas sigan cargándose en forma diferida y cronometra los
+comandos rápidos del CLI, incluida una consulta cacheada a un daemon `tcc serve`
+temporal (HOME y socket propios, proveedores simulados). Sale con código 1 si algo
+supera su presupuesto o el daemon no arranca.
+
+Uso: python benchmarks/startup.py [--runs N] [--json resultados.json]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, Iterator, List
+
+CORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'core')
+TCC_CLI = os.path.join(CORE_DIR, 'tcc')
+
+# Presupuestos de importación (ms acumulados según -X importtime)
+IMPORT_BUDGETS_MS = {
+    'tcc_client': 40,
+    'tcc_cache': 60,
+    'tcc_v3': 150
+}
+
+# Presupuestos de tiempo de pared por comando (ms, incluye arrancar el intérprete)
+COMMAND_BUDGETS_MS = {
+    '--help': 100,
+    'status': 150     # incluye intentar conectar al daemon
+}
+CACHE_HIT_BUDGET_MS = 100
+DAEMON_START_TIMEOUT = 30.0    # segundos para que el daemon temporal responda a `tcc status`
+
+# Módulos que importar tcc_v3 no debe cargar: se importan recién cuando un comando los usa
+LAZY_MODULES = ['aiohttp', 'numpy', 'tcc_batch', 'tcc_server', 'http.client', 'argparse']
+
+
+def isolated_env(home: str) -> Dict[str, str]:
+    """Entorno sin daemon ni estado del usuario: HOME temporal y puerto TCP cerrado"""
+    env = dict(os.environ)
+    env.update(HOME=home, TRINITY_DAEMON_PORT='1', TRINITY_SOCKET=os.path.join(home, 'none.sock'))
+    return env
+
+
+def import_time_ms(module: str, env: Dict[str, str]) -> float:
+    """Tiempo acumulado de importar `module` en un intérprete nuevo"""
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=CORE_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    for line in proc.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        parts = line.split('|')
+        if len(parts) == 3 and parts[2].strip() == module and not parts[2].startswith('  '):
+            return int(parts[1]) / 1000
+    raise RuntimeError(f"{module} not found in -X importtime output")
+
+
+def loaded_lazy_modules(env: Dict[str, str]) -> List[str]:
+    """Módulos de LAZY_MODULES que quedan cargados después de `import tcc_v3`"""
+    code = ("import sys, json, tcc_v3; "
+            f"print(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))")
+    proc = subprocess.run([sys.executable, '-c', code], cwd=CORE_DIR, env=env,
+                          capture_output=True, text=True, check=True)
+    return json.loads(proc.stdout)
+
+
+def command_time_ms(args: List[str], env: Dict[str, str]) -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, TCC_CLI] + args, env=env, capture_output=True)
+    return (time.perf_counter() - started) * 1000
+
+
+@contextlib.contextmanager
+def throwaway_daemon(home: str) -> Iterator[Dict[str, str]]:
+    """
+    `tcc serve` con HOME y socket temporales contra los proveedores simulados de
+    mock_providers.py; entrega el entorno para hablarle. RuntimeError si no arranca.
+    """
+    from mock_providers import MockProviders
+
+    mock = MockProviders('fast')
+    base_url = mock.start()
+    env = dict(os.environ)
+    env.update(
+        HOME=home, TRINITY_CACHE='1', TRINITY_TRACE_FILE='', TRINITY_DAEMON_PORT='0',
+        TRINITY_SOCKET=os.path.join(home, 'tcc.sock'),
+        TRINITY_ANTHROPIC_URL=base_url, TRINITY_OPENAI_URL=base_url, TRINITY_GEMINI_URL=base_url,
+        ANTHROPIC_API_KEY='mock', OPENAI_API_KEY='mock', GEMINI_API_KEY='mock'
+    )
+    log_path = os.path.join(home, 'serve.log')
+    with open(log_path, 'w') as log:
+        proc = subprocess.Popen([sys.executable, TCC_CLI, 'serve'], env=env,
+                                stdout=log, stderr=subprocess.STDOUT)
+    try:
+        deadline = time.monotonic() + DAEMON_START_TIMEOUT
+        while subprocess.run([sys.executable, TCC_CLI, 'status'], env=env,
+                             capture_output=True).returncode != 0:
+            if proc.poll() is not None or time.monotonic() > deadline:
+                with open(log_path) as log:
+                    output = log.read()[-2000:]
+                raise RuntimeError(f"tcc serve did not start (exit code {proc.poll()}):\n{output}")
+            time.sleep(0.1)
+        yield env
+    finally:
+        subprocess.run([sys.executable, TCC_CLI, 'stop'], env=env, capture_output=True)
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+        mock.stop()
+
+
+def daemon_cache_hit_ms(runs: int) -> float:
+    """Repetir una query contra un daemon temporal (la repetición sale del cache)"""
+    query = ['startup benchmark cache probe']
+    with tempfile.TemporaryDirectory() as home, throwaway_daemon(home) as env:
+        first = subprocess.run([sys.executable, TCC_CLI] + query, env=env, capture_output=True, text=True)
+        if first.returncode != 0:
+            raise RuntimeError(f"query through the daemon failed:\n{first.stdout[-2000:]}{first.stderr[-2000:]}")
+        return min(command_time_ms(query, env) for _ in range(runs))
+
+
+def check(name: str, value: float, budget: float, results: List[Dict]):
+    status = 'ok' if value <= budget else 'over budget'
+    results.append({'name': name, 'ms': round(value, 2), 'budget_ms': budget, 'status': status})
+    print(f"  {'✅' if status == 'ok' else '❌'} {name:<28} {value:8.1f} ms  (budget {budget} ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Trinity Cortex startup benchmark')
+    parser.add_argument('--runs', type=int, default=5, help='repetitions per measurement (best is kept)')
+    parser.add_argument('--json', help='write machine-readable results to this file')
+    args = parser.parse_args()
+
+    results: List[Dict] = []
+    with tempfile.TemporaryDirectory() as home:
+        env = isolated_env(home)
+
+        print("\n🔱 Import time (best of runs)")
+        for module, budget in IMPORT_BUDGETS_MS.items():
+            best = min(import_time_ms(module, env) for _ in range(args.runs))
+            check(f"import {module}", best, budget, results)
+
+        print("\n💤 Lazy imports")
+        leaked = loaded_lazy_modules(env)
+        results.append({'name': 'lazy modules', 'loaded': leaked,
+                        'status': 'ok' if not leaked else 'over budget'})
+        if leaked:
+            print(f"  ❌ import tcc_v3 loads: {', '.join(leaked)}")
+        else:
+            print(f"  ✅ import tcc_v3 loads none of: {', '.join(LAZY_MODULES)}")
+
+        print("\n⚡ CLI wall time (median of runs)")
+        for command, budget in COMMAND_BUDGETS_MS.items():
+            timings = [command_time_ms([command], env) for _ in range(args.runs)]
+            check(f"tcc {command}", statistics.median(timings), budget, results)
+
+    print("\n💾 Cache hit through the daemon")
+    try:
+        check("tcc <cached query>", daemon_cache_hit_ms(args.runs), CACHE_HIT_BUDGET_MS, results)
+    except RuntimeError as e:
+        results.append({'name': 'tcc <cached query>', 'error': str(e), 'status': 'failed'})
+        print(f"  ❌ {e}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'runs': args.runs, 'results': results}, f, indent=2)
+
+    failed = [r['name'] for r in results if r['status'] != 'ok']
+    print(f"\n{'❌ Failed: ' + ', '.join(failed) if failed else '✅ All startup budgets met'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,11 +4,13 @@ CLAUDE CLI → TCC → GEMINI
 Ejecutar directamente desde la terminal de VSCode
 """
 
-import subprocess
 import json
 import os
+import socket
 from datetime import datetime
 
+import tcc_client
+
 def claude_cli_execute_tcc():
     """Claude CLI orquestando TCC con Gemini"""
     
@@ -41,12 +43,12 @@ Formato: Datos verificables con fuentes"""
     print("[Claude CLI] Preparando comando para TCC...")
     print()
     
-    # Si TCC está instalado, ejecutarlo
-    tcc_installed = subprocess.run(
-        ["which", "tcc"], 
-        capture_output=True, 
-        text=True
-    ).returncode == 0
+    # Si el daemon de TCC está corriendo, consultarlo directo por su socket
+    try:
+        tcc_client.health()
+        tcc_installed = True
+    except (tcc_client.DaemonUnavailable, OSError):
+        tcc_installed = False
     
     if tcc_installed:
         print("[TCC] ✅ TCC detectado, ejecutando búsqueda...")
@@ -54,16 +56,9 @@ Formato: Datos verificables con fuentes"""
         
         # Ejecutar TCC
         try:
-            result = subprocess.run(
-                ["tcc", query],
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
-            print(result.stdout)
-            if result.stderr:
-                print(f"[TCC] Advertencia: {result.stderr}")
-        except subprocess.TimeoutExpired:
+            result = tcc_client.orchestrate(query, timeout=30)
+            tcc_client.print_result(result)
+        except socket.timeout:
             print("[TCC] ⏱️ Timeout - la búsqueda está en proceso...")
         except Exception as e:
             print(f"[TCC] Error: {e}")
@@ -117,6 +112,8 @@ Formato: Datos verificables con fuentes"""
     if not tcc_installed:
         print("⚡ Para instalar TCC:")
         print("   bash install_tcc.sh")
+        print("⚡ Para iniciar el daemon:")
+        print("   tcc serve")
         print()
         print("📋 Query guardada para ejecutar con Gemini:")
         print("-" * 50)
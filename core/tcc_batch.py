@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+🔱 TCC - Offload a las APIs de batch de los proveedores
+Jobs asíncronos (Anthropic Message Batches, OpenAI Batch) para cargas no urgentes:
+payloads JSONL en disco, polling hasta completar, volcado de resultados en bloque a la
+memoria y un registro local de jobs (SQLite) para retomar después de un reinicio.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import aiohttp
+
+BATCH_POLL_INTERVAL = 30.0         # segundos entre consultas de estado
+BATCH_MAX_REQUESTS = 10000         # requests por job; más se reparten en varios jobs
+BATCH_COMPLETION_WINDOW = '24h'    # ventana de OpenAI Batch
+
+# Estados locales de un job en el registro
+JOB_PREPARED = 'prepared'      # payload escrito, todavía sin enviar
+JOB_SUBMITTED = 'submitted'    # aceptado por el proveedor, en proceso
+JOB_ENDED = 'ended'            # terminado en el proveedor, resultados sin volcar
+JOB_COLLECTED = 'collected'    # resultados volcados a memoria
+JOB_FAILED = 'failed'
+OPEN_STATES = (JOB_PREPARED, JOB_SUBMITTED, JOB_ENDED)
+
+
+class BatchError(Exception):
+    """Error de la API de batch de un proveedor"""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class BatchLedger:
+    """Registro local de jobs de batch: qué se envió, con qué id remoto y en qué estado está"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=5.0)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                provider TEXT,
+                remote_id TEXT,
+                status TEXT,
+                payload_path TEXT,
+                output_path TEXT,
+                requests INTEGER,
+                remote_info TEXT,
+                error TEXT,
+                created_at REAL,
+                updated_at REAL
+            )
+        ''')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS job_requests (
+                job_id TEXT,
+                custom_id TEXT,
+                query TEXT,
+                PRIMARY KEY (job_id, custom_id)
+            )
+        ''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)")
+        self.conn.commit()
+
+    def create_job(self, provider: str, payload_path: str, output_path: Optional[str],
+                   requests: List[Tuple[str, str]]) -> str:
+        """Registrar un job preparado con sus (custom_id, query)"""
+        job_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO jobs (id, provider, status, payload_path, output_path, requests, "
+                "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, provider, JOB_PREPARED, payload_path, output_path, len(requests), now, now)
+            )
+            self.conn.executemany(
+                "INSERT INTO job_requests (job_id, custom_id, query) VALUES (?, ?, ?)",
+                [(job_id, custom_id, query) for custom_id, query in requests]
+            )
+            self.conn.commit()
+        return job_id
+
+    def update(self, job_id: str, status: str, remote_id: Optional[str] = None,
+               remote_info: Optional[Dict] = None, error: Optional[str] = None):
+        """Cambiar el estado de un job (y opcionalmente su id/metadata remota o error)"""
+        fields = {'status': status, 'updated_at': time.time()}
+        if remote_id is not None:
+            fields['remote_id'] = remote_id
+        if remote_info is not None:
+            fields['remote_info'] = json.dumps(remote_info)
+        if error is not None:
+            fields['error'] = error
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self.lock:
+            self.conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            self.conn.commit()
+
+    def job(self, job_id: str) -> Optional[Dict]:
+        with self.lock:
+            cursor = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+            return self.as_dict(cursor, row) if row else None
+
+    def open_jobs(self) -> List[Dict]:
+        """Jobs que todavía necesitan envío, polling o volcado"""
+        marks = ", ".join("?" for _ in OPEN_STATES)
+        with self.lock:
+            cursor = self.conn.execute(
+                f"SELECT * FROM jobs WHERE status IN ({marks}) ORDER BY created_at", OPEN_STATES
+            )
+            return [self.as_dict(cursor, row) for row in cursor.fetchall()]
+
+    def queries(self, job_id: str) -> Dict[str, str]:
+        """custom_id -> query de un job"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT custom_id, query FROM job_requests WHERE job_id = ?", (job_id,)
+            ).fetchall()
+        return dict(rows)
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+    @staticmethod
+    def as_dict(cursor, row) -> Dict:
+        job = {column[0]: value for column, value in zip(cursor.description, row)}
+        job['remote_info'] = json.loads(job['remote_info']) if job['remote_info'] else {}
+        return job
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class ProviderBatchAPI:
+    """
+    Base de los clientes de batch. Reutiliza el conector del proveedor: su sesión HTTP,
+    timeouts, build_request() para el cuerpo de cada request y parse_response()/parse_usage()
+    para leer los resultados, así un job de batch pide exactamente lo mismo que micro_conversation.
+    """
+
+    def __init__(self, connector, base_url: str):
+        self.connector = connector
+        self.base_url = base_url.rstrip('/')
+
+    def headers(self) -> Dict[str, str]:
+        """Cabeceras de autenticación del conector (sin content-type)"""
+        _, headers, _ = self.connector.build_request('')
+        return {k: v for k, v in headers.items() if k.lower() != 'content-type'}
+
+    def request_body(self, query: str) -> Dict:
+        _, _, payload = self.connector.build_request(query)
+        return payload
+
+    def request_line(self, custom_id: str, query: str) -> Dict:
+        """Línea JSONL del payload para una query"""
+        raise NotImplementedError
+
+    async def submit(self, payload_path: str) -> Tuple[str, Dict]:
+        """Enviar el payload; devuelve (id remoto, metadata)"""
+        raise NotImplementedError
+
+    async def status(self, remote_id: str) -> Tuple[str, Dict]:
+        """Estado local (JOB_SUBMITTED, JOB_ENDED o JOB_FAILED) y metadata remota"""
+        raise NotImplementedError
+
+    def results(self, info: Dict) -> AsyncIterator[Tuple[str, Optional[str], Optional[str], Optional[Dict]]]:
+        """(custom_id, respuesta, error, uso de tokens) de cada request terminado"""
+        raise NotImplementedError
+
+    async def request_json(self, method: str, url: str, **kwargs) -> Dict:
+        async with self.connector.session.request(method, url, headers=self.headers(),
+                                                  timeout=self.connector.timeout, **kwargs) as response:
+            if response.status != 200:
+                body = (await response.text())[:200]
+                raise BatchError(f"{self.connector.label} batch API error {response.status}: {body}",
+                                 response.status)
+            return await response.json()
+
+    async def jsonl_lines(self, url: str) -> AsyncIterator[Dict]:
+        """Descargar un JSONL de resultados línea por línea, sin cargarlo entero"""
+        async with self.connector.session.get(url, headers=self.headers(),
+                                              timeout=self.connector.timeout) as response:
+            if response.status != 200:
+                raise BatchError(f"{self.connector.label} batch results error {response.status}",
+                                 response.status)
+            async for line in response.content:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+class AnthropicBatchAPI(ProviderBatchAPI):
+    """Anthropic Message Batches (POST /v1/messages/batches)"""
+
+    def request_line(self, custom_id: str, query: str) -> Dict:
+        return {'custom_id': custom_id, 'params': self.request_body(query)}
+
+    async def submit(self, payload_path: str) -> Tuple[str, Dict]:
+        with open(payload_path, 'r') as f:
+            requests = [json.loads(line) for line in f if line.strip()]
+        data = await self.request_json('POST', f"{self.base_url}/v1/messages/batches",
+                                       json={'requests': requests})
+        return data['id'], data
+
+    async def status(self, remote_id: str) -> Tuple[str, Dict]:
+        data = await self.request_json('GET', f"{self.base_url}/v1/messages/batches/{remote_id}")
+        if data.get('processing_status') == 'ended':
+            return JOB_ENDED, data
+        return JOB_SUBMITTED, data
+
+    async def results(self, info: Dict) -> AsyncIterator[Tuple[str, Optional[str], Optional[str], Optional[Dict]]]:
+        url = info.get('results_url') or f"{self.base_url}/v1/messages/batches/{info['id']}/results"
+        async for line in self.jsonl_lines(url):
+            result = line.get('result', {})
+            if result.get('type') == 'succeeded':
+                message = result['message']
+                yield (line['custom_id'], self.connector.parse_response(message), None,
+                       self.connector.parse_usage(message))
+            else:
+                error = result.get('error', {}).get('message') or result.get('type', 'unknown')
+                yield line['custom_id'], None, f"{self.connector.label} batch request failed: {error}", None
+
+
+class OpenAIBatchAPI(ProviderBatchAPI):
+    """OpenAI Batch: sube el JSONL como archivo y crea el batch sobre /v1/chat/completions"""
+
+    endpoint = '/v1/chat/completions'
+
+    def request_line(self, custom_id: str, query: str) -> Dict:
+        return {'custom_id': custom_id, 'method': 'POST', 'url': self.endpoint,
+                'body': self.request_body(query)}
+
+    async def submit(self, payload_path: str) -> Tuple[str, Dict]:
+        form = aiohttp.FormData()
+        form.add_field('purpose', 'batch')
+        with open(payload_path, 'rb') as f:
+            form.add_field('file', f.read(), filename=os.path.basename(payload_path),
+                           content_type='application/jsonl')
+        uploaded = await self.request_json('POST', f"{self.base_url}/v1/files", data=form)
+        data = await self.request_json('POST', f"{self.base_url}/v1/batches", json={
+            'input_file_id': uploaded['id'],
+            'endpoint': self.endpoint,
+            'completion_window': BATCH_COMPLETION_WINDOW
+        })
+        return data['id'], data
+
+    async def status(self, remote_id: str) -> Tuple[str, Dict]:
+        data = await self.request_json('GET', f"{self.base_url}/v1/batches/{remote_id}")
+        state = data.get('status')
+        if state == 'failed':
+            return JOB_FAILED, data
+        # Vencidos o cancelados también pueden traer resultados parciales
+        if state in ('completed', 'expired', 'cancelled'):
+            return JOB_ENDED, data
+        return JOB_SUBMITTED, data
+
+    async def results(self, info: Dict) -> AsyncIterator[Tuple[str, Optional[str], Optional[str], Optional[Dict]]]:
+        for file_id in (info.get('output_file_id'), info.get('error_file_id')):
+            if not file_id:
+                continue
+            async for line in self.jsonl_lines(f"{self.base_url}/v1/files/{file_id}/content"):
+                response = line.get('response') or {}
+                if response.get('status_code') == 200:
+                    body = response['body']
+                    yield (line['custom_id'], self.connector.parse_response(body), None,
+                           self.connector.parse_usage(body))
+                else:
+                    error = (line.get('error') or response.get('body', {}).get('error') or {}).get('message')
+                    yield line['custom_id'], None, f"{self.connector.label} batch request error: {error}", None
+
+
+class BatchOffloader:
+    """
+    Envía queries a las APIs de batch, hace polling y vuelca los resultados a la memoria.
+    Todo el estado vive en el BatchLedger: poll() retoma jobs de una ejecución anterior.
+    El volcado es al-menos-una-vez: si el proceso muere a mitad de collect(), el job se
+    vuelve a volcar completo en el próximo poll.
+    """
+
+    def __init__(self, memory, apis: Dict[str, ProviderBatchAPI], ledger: BatchLedger, directory: str,
+                 connector_errors: Tuple[type, ...] = ()):
+        self.memory = memory
+        self.apis = apis
+        # Errores de los conectores (p.ej. falta la API key al armar los headers): el job se
+        # conserva igual que con un error de red, para retomarlo con `tcc batch-resume`
+        self.transient_errors = (BatchError, aiohttp.ClientError, asyncio.TimeoutError) + tuple(connector_errors)
+        self.ledger = ledger
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def prepare(self, provider: str, queries: List[str], output_path: Optional[str] = None) -> List[str]:
+        """Escribir los payloads JSONL de un proveedor y registrar los jobs (sin enviarlos)"""
+        api = self.apis[provider]
+        job_ids = []
+        for start in range(0, len(queries), BATCH_MAX_REQUESTS):
+            requests = [(f"q{index}", query)
+                        for index, query in enumerate(queries[start:start + BATCH_MAX_REQUESTS], start)]
+            payload_path = os.path.join(self.directory, f"{provider}-{uuid.uuid4().hex[:8]}.jsonl")
+            tmp = payload_path + '.tmp'
+            with open(tmp, 'w') as f:
+                for custom_id, query in requests:
+                    f.write(json.dumps(api.request_line(custom_id, query)) + "\n")
+            os.replace(tmp, payload_path)
+            job_ids.append(self.ledger.create_job(provider, payload_path, output_path, requests))
+        return job_ids
+
+    async def submit(self, queries: List[str], providers: Optional[List[str]] = None,
+                     output_path: Optional[str] = None) -> List[str]:
+        """Preparar y enviar las queries a cada proveedor con API de batch"""
+        job_ids = []
+        for provider in providers or list(self.apis):
+            if provider not in self.apis:
+                raise BatchError(f"No batch API for provider: {provider}")
+            for job_id in self.prepare(provider, queries, output_path):
+                await self.send(self.ledger.job(job_id))
+                job_ids.append(job_id)
+        return job_ids
+
+    async def send(self, job: Dict):
+        remote_id, info = await self.apis[job['provider']].submit(job['payload_path'])
+        self.ledger.update(job['id'], JOB_SUBMITTED, remote_id=remote_id, remote_info=info)
+        print(f"📦 Batch job {job['id']} submitted to {job['provider']} ({job['requests']} requests)")
+
+    async def poll(self) -> int:
+        """Avanzar cada job abierto un paso; devuelve cuántos siguen abiertos"""
+        remaining = 0
+        for job in self.ledger.open_jobs():
+            if job['provider'] not in self.apis:
+                continue
+            try:
+                if job['status'] == JOB_PREPARED:
+                    # Preparado pero no enviado (p.ej. el proceso murió antes del envío)
+                    await self.send(job)
+                    remaining += 1
+                    continue
+                if job['status'] == JOB_SUBMITTED:
+                    status, info = await self.apis[job['provider']].status(job['remote_id'])
+                    self.ledger.update(job['id'], status, remote_info=info)
+                    if status == JOB_FAILED:
+                        print(f"❌ Batch job {job['id']} failed on {job['provider']}")
+                        continue
+                    if status != JOB_ENDED:
+                        remaining += 1
+                        continue
+                    job['remote_info'] = info
+                await self.collect(job)
+            except self.transient_errors as e:
+                # Error transitorio: el job queda en su estado y se reintenta en el próximo poll
+                print(f"⚠️ Batch job {job['id']}: {e}")
+                remaining += 1
+        return remaining
+
+    async def collect(self, job: Dict):
+        """Volcar los resultados de un job terminado a la memoria (y al JSONL de salida)"""
+        api = self.apis[job['provider']]
+        queries = self.ledger.queries(job['id'])
+        elapsed = time.time() - job['created_at']
+        out = open(job['output_path'], 'a') if job['output_path'] else None
+        seen = set()
+        try:
+            with self.memory.bulk():
+                async for custom_id, response, error, usage in api.results(job['remote_info']):
+                    if custom_id not in queries or custom_id in seen:
+                        continue
+                    seen.add(custom_id)
+                    self.record(job, custom_id, queries[custom_id], response, error, elapsed, out, usage)
+                for custom_id in queries.keys() - seen:
+                    self.record(job, custom_id, queries[custom_id], None,
+                                "No result returned by batch API", elapsed, out)
+            # Todo confirmado en la memoria antes de marcar el job como volcado
+            await self.memory.flush_async()
+        finally:
+            if out:
+                out.close()
+        self.ledger.update(job['id'], JOB_COLLECTED)
+        print(f"✅ Batch job {job['id']} collected: {len(seen)}/{len(queries)} results from {job['provider']}")
+
+    def record(self, job: Dict, custom_id: str, query: str, response: Optional[str],
+               error: Optional[str], elapsed: float, out, usage: Optional[Dict] = None):
+        success = response is not None
+        # Sin latencia por request en batch: se registra el tiempo del job completo
+        self.memory.record_interaction(job['provider'], query, response if success else error,
+                                       elapsed, success, usage, source='batch')
+        if success:
+            # Mismos aprendizajes que una llamada en vivo (complete_conversation)
+            connector = self.apis[job['provider']].connector
+            for learning in connector.extract_learnings(response):
+                self.memory.record_learning(learning['pattern'], job['provider'], 'TCC',
+                                            learning['knowledge'], learning.get('confidence', 0.8))
+        if out:
+            out.write(json.dumps({'job': job['id'], 'custom_id': custom_id,
+                                  'llm': job['provider'], 'query': query,
+                                  'response': response, 'error': error, 'success': success,
+                                  'usage': usage}) + "\n")
+
+    async def wait(self, poll_interval: Optional[float] = None):
+        """Hacer polling hasta que no queden jobs abiertos"""
+        if poll_interval is None:
+            poll_interval = BATCH_POLL_INTERVAL
+        while await self.poll():
+            await asyncio.sleep(poll_interval)
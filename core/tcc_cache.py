@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+"""
+🔱 TCC - Cache persistente de respuestas
+Cache compartido entre procesos (SQLite en modo WAL) con TTL, desalojo LRU
+acotado por cantidad de entradas y contadores de aciertos/fallos.
+Incluye búsqueda opcional de casi-duplicados (MinHash + LSH por bandas) para queries parafraseadas.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import struct
+import threading
+import time
+import unicodedata
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+CACHE_TTL = 24 * 3600          # segundos de validez de una respuesta
+CACHE_MAX_ENTRIES = 10000      # entradas máximas antes de desalojar (LRU)
+EVICT_EVERY = 100              # revisar el tamaño cada N escrituras
+# Accesos LRU (last_access, hit_count): se acumulan en memoria y se escriben juntos,
+# así un acierto es sólo una lectura (sin commit ni lock de escritura entre procesos)
+TOUCH_FLUSH_EVERY = 64         # entradas tocadas antes de escribir
+TOUCH_FLUSH_INTERVAL = 5.0     # segundos máximos que un acceso espera para escribirse
+
+# Casi-duplicados (opt-in): similitud de Jaccard estimada mínima para reutilizar una respuesta;
+# 0 los desactiva (p. ej. TRINITY_NEAR_THRESHOLD=0.9 para activarlos). Aun activados, dos prompts
+# con distintas negaciones o distintos números nunca son casi-duplicados (ver guard_key).
+NEAR_DUP_THRESHOLD = float(os.getenv('TRINITY_NEAR_THRESHOLD', '0'))
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16                 # 16 bandas x 4 filas: candidato casi seguro si Jaccard >= 0.8
+
+# Palabras que cambian el sentido de un prompt aunque casi no cambien su similitud
+NEGATIONS = re.compile(r"\b(?:not|no|never|none|nothing|nobody|neither|nor|without|cannot)\b|\w+n['’]t\b")
+NUMBERS = re.compile(r"\d+(?:[.,]\d+)*")
+
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalizar un prompt para la clave: Unicode NFC y espacios colapsados"""
+    return " ".join(unicodedata.normalize('NFC', prompt).split())
+
+
+def guard_key(text: str) -> str:
+    """
+    Cantidad de negaciones y números de un texto. Entra en el ámbito LSH: prompts que
+    difieren en un "not" o en una cifra no comparten buckets, por parecidos que sean.
+    """
+    lowered = normalize_prompt(text).lower()
+    return f"{len(NEGATIONS.findall(lowered))}|{','.join(sorted(NUMBERS.findall(lowered)))}"
+
+
+class MinHasher:
+    """
+    Firmas MinHash sobre shingles de palabras (unigramas y bigramas) y
+    claves LSH por bandas: textos parecidos comparten al menos una banda.
+    """
+
+    def __init__(self, permutations: int = MINHASH_PERMUTATIONS, bands: int = LSH_BANDS, seed: int = 1):
+        if permutations % bands:
+            raise ValueError("permutations must be a multiple of bands")
+        self.permutations = permutations
+        self.bands = bands
+        self.rows = permutations // bands
+        # Permutaciones universales (a*x + b) mod p, deterministas para compartir entre procesos
+        material = hashlib.sha256(f"minhash-{seed}".encode()).digest()
+        self.coefficients = []
+        for i in range(permutations):
+            digest = hashlib.blake2b(material + i.to_bytes(4, 'little'), digest_size=16).digest()
+            a, b = struct.unpack('<QQ', digest)
+            self.coefficients.append((a % (_MERSENNE_PRIME - 1) + 1, b % _MERSENNE_PRIME))
+
+    @staticmethod
+    def shingles(text: str) -> set:
+        words = re.findall(r'\w+', normalize_prompt(text).lower())
+        shingles = set(words)
+        shingles.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+        return shingles
+
+    def signature(self, text: str) -> Optional[Tuple[int, ...]]:
+        """Firma MinHash del texto (None si no tiene palabras)"""
+        hashes = [
+            int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), 'little')
+            for shingle in self.shingles(text)
+        ]
+        if not hashes:
+            return None
+        return tuple(
+            min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+            for a, b in self.coefficients
+        )
+
+    def band_keys(self, signature: Tuple[int, ...], scope: str = '') -> List[int]:
+        """Una clave entera (63 bits, apta para SQLite) por banda"""
+        keys = []
+        for band in range(self.bands):
+            chunk = signature[band * self.rows:(band + 1) * self.rows]
+            material = f"{scope}|{band}|" + ",".join(map(str, chunk))
+            digest = hashlib.blake2b(material.encode(), digest_size=8).digest()
+            keys.append(int.from_bytes(digest, 'little') >> 1)
+        return keys
+
+    @staticmethod
+    def similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+        """Jaccard estimada: fracción de posiciones iguales"""
+        return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+    @staticmethod
+    def pack(signature: Tuple[int, ...]) -> bytes:
+        return array('Q', signature).tobytes()
+
+    @staticmethod
+    def unpack(blob: bytes) -> Tuple[int, ...]:
+        values = array('Q')
+        values.frombytes(blob)
+        return tuple(values)
+
+
+class LSHIndex:
+    """
+    Índice LSH en memoria: clave -> firma, con búsqueda sublineal por bandas.
+    threshold 0 lo desactiva (query nunca encuentra nada).
+    """
+
+    def __init__(self, threshold: float = NEAR_DUP_THRESHOLD, hasher: Optional[MinHasher] = None):
+        self.threshold = threshold
+        self.hasher = hasher or MinHasher()
+        self.buckets: Dict[int, set] = {}
+        self.signatures: Dict[Any, Tuple[int, ...]] = {}
+        self.scopes: Dict[Any, str] = {}
+
+    def add(self, key, text: str):
+        signature = self.hasher.signature(text)
+        if signature is None:
+            return
+        self.signatures[key] = signature
+        self.scopes[key] = guard_key(text)
+        for band_key in self.hasher.band_keys(signature, self.scopes[key]):
+            self.buckets.setdefault(band_key, set()).add(key)
+
+    def remove(self, key):
+        signature = self.signatures.pop(key, None)
+        if signature is None:
+            return
+        for band_key in self.hasher.band_keys(signature, self.scopes.pop(key)):
+            bucket = self.buckets.get(band_key)
+            if bucket:
+                bucket.discard(key)
+                if not bucket:
+                    del self.buckets[band_key]
+
+    def query(self, text: str) -> Optional[Tuple[Any, float]]:
+        """(clave, similitud) del vecino más parecido sobre el umbral, o None"""
+        if not self.threshold:
+            return None
+        signature = self.hasher.signature(text)
+        if signature is None:
+            return None
+        candidates = set()
+        for band_key in self.hasher.band_keys(signature, guard_key(text)):
+            candidates |= self.buckets.get(band_key, set())
+        best = None
+        for key in candidates:
+            similarity = self.hasher.similarity(signature, self.signatures[key])
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (key, similarity)
+        return best
+
+
+class ResponseCache:
+    """
+    Cache de respuestas de LLMs en SQLite, seguro entre threads y procesos.
+
+    Con `writer` (una cola de escritura diferida sobre el mismo archivo, en modo 'async')
+    las escrituras sólo se encolan y el desalojo corre en el thread escritor; sin él se
+    escribe y confirma en la conexión propia.
+    """
+
+    def __init__(self, db_path: str, ttl: float = CACHE_TTL,
+                 max_entries: int = CACHE_MAX_ENTRIES,
+                 near_threshold: float = NEAR_DUP_THRESHOLD, writer=None):
+        self.db_path = db_path
+        self.writer = writer
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # Umbral de casi-duplicados; 0 desactiva la búsqueda por similitud
+        self.near_threshold = near_threshold
+        self.hasher = MinHasher()
+        self.lock = threading.RLock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.touched: Dict[str, List] = {}     # clave -> [último acceso, aciertos pendientes]
+        self.touched_since: Optional[float] = None
+
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=5.0)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                provider TEXT,
+                model TEXT,
+                response TEXT,
+                created_at REAL,
+                last_access REAL,
+                hit_count INTEGER DEFAULT 0
+            )
+        ''')
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)"
+        )
+        # Firmas MinHash y buckets LSH de cada entrada
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS near_signatures (
+                key TEXT PRIMARY KEY,
+                signature BLOB
+            )
+        ''')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS near_buckets (
+                bucket INTEGER,
+                key TEXT
+            )
+        ''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_near_buckets ON near_buckets(bucket)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_near_buckets_key ON near_buckets(key)")
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(provider: str, model: str, prompt: str,
+                 params: Optional[Dict[str, Any]] = None) -> str:
+        """Digest estable (SHA-256) de proveedor, modelo, prompt normalizado y parámetros"""
+        material = json.dumps({
+            'provider': provider,
+            'model': model,
+            'prompt': normalize_prompt(prompt),
+            'params': params or {}
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def scope(provider: str, model: str, prompt: str, params: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Ámbito de casi-duplicados: sólo se comparan prompts del mismo proveedor, modelo y
+        parámetros, con las mismas negaciones y números (guard_key)
+        """
+        return json.dumps([provider, model, params or {}, guard_key(prompt)], sort_keys=True)
+
+    def write(self, sql: str, params: tuple = (), on_written=None):
+        """Sentencia de escritura: encolada en el escritor o ejecutada en la conexión propia"""
+        if self.writer is not None:
+            self.writer.put(sql, params, on_written)
+        else:
+            self.conn.execute(sql, params)
+
+    def commit(self):
+        if self.writer is None:
+            self.conn.commit()
+
+    def fetch(self, key: str) -> Optional[str]:
+        """Leer una entrada vigente y anotar su acceso LRU (sin contar hit/miss)"""
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                self.delete_keys([key])
+                self.commit()
+                return None
+            self.touch(key, now)
+            return row[0]
+
+    def touch(self, key: str, now: float):
+        """Anotar un acceso; se escribe con los demás al juntar TOUCH_FLUSH_EVERY o vencer el plazo"""
+        entry = self.touched.get(key)
+        if entry is None:
+            self.touched[key] = [now, 1]
+        else:
+            entry[0] = now
+            entry[1] += 1
+        if self.touched_since is None:
+            self.touched_since = now
+        if len(self.touched) >= TOUCH_FLUSH_EVERY or now - self.touched_since >= TOUCH_FLUSH_INTERVAL:
+            self.flush_touches()
+            self.commit()
+
+    def flush_touches(self):
+        """Escribir los accesos pendientes (dentro de la transacción del llamador)"""
+        for key, (last_access, hits) in self.touched.items():
+            self.write(
+                "UPDATE responses SET last_access = MAX(last_access, ?), hit_count = hit_count + ? "
+                "WHERE key = ?", (last_access, hits, key)
+            )
+        self.touched.clear()
+        self.touched_since = None
+
+    def delete_keys(self, keys: List[str]):
+        """Borrar entradas con su firma y sus buckets de casi-duplicados"""
+        self.touched = {key: entry for key, entry in self.touched.items() if key not in keys}
+        for table in ('responses', 'near_signatures', 'near_buckets'):
+            for key in keys:
+                self.write(f"DELETE FROM {table} WHERE key = ?", (key,))
+
+    def get(self, key: str) -> Optional[str]:
+        """Respuesta cacheada o None si no existe o expiró"""
+        response = self.fetch(key)
+        if response is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return response
+
+    def lookup(self, provider: str, model: str, prompt: str,
+               params: Optional[Dict[str, Any]] = None, near: bool = True) -> Optional[Tuple[str, float]]:
+        """
+        (respuesta, similitud) para un prompt: primero coincidencia exacta (similitud 1.0),
+        luego (si near) el casi-duplicado más parecido sobre near_threshold. None si no hay.
+        """
+        response = self.fetch(self.make_key(provider, model, prompt, params))
+        if response is not None:
+            self.hits += 1
+            return response, 1.0
+
+        similar = self.find_similar(provider, model, prompt, params) if near else None
+        if similar is not None:
+            self.near_hits += 1
+            return similar
+
+        self.misses += 1
+        return None
+
+    def find_similar(self, provider: str, model: str, prompt: str,
+                     params: Optional[Dict[str, Any]] = None) -> Optional[Tuple[str, float]]:
+        """Casi-duplicado vía buckets LSH: sólo se comparan candidatos que comparten una banda"""
+        if not self.near_threshold:
+            return None
+        signature = self.hasher.signature(prompt)
+        if signature is None:
+            return None
+        buckets = self.hasher.band_keys(signature, self.scope(provider, model, prompt, params))
+
+        with self.lock:
+            rows = self.conn.execute(f'''
+                SELECT key, signature FROM near_signatures
+                WHERE key IN (
+                    SELECT key FROM near_buckets WHERE bucket IN ({",".join("?" * len(buckets))})
+                )
+            ''', buckets).fetchall()
+
+            ranked = sorted(
+                ((self.hasher.similarity(signature, self.hasher.unpack(blob)), key) for key, blob in rows),
+                reverse=True
+            )
+            for similarity, key in ranked:
+                if similarity < self.near_threshold:
+                    break
+                response = self.fetch(key)
+                if response is not None:
+                    return response, similarity
+        return None
+
+    def put(self, key: str, provider: str, model: str, response: str,
+            prompt: Optional[str] = None, params: Optional[Dict[str, Any]] = None):
+        """Guardar una respuesta; con prompt se indexa también para casi-duplicados"""
+        now = time.time()
+        signature = self.hasher.signature(prompt) if prompt and self.near_threshold else None
+        with self.lock:
+            self.writes += 1
+            evict = self.writes % EVICT_EVERY == 0
+            # Con escritor, el desalojo corre en su thread una vez confirmada la fila
+            on_written = (lambda rowid: self.evict()) if evict and self.writer is not None else None
+            self.write('''
+                INSERT OR REPLACE INTO responses
+                (key, provider, model, response, created_at, last_access, hit_count)
+                VALUES (?, ?, ?, ?, ?, ?, 0)
+            ''', (key, provider, model, response, now, now), on_written)
+            if signature is not None:
+                self.write(
+                    "INSERT OR REPLACE INTO near_signatures (key, signature) VALUES (?, ?)",
+                    (key, self.hasher.pack(signature))
+                )
+                self.write("DELETE FROM near_buckets WHERE key = ?", (key,))
+                for bucket in self.hasher.band_keys(signature, self.scope(provider, model, prompt, params)):
+                    self.write("INSERT INTO near_buckets (bucket, key) VALUES (?, ?)", (bucket, key))
+            self.flush_touches()
+            self.commit()
+            if evict and self.writer is None:
+                self.evict()
+
+    def evict(self):
+        """Borrar expiradas y, si sobra, las menos usadas recientemente (LRU), en la conexión propia"""
+        with self.lock:
+            self.flush_touches()
+            cursor = self.conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,)
+            )
+            removed = cursor.rowcount
+            count = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if count > self.max_entries:
+                cursor = self.conn.execute('''
+                    DELETE FROM responses WHERE key IN (
+                        SELECT key FROM responses ORDER BY last_access LIMIT ?
+                    )
+                ''', (count - self.max_entries,))
+                removed += cursor.rowcount
+            if removed:
+                self.conn.execute(
+                    "DELETE FROM near_signatures WHERE key NOT IN (SELECT key FROM responses)"
+                )
+                self.conn.execute(
+                    "DELETE FROM near_buckets WHERE key NOT IN (SELECT key FROM responses)"
+                )
+            self.conn.commit()
+            self.evictions += removed
+
+    def clear(self):
+        """Vaciar el cache"""
+        if self.writer is not None:
+            self.writer.flush()
+        with self.lock:
+            self.touched.clear()
+            self.touched_since = None
+            self.conn.execute("DELETE FROM responses")
+            self.conn.execute("DELETE FROM near_signatures")
+            self.conn.execute("DELETE FROM near_buckets")
+            self.conn.commit()
+
+    def stats(self) -> Dict:
+        """Contadores del proceso actual y tamaño del cache compartido"""
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = self.hits + self.near_hits + self.misses
+        return {
+            'hits': self.hits,
+            'near_hits': self.near_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.near_hits) / lookups if lookups else 0.0,
+            'writes': self.writes,
+            'evictions': self.evictions,
+            'entries': entries
+        }
+
+    def close(self):
+        with self.lock:
+            self.flush_touches()
+        if self.writer is not None:
+            self.writer.close()
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
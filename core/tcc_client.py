@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+🔱 TCC - Cliente del daemon
+Cliente liviano (sólo biblioteca estándar) para `tcc serve`: envía un request por el
+socket Unix (o por TCP local) y devuelve la respuesta, sin cargar el stack de TrinityCortex.
+"""
+
+import json
+import os
+from typing import Dict, Optional, Tuple
+
+TRINITY_HOME = os.path.expanduser("~/.trinity-cortex")
+DAEMON_SOCKET = os.getenv('TRINITY_SOCKET', f"{TRINITY_HOME}/tcc.sock")
+DAEMON_HOST = '127.0.0.1'
+# TCP desactivado por defecto (0): el socket Unix alcanza para los clientes locales
+DAEMON_PORT = int(os.getenv('TRINITY_DAEMON_PORT', '0'))
+# Token que el daemon exige en cada request; lo crea `tcc serve` (permisos 0600)
+DAEMON_TOKEN_FILE = os.getenv('TRINITY_DAEMON_TOKEN', f"{TRINITY_HOME}/daemon.token")
+CLIENT_TIMEOUT = 300.0         # segundos; una orquestación completa puede tardar
+
+# Prefijos de modo de orquestación ('seq: query', ...)
+MODE_PREFIXES = {
+    'seq:': 'sequential',
+    'consensus:': 'consensus',
+    'spec:': 'specialized',
+    'race:': 'race',
+    'hedged:': 'hedged',
+    'route:': 'routed',
+    'pipe:': 'pipelined'
+}
+
+
+class DaemonUnavailable(Exception):
+    """No hay un daemon `tcc serve` escuchando"""
+
+
+def parse_mode(text: str) -> Tuple[str, str]:
+    """Separar el prefijo de modo de la query: 'seq: x' -> ('sequential', 'x')"""
+    for prefix, mode in MODE_PREFIXES.items():
+        if text.startswith(prefix):
+            return mode, text[len(prefix):].strip()
+    return 'parallel', text
+
+
+def read_token() -> str:
+    """Token del daemon ('' si todavía no hay ninguno)"""
+    try:
+        with open(DAEMON_TOKEN_FILE, 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return ''
+
+
+def open_socket(timeout: float):
+    """Socket conectado al daemon: Unix si existe el archivo, si no TCP local (si está activado)"""
+    import socket
+
+    if os.path.exists(DAEMON_SOCKET):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        address = DAEMON_SOCKET
+    elif not DAEMON_PORT:
+        raise FileNotFoundError(f"No daemon socket at {DAEMON_SOCKET}")
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        address = (DAEMON_HOST, DAEMON_PORT)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(address)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def fetch(method: str, path: str, body: Optional[Dict] = None,
+          timeout: float = CLIENT_TIMEOUT) -> Tuple[int, bytes]:
+    """
+    (status, cuerpo) de un request al daemon. HTTP/1.1 mínimo sobre el socket (Connection:
+    close, se lee hasta EOF) en lugar de http.client, cuya importación duplica el arranque del CLI.
+    """
+    payload = json.dumps(body).encode() if body is not None else b''
+    head = (f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n"
+            f"Authorization: Bearer {read_token()}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n")
+    try:
+        sock = open_socket(timeout)
+    except (ConnectionRefusedError, FileNotFoundError) as e:
+        raise DaemonUnavailable(str(e))
+
+    chunks = []
+    with sock:
+        sock.sendall(head.encode() + payload)
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+
+    header, _, raw = b''.join(chunks).partition(b'\r\n\r\n')
+    try:
+        return int(header.split(b' ', 2)[1]), raw
+    except (IndexError, ValueError):
+        raise RuntimeError("invalid response from daemon")
+
+
+def request(method: str, path: str, body: Optional[Dict] = None,
+            timeout: float = CLIENT_TIMEOUT) -> Dict:
+    """Request JSON al daemon; un status distinto de 200 se convierte en RuntimeError"""
+    status, raw = fetch(method, path, body, timeout)
+    try:
+        data = json.loads(raw or b'{}')
+    except ValueError:
+        data = {'error': raw.decode(errors='replace')[:200]}
+    if status != 200:
+        raise RuntimeError(data.get('error', f"daemon error {status}"))
+    return data
+
+
+def orchestrate(text: str, mode: Optional[str] = None, timeout: float = CLIENT_TIMEOUT) -> Dict:
+    """Orquestar una query en el daemon (el modo sale del prefijo si no se indica)"""
+    if mode is None:
+        mode, text = parse_mode(text)
+    return request('POST', '/orchestrate', {'query': text, 'mode': mode}, timeout)
+
+
+def health(timeout: float = 2.0) -> Dict:
+    return request('GET', '/health', timeout=timeout)
+
+
+def shutdown() -> Dict:
+    return request('POST', '/shutdown', {})
+
+
+def metrics(timeout: float = 5.0) -> str:
+    """Histogramas de latencia del daemon en formato de texto de Prometheus"""
+    status, raw = fetch('GET', '/metrics', timeout=timeout)
+    if status != 200:
+        raise RuntimeError(f"daemon error {status}")
+    return raw.decode()
+
+
+def print_result(result: Dict, streamed: bool = False):
+    """Mostrar el resultado de una orquestación (respuesta unificada y resumen)"""
+    print("\n" + "=" * 50)
+    if result.get('unified_response') and not streamed:
+        print(result['unified_response'])
+
+    print("\n📊 Summary:")
+    summary = result.get('summary', {})
+    print(f"  ✓ Successful: {summary.get('successful', 0)}")
+    print(f"  ✗ Failed: {summary.get('failed', 0)}")
+    if result.get('routed_to'):
+        print(f"  🧭 Routed to: {result['routed_to']}")
+    if result.get('winner'):
+        cancelled = ", ".join(result.get('cancelled', [])) or "none"
+        print(f"  🏁 Winner: {result['winner']} (cancelled: {cancelled})")
+    for failed in result.get('results', []):
+        if not failed.get('success'):
+            print(f"      {failed['llm']}: {failed.get('error')}")
+    if summary.get('cached'):
+        print(f"  💾 Cached: {summary['cached']}")
+        for cached in result.get('results', []):
+            if cached.get('cached') and cached.get('similarity', 1.0) < 1.0:
+                print(f"      {cached['llm']}: near-duplicate (similarity {cached['similarity']:.2f})")
+    print(f"  ⏱️ Total Time: {summary.get('total_processing_time', 0):.2f}s")
+    if summary.get('tokens'):
+        print(f"  🔢 Tokens: {summary['tokens']['input']} in / {summary['tokens']['output']} out")
+    for llm, ttft in summary.get('time_to_first_token', {}).items():
+        print(f"      {llm}: first token after {ttft:.2f}s")
+    print(f"  🧠 Learnings: {summary.get('learnings_extracted', 0)}")
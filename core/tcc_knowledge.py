@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+🔱 TCC - Conocimiento compartido acotado
+Almacén de los aprendizajes que las LLMs comparten entre sí: límite de entradas y
+de tokens con desalojo LRU, sección de prompt compacta con presupuesto de tokens
+(lo más reciente primero) y persistencia por journal de deltas (append) que se
+compacta cuando crece demasiado respecto de lo vivo.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from tcc_prompt import estimate_tokens
+
+KNOWLEDGE_MAX_ENTRIES = 256         # aprendizajes vivos máximos
+KNOWLEDGE_MAX_TOKENS = 8000         # tokens estimados máximos en el almacén
+KNOWLEDGE_MAX_ITEM_CHARS = 500      # un aprendizaje más largo se trunca
+# Presupuesto de tokens de conocimiento compartido en cada prompt
+KNOWLEDGE_PROMPT_TOKENS = int(os.getenv('TRINITY_KNOWLEDGE_TOKENS', '300'))
+# Compactar el journal cuando tiene N veces más líneas que entradas vivas
+JOURNAL_COMPACT_RATIO = 4
+JOURNAL_MIN_COMPACT = 64            # líneas mínimas antes de considerar compactar
+
+
+class SharedKnowledge:
+    """
+    Aprendizajes compartidos como (fuente, conocimiento), en orden de uso (LRU).
+    Volver a aprender algo ya conocido lo refresca en lugar de duplicarlo.
+
+    El journal es JSONL compacto: una línea [fuente, conocimiento, timestamp] por
+    cada add(). Al cargar se reproducen las líneas con las mismas reglas de
+    desalojo, así que no hace falta registrar las bajas.
+    """
+
+    def __init__(self, journal_path: Optional[str] = None,
+                 max_entries: int = KNOWLEDGE_MAX_ENTRIES,
+                 max_tokens: int = KNOWLEDGE_MAX_TOKENS):
+        self.journal_path = journal_path
+        self.max_entries = max_entries
+        self.max_tokens = max_tokens
+        self.entries: "OrderedDict[Tuple[str, str], Dict]" = OrderedDict()
+        self.tokens = 0
+        self.evictions = 0
+        self.pending: List[list] = []    # deltas todavía no escritos en el journal
+        self.journal_lines = 0
+        self.compactions = 0
+        self.lock = threading.Lock()     # add() en el event loop, persist() en un executor
+        if journal_path:
+            self.load()
+
+    def add(self, source: str, knowledge: str, timestamp: Optional[float] = None):
+        """Registrar (o refrescar) un aprendizaje y desalojar lo más viejo si excede los límites"""
+        knowledge = " ".join(str(knowledge).split())[:KNOWLEDGE_MAX_ITEM_CHARS]
+        if not knowledge:
+            return
+        timestamp = timestamp or time.time()
+        with self.lock:
+            self.apply(source, knowledge, timestamp)
+            self.pending.append([source, knowledge, round(timestamp, 3)])
+
+    def apply(self, source: str, knowledge: str, timestamp: float):
+        key = (source, knowledge)
+        entry = self.entries.get(key)
+        if entry is not None:
+            entry['updated'] = timestamp
+            self.entries.move_to_end(key)
+            return
+        tokens = estimate_tokens(f"{source}: {knowledge}")
+        self.entries[key] = {'tokens': tokens, 'updated': timestamp}
+        self.tokens += tokens
+        while self.entries and (len(self.entries) > self.max_entries or self.tokens > self.max_tokens):
+            _, evicted = self.entries.popitem(last=False)
+            self.tokens -= evicted['tokens']
+            self.evictions += 1
+
+    def prompt_section(self, budget: int = KNOWLEDGE_PROMPT_TOKENS) -> str:
+        """Líneas '- fuente: conocimiento', de la más reciente a la más vieja, dentro del presupuesto"""
+        lines = []
+        used = 0
+        with self.lock:
+            for (source, knowledge), entry in reversed(self.entries.items()):
+                if used + entry['tokens'] > budget:
+                    break
+                lines.append(f"- {source}: {knowledge}")
+                used += entry['tokens']
+        return "\n".join(lines)
+
+    def items(self) -> List[Dict]:
+        with self.lock:
+            return [{'source': source, 'knowledge': knowledge, 'updated': entry['updated']}
+                    for (source, knowledge), entry in self.entries.items()]
+
+    def load(self):
+        """Reconstruir el estado reproduciendo el journal (una línea final cortada se ignora)"""
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, 'r') as f:
+            for line in f:
+                try:
+                    source, knowledge, timestamp = json.loads(line)
+                except ValueError:
+                    continue
+                self.apply(source, knowledge, timestamp)
+                self.journal_lines += 1
+
+    def import_legacy(self, shared: Dict):
+        """Importar el shared_knowledge de un active_context.json anterior ({llm: conocimiento})"""
+        for source, knowledge in shared.items():
+            if isinstance(knowledge, str):
+                self.add(source, knowledge)
+
+    def persist(self):
+        """Escribir los deltas pendientes al journal, o compactarlo si creció demasiado"""
+        if not self.journal_path:
+            return
+        with self.lock:
+            deltas, self.pending = self.pending, []
+            compact = (self.journal_lines + len(deltas) >= JOURNAL_MIN_COMPACT and
+                       self.journal_lines + len(deltas) > JOURNAL_COMPACT_RATIO * len(self.entries))
+            if compact:
+                deltas = [[source, knowledge, round(entry['updated'], 3)]
+                          for (source, knowledge), entry in self.entries.items()]
+        if not deltas and not compact:
+            return
+
+        if compact:
+            temp_path = f"{self.journal_path}.{os.getpid()}.tmp"
+            with open(temp_path, 'w') as f:
+                f.write(self.serialize(deltas))
+            os.replace(temp_path, self.journal_path)
+            self.journal_lines = len(deltas)
+            self.compactions += 1
+        else:
+            with open(self.journal_path, 'a') as f:
+                f.write(self.serialize(deltas))
+            self.journal_lines += len(deltas)
+
+    @staticmethod
+    def serialize(rows: Iterable[list]) -> str:
+        return "".join(json.dumps(row, separators=(',', ':'), ensure_ascii=False) + "\n" for row in rows)
+
+    def stats(self) -> Dict:
+        return {
+            'entries': len(self.entries),
+            'tokens': self.tokens,
+            'evictions': self.evictions,
+            'journal_lines': self.journal_lines,
+            'compactions': self.compactions
+        }
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+🔱 TCC - Trazas de latencia y métricas
+Cada micro-conversación lleva una traza con el tiempo de sus etapas (cache, memoria,
+enriquecimiento, limitador, red, aprendizajes, escritura). Las trazas alimentan
+histogramas estilo HDR (buckets log-lineales, error relativo acotado) por proveedor,
+etapa y modo, que se exportan en formato de texto de Prometheus y, opcionalmente,
+como una línea JSONL por conversación.
+"""
+
+import contextlib
+import contextvars
+import json
+import os
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Histogramas: valores en microsegundos; 2^(bits-1) sub-buckets por potencia de 2
+HISTOGRAM_SUB_BUCKET_BITS = 7      # error relativo < 1/64 (~1.6%)
+HISTOGRAM_UNIT = 1e-6              # segundos por unidad registrada
+# Límites 'le' (segundos) de los buckets exportados a Prometheus
+PROMETHEUS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Archivo JSONL de trazas (vacío = desactivado)
+TRACE_FILE = os.getenv('TRINITY_TRACE_FILE', '')
+
+# Etapas de una micro-conversación, en orden
+STAGES = ('cache_lookup', 'memory', 'enrich', 'rate_limit', 'network', 'learnings', 'db_write')
+# Etiqueta de los modos fuera de la lista conocida (cardinalidad acotada)
+OTHER_MODE = 'other'
+
+METRIC_HELP = {
+    'trinity_stage_seconds': 'Latency of each micro-conversation stage',
+    'trinity_conversation_seconds': 'Latency of a whole micro-conversation',
+    'trinity_orchestration_seconds': 'Wall-clock latency of an orchestration'
+}
+
+_SUB_BUCKETS = 1 << HISTOGRAM_SUB_BUCKET_BITS
+_HALF = _SUB_BUCKETS >> 1
+
+# Traza de la micro-conversación en curso (cada tarea tiene la suya)
+CURRENT_TRACE = contextvars.ContextVar('trinity_trace', default=None)
+
+
+class LatencyHistogram:
+    """
+    Histograma log-lineal (como HdrHistogram): valores exactos hasta 2^bits unidades
+    y, por encima, 2^(bits-1) sub-buckets por potencia de 2. Memoria proporcional a
+    los buckets usados, percentiles con error relativo acotado.
+    """
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    @staticmethod
+    def bucket_index(value: int) -> int:
+        if value < _SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - HISTOGRAM_SUB_BUCKET_BITS
+        return shift * _HALF + (value >> shift)
+
+    @staticmethod
+    def bucket_bounds(index: int) -> Tuple[int, int]:
+        """Rango [lo, hi] de valores (en unidades) de un bucket"""
+        if index < _SUB_BUCKETS:
+            return index, index
+        shift = index // _HALF - 1
+        top = index - shift * _HALF
+        return top << shift, ((top + 1) << shift) - 1
+
+    def record(self, seconds: float):
+        value = max(0, int(seconds / HISTOGRAM_UNIT))
+        index = self.bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def merge(self, other: 'LatencyHistogram'):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """Valor (segundos) bajo el que cae `percentile` (0-1) de las muestras"""
+        if not self.count:
+            return None
+        target = max(1, percentile * self.count)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self.bucket_bounds(index)[1] * HISTOGRAM_UNIT, self.max)
+        return self.max
+
+    def cumulative(self, bounds: Tuple[float, ...]) -> List[int]:
+        """
+        Muestras <= cada límite. Un bucket cuenta sólo si entero cae por debajo (límite
+        superior <= límite): uno que cruza el límite no entra, nunca se cuentan de más.
+        """
+        ordered = sorted(self.counts.items())
+        result = []
+        for bound in bounds:
+            limit = bound / HISTOGRAM_UNIT
+            result.append(sum(count for index, count in ordered if self.bucket_bounds(index)[1] <= limit))
+        return result
+
+    def summary(self) -> Dict:
+        return {
+            'count': self.count,
+            'mean': self.sum / self.count if self.count else None,
+            'p50': self.percentile(0.50),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+            'max': self.max
+        }
+
+
+class Trace:
+    """Tiempos por etapa de una micro-conversación"""
+
+    def __init__(self, provider: str, mode: str):
+        self.provider = provider
+        self.mode = mode
+        self.started = time.perf_counter()
+        self.timestamp = time.time()
+        self.stages: Dict[str, float] = {}
+        self.outcome = 'ok'
+        self.token = None
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            # Una etapa puede repetirse (reintentos): se acumula
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - started
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+
+def stage(name: str):
+    """Cronometrar una etapa de la traza en curso (no hace nada fuera de una conversación)"""
+    trace = CURRENT_TRACE.get()
+    return trace.stage(name) if trace else contextlib.nullcontext()
+
+
+def stage_seconds(name: str) -> Optional[float]:
+    """Tiempo acumulado de una etapa de la traza en curso (None si la etapa no corrió)"""
+    trace = CURRENT_TRACE.get()
+    return trace.stages.get(name) if trace else None
+
+
+def escape_label(value) -> str:
+    """Valor de etiqueta en formato de texto de Prometheus: escapar \\, " y saltos de línea"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics:
+    """
+    Registro de histogramas por (métrica, etiquetas) y escritor opcional de trazas JSONL.
+    Con `modes`, la etiqueta mode sólo toma esos valores (el resto se registra como 'other').
+    """
+
+    def __init__(self, trace_path: Optional[str] = TRACE_FILE, modes: Optional[Sequence[str]] = None):
+        self.histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], LatencyHistogram] = {}
+        self.modes = frozenset(modes) if modes else None
+        self.trace_path = trace_path or None
+        self.trace_file = None
+        self.traces = 0
+
+    def mode_label(self, mode: str) -> str:
+        return mode if self.modes is None or mode in self.modes else OTHER_MODE
+
+    def observe(self, metric: str, seconds: float, **labels: str):
+        if 'mode' in labels:
+            labels['mode'] = self.mode_label(labels['mode'])
+        key = (metric, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = LatencyHistogram()
+        histogram.record(seconds)
+
+    def start(self, provider: str, mode: str) -> Trace:
+        """Abrir la traza de una micro-conversación en el contexto actual"""
+        trace = Trace(provider, self.mode_label(mode))
+        trace.token = CURRENT_TRACE.set(trace)
+        return trace
+
+    def finish(self, trace: Trace):
+        """Cerrar la traza: registrar etapas y total, y escribir la línea JSONL"""
+        total = trace.elapsed()
+        try:
+            CURRENT_TRACE.reset(trace.token)
+        except ValueError:
+            pass  # generador cerrado desde otro contexto: no hay nada que restaurar
+        for name, seconds in trace.stages.items():
+            self.observe('trinity_stage_seconds', seconds, provider=trace.provider,
+                         stage=name, mode=trace.mode)
+        self.observe('trinity_conversation_seconds', total, provider=trace.provider,
+                     mode=trace.mode, outcome=trace.outcome)
+        if self.trace_path:
+            self.write_trace({
+                'ts': round(trace.timestamp, 3),
+                'provider': trace.provider,
+                'mode': trace.mode,
+                'outcome': trace.outcome,
+                'total_ms': round(total * 1000, 3),
+                'stages_ms': {name: round(seconds * 1000, 3) for name, seconds in trace.stages.items()}
+            })
+
+    def write_trace(self, record: Dict):
+        if self.trace_file is None:
+            self.trace_file = open(self.trace_path, 'a', buffering=1)  # una línea por write
+        self.trace_file.write(json.dumps(record, separators=(',', ':')) + "\n")
+        self.traces += 1
+
+    def close(self):
+        if self.trace_file:
+            self.trace_file.close()
+            self.trace_file = None
+
+    def summary(self) -> Dict[str, List[Dict]]:
+        """Percentiles por serie: {métrica: [{etiquetas..., count, p50, p95, p99, ...}]}"""
+        result: Dict[str, List[Dict]] = {}
+        for (metric, labels), histogram in sorted(self.histograms.items()):
+            result.setdefault(metric, []).append({**dict(labels), **histogram.summary()})
+        return result
+
+    def grouped(self, metric: str, by: str) -> List[Dict]:
+        """Percentiles de `metric` agregando todas las series con el mismo valor de la etiqueta `by`"""
+        merged: Dict[str, LatencyHistogram] = {}
+        for (name, labels), histogram in self.histograms.items():
+            if name == metric:
+                value = dict(labels).get(by, '')
+                merged.setdefault(value, LatencyHistogram()).merge(histogram)
+        return [{by: value, **merged[value].summary()} for value in sorted(merged)]
+
+    def prometheus(self) -> str:
+        """Exportación en formato de texto de Prometheus (histogramas con buckets 'le')"""
+        lines = []
+        last_metric = None
+        for (metric, labels), histogram in sorted(self.histograms.items()):
+            if metric != last_metric:
+                lines.append(f"# HELP {metric} {METRIC_HELP.get(metric, metric)}")
+                lines.append(f"# TYPE {metric} histogram")
+                last_metric = metric
+            base = ",".join(f'{key}="{escape_label(value)}"' for key, value in labels)
+            prefix = f"{base}," if base else ""
+            for bound, count in zip(PROMETHEUS_BUCKETS, histogram.cumulative(PROMETHEUS_BUCKETS)):
+                lines.append(f'{metric}_bucket{{{prefix}le="{bound}"}} {count}')
+            lines.append(f'{metric}_bucket{{{prefix}le="+Inf"}} {histogram.count}')
+            lines.append(f"{metric}_sum{{{base}}} {histogram.sum:.6f}")
+            lines.append(f"{metric}_count{{{base}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
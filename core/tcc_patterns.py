@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+🔱 TCC - Registro de patrones y clasificador compilado
+Un solo registro de palabras clave (intenciones, especialidades y patrones de
+aprendizaje) configurable desde un archivo JSON, y un matcher que lo compila por
+conjunto de categorías: una pasada devuelve todas las etiquetas que aparecen en un
+texto, con la misma semántica de subcadena que los `any(word in texto)` anteriores.
+
+Estrategia: en CPython `word in texto` es una búsqueda en C, más rápida por palabra
+que cualquier regex o autómata en Python puro; lo que escala mal es repetirla por
+cada palabra. Con pocas palabras se busca cada palabra distinta una sola vez (texto
+en minúsculas una vez, saltando etiquetas ya encontradas); con muchas, el texto se
+parte en tokens una vez y cada token distinto se resuelve contra todas las palabras
+con un memo, así el costo deja de crecer con el tamaño del registro.
+"""
+
+import json
+import os
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+# Archivo de patrones del usuario (se combina sobre DEFAULT_PATTERNS)
+PATTERNS_FILE = os.getenv('TRINITY_PATTERNS', os.path.expanduser("~/.trinity-cortex/patterns.json"))
+# Con más palabras que esto (sin distinción de mayúsculas ni espacios) se usa el índice de tokens
+DIRECT_SCAN_MAX_WORDS = 24
+TOKEN_MEMO_SIZE = 65536        # tokens distintos recordados antes de vaciar el memo
+
+# Registro por defecto: {categoría: {etiqueta: {'words': [...], metadatos...}}}
+# El orden de las etiquetas es el de prioridad (p. ej. la primera intención gana).
+DEFAULT_PATTERNS = {
+    'specialty': {
+        'strategy': {'words': ['strategy', 'plan', 'analyze', 'design'], 'provider': 'claude',
+                     'prompt': "Provide strategic analysis for: {query}", 'icon': '📊'},
+        'code': {'words': ['code', 'implement', 'function', 'api', 'script'], 'provider': 'codex',
+                 'prompt': "Provide code implementation for: {query}", 'icon': '💻'},
+        'research': {'words': ['research', 'optimize', 'improve', 'compare'], 'provider': 'gemini',
+                     'prompt': "Research and optimize: {query}", 'icon': '🔬'}
+    },
+    'learning': {
+        'code_structure': {'words': ['import', 'def ', 'class '], 'case_sensitive': True,
+                           'knowledge': 'Code pattern detected', 'confidence': 0.9},
+        'error_handling': {'words': ['error', 'bug'],
+                           'knowledge': 'Error or bug mentioned', 'confidence': 0.8},
+        'optimization': {'words': ['optimize', 'improve'],
+                         'knowledge': 'Optimization suggestion', 'confidence': 0.85}
+    },
+    'intent': {
+        'creative': {'words': ['create', 'write', 'imagine', 'story'],
+                     'complexity': 'high', 'optimal_model': 'claude'},
+        'analytical': {'words': ['analyze', 'explain', 'compare'],
+                       'complexity': 'medium', 'optimal_model': 'gemini'},
+        'mathematical': {'words': ['calculate', 'solve', 'math'],
+                         'complexity': 'medium', 'optimal_model': 'gpt4'}
+    }
+}
+
+Key = Tuple[str, str]   # (categoría, etiqueta)
+
+
+def normalize_spec(spec) -> Dict:
+    """Una lista de palabras es atajo de {'words': lista}"""
+    if isinstance(spec, list):
+        spec = {'words': spec}
+    if not isinstance(spec, dict) or not isinstance(spec.get('words'), list):
+        raise ValueError(f"pattern needs a 'words' list: {spec!r}")
+    words = [str(word) for word in spec['words'] if word]
+    case_sensitive = bool(spec.get('case_sensitive'))
+    return {**spec, 'words': words if case_sensitive else [word.lower() for word in words],
+            'case_sensitive': case_sensitive}
+
+
+def load_registry(path: Optional[str] = PATTERNS_FILE) -> Dict[str, Dict[str, Dict]]:
+    """
+    DEFAULT_PATTERNS combinado con el archivo `path`, si existe. El archivo tiene la
+    misma forma; una etiqueta existente se reemplaza, una nueva se agrega al final y
+    una etiqueta en null se elimina. Un archivo inválido se ignora con un aviso.
+    """
+    registry = {category: {label: normalize_spec(spec) for label, spec in labels.items()}
+                for category, labels in DEFAULT_PATTERNS.items()}
+    if not path or not os.path.exists(path):
+        return registry
+
+    try:
+        with open(path, 'r') as f:
+            overrides = json.load(f)
+        merged = {category: dict(labels) for category, labels in registry.items()}
+        for category, labels in overrides.items():
+            target = merged.setdefault(category, {})
+            for label, spec in labels.items():
+                if spec is None:
+                    target.pop(label, None)
+                else:
+                    target[label] = normalize_spec(spec)
+    except (OSError, ValueError, AttributeError) as e:
+        print(f"⚠️ Ignoring pattern file {path}: {e}")
+        return registry
+    return merged
+
+
+class CompiledPatterns:
+    """Tablas de búsqueda de un conjunto de categorías (ver la estrategia en el módulo)"""
+
+    def __init__(self, registry: Dict[str, Dict[str, Dict]], categories: Sequence[str]):
+        self.categories = tuple(categories)
+        self.order: List[Key] = []
+        words: Dict[Tuple[str, bool], set] = {}
+        for category in self.categories:
+            for label, spec in registry.get(category, {}).items():
+                self.order.append((category, label))
+                for word in spec['words']:
+                    words.setdefault((word, spec['case_sensitive']), set()).add((category, label))
+
+        # Sólo las palabras sin distinción de mayúsculas y sin espacios caben dentro de un token
+        indexable = [(word, frozenset(keys)) for (word, case_sensitive), keys in words.items()
+                     if not case_sensitive and not any(ch.isspace() for ch in word)]
+        self.indexed: Tuple[Tuple[str, FrozenSet[Key]], ...] = ()
+        if len(indexable) > DIRECT_SCAN_MAX_WORDS:
+            self.indexed = tuple(indexable)
+        indexed_words = {word for word, _ in self.indexed}
+        self.direct: Tuple[Tuple[str, FrozenSet[Key], bool], ...] = tuple(
+            (word, frozenset(keys), case_sensitive) for (word, case_sensitive), keys in words.items()
+            if case_sensitive or word not in indexed_words
+        )
+        self.memo: Dict[str, FrozenSet[Key]] = {}
+
+    def scan(self, text: str) -> Dict[str, List[str]]:
+        found = set()
+        lowered = None
+        for word, keys, case_sensitive in self.direct:
+            if keys <= found:
+                continue
+            if case_sensitive:
+                hit = word in text
+            else:
+                if lowered is None:
+                    lowered = text.lower()
+                hit = word in lowered
+            if hit:
+                found |= keys
+
+        if self.indexed:
+            if lowered is None:
+                lowered = text.lower()
+            memo = self.memo
+            for token in set(lowered.split()):
+                keys = memo.get(token)
+                if keys is None:
+                    if len(memo) >= TOKEN_MEMO_SIZE:
+                        memo.clear()
+                    keys = memo[token] = frozenset(
+                        key for word, word_keys in self.indexed if word in token for key in word_keys
+                    )
+                if keys:
+                    found |= keys
+
+        result: Dict[str, List[str]] = {category: [] for category in self.categories}
+        for category, label in self.order:
+            if (category, label) in found:
+                result[category].append(label)
+        return result
+
+
+class PatternMatcher:
+    """
+    Clasificador sobre un registro de patrones: scan(texto) devuelve, por categoría,
+    las etiquetas presentes en orden de prioridad. Cada conjunto de categorías se
+    compila una vez.
+    """
+
+    def __init__(self, registry: Optional[Dict[str, Dict[str, Dict]]] = None):
+        self.registry = registry if registry is not None else load_registry()
+        self.compiled: Dict[Tuple[str, ...], CompiledPatterns] = {}
+
+    def scan(self, text: str, categories: Optional[Sequence[str]] = None) -> Dict[str, List[str]]:
+        key = tuple(categories) if categories else tuple(self.registry)
+        compiled = self.compiled.get(key)
+        if compiled is None:
+            compiled = self.compiled[key] = CompiledPatterns(self.registry, key)
+        return compiled.scan(text)
+
+    def spec(self, category: str, label: str) -> Dict:
+        """Metadatos de una etiqueta (knowledge, confidence, provider, ...)"""
+        return self.registry.get(category, {}).get(label, {})
+
+
+DEFAULT_MATCHER: Optional[PatternMatcher] = None
+
+
+def default_matcher() -> PatternMatcher:
+    """Matcher compartido del proceso sobre PATTERNS_FILE (se carga al primer uso)"""
+    global DEFAULT_MATCHER
+    if DEFAULT_MATCHER is None:
+        DEFAULT_MATCHER = PatternMatcher()
+    return DEFAULT_MATCHER
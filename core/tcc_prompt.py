@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+🔱 TCC - Armado de prompts con presupuesto de tokens
+Estimación local de tokens (aproximación de un tokenizer BPE, sin dependencias) y
+PromptBuilder: reparte un presupuesto entre secciones según su prioridad y recorta
+o descarta las de menor prioridad para que cada llamada tenga un costo predecible.
+"""
+
+import os
+import re
+from typing import Dict, List, Tuple
+
+# Presupuesto de tokens del prompt enriquecido (query + objetivo + memorias + conocimiento)
+PROMPT_TOKEN_BUDGET = int(os.getenv('TRINITY_PROMPT_TOKENS', '2000'))
+MIN_SECTION_TOKENS = 8         # una sección recortada a menos de esto se descarta
+TRUNCATION_MARK = " …"
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Tokens aproximados de un texto: cada signo de puntuación es un token, cada palabra
+    ASCII uno por cada 6 caracteres (las palabras comunes son un solo token) y cada
+    palabra con otros caracteres uno por cada 3 bytes UTF-8 (~1 por carácter CJK).
+    """
+    tokens = 0
+    for piece in TOKEN_PATTERN.findall(text):
+        if piece.isascii():
+            tokens += (len(piece) + 5) // 6
+        else:
+            tokens += (len(piece.encode('utf-8')) + 2) // 3
+    return tokens
+
+
+def truncate_to_tokens(text: str, tokens: int) -> str:
+    """Recortar un texto a `tokens`: por líneas completas si se puede, si no por caracteres"""
+    if estimate_tokens(text) <= tokens:
+        return text
+    budget = tokens - estimate_tokens(TRUNCATION_MARK)
+    lines = []
+    used = 0
+    for line in text.splitlines():
+        cost = estimate_tokens(line)
+        if used + cost > budget:
+            break
+        lines.append(line)
+        used += cost
+    if lines:
+        return "\n".join(lines) + TRUNCATION_MARK
+
+    # Una sola línea larga: cortar por caracteres (~4 por token) y ajustar
+    cut = text[:max(budget, 0) * 4]
+    while cut and estimate_tokens(cut) > budget:
+        cut = cut[:int(len(cut) * 0.9)]
+    return cut.rstrip() + TRUNCATION_MARK if cut else ""
+
+
+class PromptBuilder:
+    """
+    Prompt armado por secciones con prioridad (0 = la más importante).
+
+    El presupuesto se asigna en orden de prioridad: las secciones requeridas entran
+    siempre, el resto entra completo si alcanza, recortado si queda lugar para al menos
+    MIN_SECTION_TOKENS, o se descarta. El prompt final respeta el orden en que se
+    agregaron las secciones.
+    """
+
+    def __init__(self, budget: int = PROMPT_TOKEN_BUDGET):
+        self.budget = budget
+        self.sections: List[Dict] = []
+
+    def add(self, name: str, text: str, priority: int, header: str = "",
+            required: bool = False) -> 'PromptBuilder':
+        if text:
+            self.sections.append({'name': name, 'text': text, 'priority': priority,
+                                  'header': header, 'required': required})
+        return self
+
+    def build(self) -> Tuple[str, Dict]:
+        """(prompt, reporte) con los tokens estimados por sección y lo recortado o descartado"""
+        remaining = self.budget
+        kept: Dict[int, str] = {}
+        report = {'budget': self.budget, 'sections': {}, 'truncated': [], 'dropped': []}
+
+        order = sorted(range(len(self.sections)),
+                       key=lambda i: (not self.sections[i]['required'], self.sections[i]['priority'], i))
+        for index in order:
+            section = self.sections[index]
+            overhead = estimate_tokens(section['header'])
+            tokens = estimate_tokens(section['text'])
+            text = section['text']
+            if not section['required'] and overhead + tokens > remaining:
+                available = remaining - overhead
+                text = truncate_to_tokens(text, available) if available >= MIN_SECTION_TOKENS else ""
+                if not text:
+                    report['dropped'].append(section['name'])
+                    continue
+                tokens = estimate_tokens(text)
+                report['truncated'].append(section['name'])
+            kept[index] = section['header'] + text
+            remaining -= overhead + tokens
+            report['sections'][section['name']] = overhead + tokens
+
+        report['tokens'] = self.budget - remaining
+        return "\n\n".join(kept[i] for i in sorted(kept)) + "\n", report
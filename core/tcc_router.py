@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+🔱 TCC - Ruteo adaptativo por costo y latencia
+Estimaciones en línea (EWMA) de latencia, tasa de error y costo por llamada de cada
+proveedor, cargadas al arrancar desde la tabla `interactions` y actualizadas con cada
+llamada. El router elige el proveedor más barato cuyo p95 estimado cumple el SLO; con
+una pequeña probabilidad vuelve a probar proveedores con pocos datos o datos viejos
+(exploración epsilon-greedy), para notar cuando uno que estaba lento se recupera.
+"""
+
+import math
+import os
+import random
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence
+
+# Precios por 1k tokens en USD: (entrada, salida)
+PROVIDER_PRICES = {
+    'claude': (0.003, 0.015),
+    'codex': (0.03, 0.06),
+    'gemini': (0.0005, 0.0015)
+}
+DEFAULT_PRICE = (0.01, 0.03)
+DEFAULT_CALL_TOKENS = (500, 500)   # tokens supuestos de una llamada sin historial
+
+# Objetivo de latencia (p95 por llamada, segundos) y tasa de error tolerada
+ROUTER_SLO = float(os.getenv('TRINITY_SLO', '8.0'))
+ROUTER_MAX_ERROR_RATE = 0.25
+ROUTER_ALPHA = 0.1                 # peso de cada observación nueva (~ últimas 20 llamadas)
+ROUTER_HISTORY = 500               # interacciones recientes leídas de la memoria al arrancar
+ROUTER_MIN_SAMPLES = 3             # con menos observaciones la estimación es provisoria
+ROUTER_STALE_AFTER = 900.0         # segundos sin observaciones: la estimación está vieja
+ROUTER_EXPLORATION = 0.05          # probabilidad de re-probar un proveedor provisorio o viejo
+P95_Z = 1.645                      # p95 de una latencia log-normal: exp(media + z·desvío)
+MIN_LATENCY = 0.001
+
+
+class ProviderEstimate:
+    """EWMA de log-latencia (media y varianza), tasa de error y costo por llamada exitosa"""
+
+    def __init__(self):
+        self.samples = 0
+        self.log_mean = 0.0
+        self.log_var = 0.0
+        self.latency_samples = 0
+        self.error_rate = 0.0
+        self.cost: Optional[float] = None
+        self.updated = 0.0
+
+    def observe(self, seconds: float, success: bool, cost: Optional[float], timestamp: float):
+        self.samples += 1
+        alpha = max(ROUTER_ALPHA, 1.0 / self.samples)
+        self.error_rate += alpha * ((0.0 if success else 1.0) - self.error_rate)
+        self.updated = max(self.updated, timestamp)
+        if not success:
+            return  # una falla rápida (circuito abierto, sin API key) no dice nada de la latencia
+
+        self.latency_samples += 1
+        alpha = max(ROUTER_ALPHA, 1.0 / self.latency_samples)
+        delta = math.log(max(seconds, MIN_LATENCY)) - self.log_mean
+        self.log_mean += alpha * delta
+        self.log_var = (1 - alpha) * (self.log_var + alpha * delta * delta)
+        if cost is not None:
+            self.cost = cost if self.cost is None else self.cost + alpha * (cost - self.cost)
+
+    def p95(self) -> Optional[float]:
+        if not self.latency_samples:
+            return None
+        return math.exp(self.log_mean + P95_Z * math.sqrt(self.log_var))
+
+    def provisional(self, now: float) -> bool:
+        return self.samples < ROUTER_MIN_SAMPLES or now - self.updated > ROUTER_STALE_AFTER
+
+
+class Router:
+    """
+    Elige proveedores para cumplir un SLO de latencia al menor costo esperado.
+
+    Un proveedor es viable si su p95 estimado cumple el SLO y su tasa de error no supera
+    ROUTER_MAX_ERROR_RATE (sin datos, se lo supone viable). El costo esperado divide el
+    costo por llamada entre la tasa de éxito (los reintentos también se pagan). Si ninguno
+    es viable se ordena por p95, para degradar lo menos posible.
+    """
+
+    def __init__(self, slo: float = ROUTER_SLO, prices: Optional[Dict] = None,
+                 exploration: float = ROUTER_EXPLORATION, seed: Optional[int] = None):
+        self.slo = slo
+        self.prices = prices or PROVIDER_PRICES
+        self.exploration = exploration
+        self.rng = random.Random(seed)
+        self.estimates: Dict[str, ProviderEstimate] = {}
+        self.decisions: Dict[str, int] = {}
+        self.explorations = 0
+
+    def call_cost(self, provider: str, input_tokens: Optional[int], output_tokens: Optional[int]) -> float:
+        price_in, price_out = self.prices.get(provider, DEFAULT_PRICE)
+        return ((input_tokens or 0) * price_in + (output_tokens or 0) * price_out) / 1000
+
+    def observe(self, provider: str, seconds: float, success: bool,
+                usage: Optional[Dict] = None, timestamp: Optional[float] = None):
+        """Registrar el resultado de una llamada al proveedor (no las respuestas cacheadas)"""
+        cost = None
+        if usage and (usage.get('input_tokens') or usage.get('output_tokens')):
+            cost = self.call_cost(provider, usage.get('input_tokens'), usage.get('output_tokens'))
+        estimate = self.estimates.setdefault(provider, ProviderEstimate())
+        estimate.observe(seconds, success, cost, timestamp or time.time())
+
+    def load(self, rows: Iterable[Sequence]):
+        """
+        Reproducir interacciones pasadas, de la más vieja a la más nueva:
+        (llm, processing_time, success, input_tokens, output_tokens, tokens_used, timestamp ISO)
+        """
+        for llm, seconds, success, input_tokens, output_tokens, tokens_used, stamp in rows:
+            try:
+                timestamp = datetime.fromisoformat(stamp).timestamp()
+            except (TypeError, ValueError):
+                timestamp = 0.0
+            usage = None
+            if input_tokens or output_tokens:
+                usage = {'input_tokens': input_tokens, 'output_tokens': output_tokens}
+            elif tokens_used:
+                # Filas anteriores a la separación entrada/salida: repartir en partes iguales
+                usage = {'input_tokens': tokens_used // 2, 'output_tokens': tokens_used - tokens_used // 2}
+            self.observe(llm, seconds or 0.0, bool(success), usage, timestamp)
+
+    def expected_cost(self, provider: str) -> float:
+        estimate = self.estimates.get(provider)
+        cost = estimate.cost if estimate and estimate.cost is not None else None
+        if cost is None:
+            cost = self.call_cost(provider, *DEFAULT_CALL_TOKENS)
+        error_rate = estimate.error_rate if estimate else 0.0
+        return cost / max(1.0 - error_rate, 0.05)
+
+    def viable(self, provider: str, slo: Optional[float] = None) -> bool:
+        estimate = self.estimates.get(provider)
+        if estimate is None:
+            return True
+        p95 = estimate.p95()
+        return ((p95 is None or p95 <= (slo or self.slo)) and
+                estimate.error_rate <= ROUTER_MAX_ERROR_RATE)
+
+    def rank(self, candidates: List[str], slo: Optional[float] = None) -> List[str]:
+        """Viables por costo esperado (y p95); después los no viables por p95"""
+        def p95(provider):
+            estimate = self.estimates.get(provider)
+            return (estimate.p95() if estimate else None) or 0.0
+
+        viable = [p for p in candidates if self.viable(p, slo)]
+        rest = [p for p in candidates if p not in viable]
+        return (sorted(viable, key=lambda p: (self.expected_cost(p), p95(p))) +
+                sorted(rest, key=lambda p: (p95(p), self.estimates[p].error_rate)))
+
+    def choose(self, candidates: List[str], slo: Optional[float] = None,
+               preferred: Optional[str] = None) -> List[str]:
+        """
+        Candidatos en orden de preferencia (el primero es el elegido, el resto son
+        respaldos). `preferred` (p. ej. el especialista) gana si es viable.
+        """
+        order = self.rank(candidates, slo)
+        if preferred in candidates and self.viable(preferred, slo):
+            order.remove(preferred)
+            order.insert(0, preferred)
+
+        now = time.time()
+        provisional = [p for p in order[1:]
+                       if p not in self.estimates or self.estimates[p].provisional(now)]
+        if provisional and self.rng.random() < self.exploration:
+            # Exploración: el candidato con datos más viejos pasa adelante
+            probe = min(provisional, key=lambda p: self.estimates[p].updated if p in self.estimates else 0.0)
+            order.remove(probe)
+            order.insert(0, probe)
+            self.explorations += 1
+
+        if order:
+            self.decisions[order[0]] = self.decisions.get(order[0], 0) + 1
+        return order
+
+    def stats(self) -> Dict:
+        providers = {}
+        for name, estimate in sorted(self.estimates.items()):
+            providers[name] = {
+                'samples': estimate.samples,
+                'p95': estimate.p95(),
+                'error_rate': round(estimate.error_rate, 4),
+                'expected_cost': round(self.expected_cost(name), 6),
+                'viable': self.viable(name)
+            }
+        return {
+            'slo': self.slo,
+            'providers': providers,
+            'decisions': dict(self.decisions),
+            'explorations': self.explorations
+        }
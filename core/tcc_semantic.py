@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+🔱 TCC - Memoria semántica
+Índice vectorial local (float32 mapeado en memoria) con búsqueda top-k por coseno.
+Funciona offline: el embedder por defecto usa n-gramas hasheados, sin red ni modelos.
+"""
+
+import json
+import os
+import re
+import threading
+import zlib
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+SEMANTIC_DIM = 256             # dimensiones del embedding (múltiplo de 64)
+SEMANTIC_NGRAM = 3             # n-gramas de caracteres por token
+EXACT_SEARCH_LIMIT = 50000     # hasta aquí se calcula el coseno contra todo el índice
+COARSE_SAMPLE = 65536          # vectores de muestra para entrenar el índice grueso
+COARSE_ITERATIONS = 8          # iteraciones de k-means
+COARSE_RETRAIN_GROWTH = 4      # re-entrenar cuando el índice creció 4x desde el entrenamiento
+PROJECTED_DIM = 64             # dimensiones de la proyección PCA para el primer filtrado
+PROBE_CANDIDATES = 65536       # vectores proyectados que se comparan por búsqueda
+RERANK_CANDIDATES = 1024       # candidatos que pasan al coseno exacto
+CLUSTER_TAIL = 32768           # vectores fuera de las listas antes de reagrupar
+ASSIGN_CHUNK = 8192            # filas por bloque al asignar listas
+SYNC_EVERY = 256               # persistir metadata cada N inserciones
+
+
+class HashedNgramEmbedder:
+    """
+    Embedder offline: tokens y n-gramas de caracteres hasheados (feature hashing)
+    a un vector float32 normalizado. Textos con vocabulario parecido quedan cerca.
+    """
+
+    name = 'hashed-ngram-v1'
+
+    def __init__(self, dim: int = SEMANTIC_DIM, ngram: int = SEMANTIC_NGRAM):
+        self.dim = dim
+        self.ngram = ngram
+
+    def features(self, text: str) -> List[Tuple[str, float]]:
+        """Features ponderadas: cada palabra entera pesa 1.0, cada n-grama 0.5"""
+        features = []
+        for token in re.findall(r'\w+', text.lower()):
+            features.append((token, 1.0))
+            padded = f" {token} "
+            for i in range(max(1, len(padded) - self.ngram + 1)):
+                features.append(('#' + padded[i:i + self.ngram], 0.5))
+        return features
+
+    def embed(self, text: str) -> np.ndarray:
+        """Vector float32 de norma 1 (vector nulo si el texto no tiene palabras)"""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        features = self.features(text)
+        if not features:
+            return vector
+
+        hashes = np.fromiter(
+            (zlib.crc32(feature.encode()) for feature, _ in features),
+            dtype=np.uint32, count=len(features)
+        )
+        weights = np.fromiter((w for _, w in features), dtype=np.float32, count=len(features))
+        # El bit alto del hash decide el signo para que las colisiones se cancelen
+        signs = np.where(hashes & 0x80000000, 1.0, -1.0).astype(np.float32)
+        np.add.at(vector, hashes % self.dim, weights * signs)
+
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+
+class SemanticMemory:
+    """
+    Índice vectorial incremental en disco.
+
+    Archivos en `directory`:
+    - vectors.f32:   matriz float32 (capacidad x dim), mapeada en memoria
+    - ids.i64:       id de la fila en `interactions` para cada vector
+    - lists.i32:     lista (centroide) del índice grueso a la que pertenece cada vector
+    - projected.f32: proyección PCA de cada vector (capacidad x PROJECTED_DIM)
+    - coarse.npz:    centroides y proyección entrenados
+    - meta.json:     dim, embedder y cantidad de vectores válidos
+
+    Hasta EXACT_SEARCH_LIMIT vectores la búsqueda es coseno exacto vectorizado.
+    Por encima se usa un índice grueso (k-means sobre una muestra): se recorren las
+    listas de los centroides más cercanos sobre la proyección en RAM y los mejores
+    RERANK_CANDIDATES se re-rankean con el coseno exacto.
+    """
+
+    def __init__(self, directory: str, embedder=None, initial_capacity: int = 4096):
+        self.directory = directory
+        self.embedder = embedder or HashedNgramEmbedder()
+        self.dim = self.embedder.dim
+        if self.dim % 64:
+            raise ValueError("Embedding dimension must be a multiple of 64")
+        self.projected_dim = min(PROJECTED_DIM, self.dim)
+        self.lock = threading.RLock()
+        self.pending = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self.meta_file = os.path.join(directory, 'meta.json')
+        self.model_file = os.path.join(directory, 'coarse.npz')
+        meta = self.load_meta()
+        if meta.get('dim') != self.dim or meta.get('embedder') != self.embedder.name:
+            # Embedder distinto: el índice viejo no es comparable, empezar de cero
+            meta = {'dim': self.dim, 'embedder': self.embedder.name, 'count': 0,
+                    'capacity': initial_capacity, 'last_id': 0}
+            for name in ('vectors.f32', 'ids.i64', 'lists.i32', 'projected.f32', 'coarse.npz'):
+                path = os.path.join(directory, name)
+                if os.path.exists(path):
+                    os.remove(path)
+        # Firmas del prefiltrado por Hamming de versiones anteriores
+        legacy_codes = os.path.join(directory, 'codes.u64')
+        if os.path.exists(legacy_codes):
+            os.remove(legacy_codes)
+        self.count = meta['count']
+        self.capacity = max(meta['capacity'], initial_capacity)
+        self.last_id = meta['last_id']
+        self.model = self.load_model()
+        self.training = None
+        # Listas agrupadas en RAM: posiciones por lista, límites y proyecciones en ese orden
+        self.clustered = 0
+        self.order = self.offsets = self.cluster_projected = None
+        self.open_arrays()
+
+    def load_meta(self) -> dict:
+        if os.path.exists(self.meta_file):
+            try:
+                with open(self.meta_file, 'r') as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                pass
+        return {}
+
+    def load_model(self) -> Optional[dict]:
+        """Centroides y proyección del índice grueso (None si no se entrenó)"""
+        if not os.path.exists(self.model_file):
+            return None
+        try:
+            with np.load(self.model_file) as data:
+                model = {name: data[name] for name in ('centroids', 'projection', 'trained')}
+        except (OSError, ValueError, KeyError):
+            return None
+        if model['centroids'].shape[1] != self.dim or model['projection'].shape[1] != self.projected_dim:
+            return None
+        model['trained'] = int(model['trained'])
+        return model
+
+    def save_model(self):
+        tmp = self.model_file + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, **self.model)
+        os.replace(tmp, self.model_file)
+
+    def open_arrays(self):
+        """(Re)mapear los archivos con la capacidad actual"""
+        def mapped(name, dtype, width):
+            path = os.path.join(self.directory, name)
+            size = self.capacity * width * np.dtype(dtype).itemsize
+            with open(path, 'ab') as f:
+                if f.tell() < size:
+                    f.truncate(size)
+            return np.memmap(path, dtype=dtype, mode='r+', shape=(self.capacity, width))
+
+        self.vectors = mapped('vectors.f32', np.float32, self.dim)
+        self.ids = mapped('ids.i64', np.int64, 1).reshape(self.capacity)
+        self.lists = mapped('lists.i32', np.int32, 1).reshape(self.capacity)
+        self.projected = mapped('projected.f32', np.float32, self.projected_dim)
+
+    def grow(self):
+        """Duplicar la capacidad de los archivos"""
+        self.flush_arrays()
+        self.capacity *= 2
+        self.open_arrays()
+
+    def add(self, row_id: int, text: str):
+        """Agregar un vector al índice (incremental)"""
+        vector = self.embedder.embed(text)
+        with self.lock:
+            if self.count >= self.capacity:
+                self.grow()
+            self.vectors[self.count] = vector
+            if self.model is not None:
+                # Queda en la cola sin agrupar hasta el próximo cluster()
+                lists, projected = encode(self.model, vector[None])
+                self.lists[self.count] = lists[0]
+                self.projected[self.count] = projected[0]
+            self.ids[self.count] = row_id
+            self.count += 1
+            self.last_id = max(self.last_id, row_id)
+            self.pending += 1
+            if self.pending >= SYNC_EVERY:
+                self.sync()
+
+    def search(self, text: str, k: int = 5, min_score: float = 0.0) -> List[Tuple[int, float]]:
+        """Top-k (id, similitud coseno) para un texto, descartando similitudes <= min_score"""
+        query = self.embedder.embed(text)
+        if not query.any():
+            return []
+
+        with self.lock:
+            n = self.count
+            if n == 0:
+                return []
+
+            if n > EXACT_SEARCH_LIMIT and (self.model is None
+                                           or n >= self.model['trained'] * COARSE_RETRAIN_GROWTH):
+                self.start_training(n)
+
+            if n <= EXACT_SEARCH_LIMIT or self.model is None:
+                # Sin índice grueso todavía (se entrena en segundo plano): coseno exacto
+                candidates = None
+                scores = self.vectors[:n] @ query
+            else:
+                candidates = self.coarse_candidates(query, n)
+                scores = self.vectors[candidates] @ query
+
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            positions = top if candidates is None else candidates[top]
+            return [
+                (int(self.ids[p]), float(scores[i]))
+                for p, i in zip(positions, top)
+                if scores[i] > min_score
+            ]
+
+    def coarse_candidates(self, query: np.ndarray, n: int) -> np.ndarray:
+        """Posiciones a re-rankear: listas más cercanas y cola sin agrupar, por la proyección"""
+        if n - self.clustered > CLUSTER_TAIL:
+            self.cluster(n)
+        ranked = np.argsort(-(self.model['centroids'] @ query))
+        sizes = np.diff(self.offsets)[ranked]
+        probes = ranked[:int(np.searchsorted(np.cumsum(sizes), PROBE_CANDIDATES)) + 1]
+
+        projected_query = query @ self.model['projection']
+        positions = [np.arange(self.clustered, n)]
+        scores = [self.projected[self.clustered:n] @ projected_query]
+        for probe in probes:
+            start, end = self.offsets[probe], self.offsets[probe + 1]
+            positions.append(self.order[start:end])
+            scores.append(self.cluster_projected[start:end] @ projected_query)
+        positions = np.concatenate(positions)
+        scores = np.concatenate(scores)
+        if len(positions) > RERANK_CANDIDATES:
+            positions = positions[np.argpartition(-scores, RERANK_CANDIDATES - 1)[:RERANK_CANDIDATES]]
+        # Orden de posición: lectura secuencial de los vectores mapeados
+        return np.sort(positions)
+
+    def cluster(self, n: int):
+        """Agrupar en RAM las proyecciones de las n primeras filas por lista"""
+        lists = np.asarray(self.lists[:n])
+        self.order = np.argsort(lists, kind='stable')
+        counts = np.bincount(lists, minlength=len(self.model['centroids']))
+        self.offsets = np.concatenate(([0], np.cumsum(counts)))
+        self.cluster_projected = self.projected[self.order]
+        self.clustered = n
+
+    def start_training(self, n: int):
+        if self.training is None or not self.training.is_alive():
+            self.training = threading.Thread(target=self.train, args=(n,), daemon=True)
+            self.training.start()
+
+    def train(self, n: int):
+        """
+        Entrenar el índice grueso sobre una muestra de las n primeras filas (k-means con
+        ~2·√n listas y PCA) y asignar todas las filas. Corre fuera del lock: las búsquedas
+        siguen con el índice anterior (o exacto) hasta el reemplazo.
+        """
+        rng = np.random.default_rng(n)
+        sample = np.asarray(self.vectors[np.sort(rng.choice(n, min(n, COARSE_SAMPLE), replace=False))])
+        lists_count = int(np.clip(2 * np.sqrt(n), 16, 4096))
+        centroids = spherical_kmeans(sample, lists_count, COARSE_ITERATIONS, rng)
+        _, _, components = np.linalg.svd(sample, full_matrices=False)
+        model = {'centroids': centroids,
+                 'projection': np.ascontiguousarray(components[:self.projected_dim].T),
+                 'trained': n}
+        lists, projected = encode(model, self.vectors[:n])
+
+        with self.lock:
+            # Filas agregadas durante el entrenamiento
+            tail_lists, tail_projected = encode(model, self.vectors[n:self.count])
+            self.lists[:n], self.lists[n:self.count] = lists, tail_lists
+            self.projected[:n], self.projected[n:self.count] = projected, tail_projected
+            self.model = model
+            self.clustered = 0
+            self.flush_arrays()
+            self.save_model()
+
+    def flush_arrays(self):
+        for array in (self.vectors, self.ids, self.lists, self.projected):
+            array.flush()
+
+    def sync(self):
+        """Persistir vectores y metadata (escritura atómica de meta.json)"""
+        with self.lock:
+            self.flush_arrays()
+            meta = {'dim': self.dim, 'embedder': self.embedder.name, 'count': self.count,
+                    'capacity': self.capacity, 'last_id': self.last_id}
+            tmp = self.meta_file + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(meta, f)
+            os.replace(tmp, self.meta_file)
+            self.pending = 0
+
+    def reset(self):
+        """Vaciar el índice (para reconstruirlo)"""
+        with self.lock:
+            self.count = 0
+            self.last_id = 0
+            self.model = None
+            self.clustered = 0
+            if os.path.exists(self.model_file):
+                os.remove(self.model_file)
+            self.sync()
+
+    def __len__(self) -> int:
+        return self.count
+
+
+def nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Centroide más cercano (por coseno) de cada vector, por bloques para acotar la RAM"""
+    return np.concatenate([
+        np.argmax(np.asarray(vectors[start:start + ASSIGN_CHUNK]) @ centroids.T, axis=1)
+        for start in range(0, len(vectors), ASSIGN_CHUNK)
+    ] or [np.empty(0, dtype=np.intp)]).astype(np.int32)
+
+
+def encode(model: dict, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Lista y proyección de cada vector según el índice grueso"""
+    projected = np.concatenate([
+        np.asarray(vectors[start:start + ASSIGN_CHUNK]) @ model['projection']
+        for start in range(0, len(vectors), ASSIGN_CHUNK)
+    ] or [np.empty((0, model['projection'].shape[1]), dtype=np.float32)])
+    return nearest(vectors, model['centroids']), projected
+
+
+def spherical_kmeans(sample: np.ndarray, k: int, iterations: int, rng) -> np.ndarray:
+    """k-means por coseno: centroides de norma 1 (los vectores ya vienen normalizados)"""
+    centroids = sample[rng.choice(len(sample), k, replace=False)].copy()
+    for _ in range(iterations):
+        labels = nearest(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        # Listas vacías: re-sembrar con vectores al azar
+        empty = np.flatnonzero(np.bincount(labels, minlength=k) == 0)
+        sums[empty] = sample[rng.choice(len(sample), len(empty))]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.maximum(norms, 1e-12)
+    return centroids
+
+
+def interaction_text(query: str, response: Optional[str]) -> str:
+    """Texto que se indexa por interacción: la query y el comienzo de la respuesta"""
+    return f"{query}\n{(response or '')[:500]}"
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+🔱 TCC - Daemon `tcc serve`
+API HTTP (aiohttp) sobre un socket Unix (y TCP local opcional) alrededor de un
+TrinityCortex de larga vida: memoria, índices, caches y pools de conexiones quedan
+calientes entre consultas.
+
+Cada request lleva el token del daemon (archivo 0600 en TRINITY_HOME). Se rechazan los
+requests con cabecera Origin y los POST que no son application/json: una página web
+abierta en el navegador no puede gastar las API keys ni apagar el daemon.
+"""
+
+import asyncio
+import hmac
+import json
+import os
+import secrets
+import signal
+import time
+from typing import Optional, Sequence
+
+from aiohttp import web
+
+MAX_REQUEST_BYTES = 8 * 1024 * 1024
+PRIORITIES = {'interactive': 0, 'batch': 1}
+SEARCH_MAX_LIMIT = 100
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def json_response(data, status: int = 200) -> web.Response:
+    return web.Response(text=json.dumps(data, default=str), status=status,
+                        content_type='application/json')
+
+
+def daemon_token(path: str) -> str:
+    """Token del daemon: se reutiliza el del archivo o se crea uno nuevo con permisos 0600"""
+    try:
+        with open(path, 'r') as f:
+            token = f.read().strip()
+        if token:
+            os.chmod(path, 0o600)
+            return token
+    except FileNotFoundError:
+        pass
+    token = secrets.token_urlsafe(32)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(token)
+    return token
+
+
+class TrinityServer:
+    """
+    Endpoints:
+    - GET  /health       estado del daemon
+    - POST /orchestrate  {"query", "mode", "priority"} -> resultado de la orquestación
+                         (un modo fuera de `modes` es un 400)
+    - POST /search       {"query", "limit"} -> memorias relevantes
+    - GET  /stats        estadísticas de memoria, proveedores y cache
+    - GET  /metrics      histogramas de latencia en formato de texto de Prometheus
+    - POST /shutdown     detener el daemon
+
+    Todos exigen `Authorization: Bearer <token>`.
+    """
+
+    def __init__(self, cortex, socket_path: Optional[str], host: Optional[str], port: Optional[int],
+                 token: str, modes: Sequence[str] = ('parallel',)):
+        self.cortex = cortex
+        self.token = token
+        self.modes = tuple(modes)
+        self.socket_path = socket_path
+        self.host = host
+        self.port = port
+        self.started = time.time()
+        self.requests = 0
+        self.stopping = asyncio.Event()
+
+        self.app = web.Application(client_max_size=MAX_REQUEST_BYTES, middlewares=[self.guard])
+        self.app.router.add_get('/health', self.handle_health)
+        self.app.router.add_post('/orchestrate', self.handle_orchestrate)
+        self.app.router.add_post('/search', self.handle_search)
+        self.app.router.add_get('/stats', self.handle_stats)
+        self.app.router.add_get('/metrics', self.handle_metrics)
+        self.app.router.add_post('/shutdown', self.handle_shutdown)
+
+    @web.middleware
+    async def guard(self, request: web.Request, handler) -> web.Response:
+        """Rechazar requests de navegadores, sin token o con un cuerpo que no es JSON"""
+        # Un navegador agrega Origin a los requests cross-origin; ningún cliente legítimo lo envía
+        if 'Origin' in request.headers:
+            return json_response({'error': 'cross-origin requests are not allowed'}, status=403)
+        if not hmac.compare_digest(request.headers.get('Authorization', '').encode(),
+                                   f"Bearer {self.token}".encode()):
+            return json_response({'error': 'missing or invalid daemon token'}, status=401)
+        if request.method == 'POST' and request.content_type != 'application/json':
+            return json_response({'error': 'Content-Type must be application/json'}, status=415)
+        return await handler(request)
+
+    async def read_json(self, request: web.Request) -> dict:
+        try:
+            body = await request.json()
+        except ValueError:
+            raise web.HTTPBadRequest(text=json.dumps({'error': 'invalid JSON body'}),
+                                     content_type='application/json')
+        if not isinstance(body, dict):
+            raise web.HTTPBadRequest(text=json.dumps({'error': 'expected a JSON object'}),
+                                     content_type='application/json')
+        return body
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        return json_response({
+            'status': 'ok',
+            'pid': os.getpid(),
+            'uptime': time.time() - self.started,
+            'requests': self.requests
+        })
+
+    async def handle_orchestrate(self, request: web.Request) -> web.Response:
+        body = await self.read_json(request)
+        query = (body.get('query') or '').strip()
+        if not query:
+            return json_response({'error': "missing 'query'"}, status=400)
+        priority = PRIORITIES.get(body.get('priority', 'interactive'))
+        if priority is None:
+            return json_response({'error': f"unknown priority: {body['priority']}"}, status=400)
+        mode = body.get('mode') or 'parallel'
+        if mode not in self.modes:
+            return json_response({'error': f"unknown mode: {mode}", 'modes': list(self.modes)}, status=400)
+
+        self.requests += 1
+        result = await self.cortex.orchestrate(query, mode, priority=priority)
+        return json_response(result)
+
+    async def handle_search(self, request: web.Request) -> web.Response:
+        body = await self.read_json(request)
+        query = (body.get('query') or '').strip()
+        if not query:
+            return json_response({'error': "missing 'query'"}, status=400)
+        limit = body.get('limit', 5)
+        if isinstance(limit, bool) or not isinstance(limit, int) or not 1 <= limit <= SEARCH_MAX_LIMIT:
+            return json_response({'error': f"'limit' must be an integer between 1 and {SEARCH_MAX_LIMIT}"},
+                                 status=400)
+        self.requests += 1
+        memories = await self.cortex.memory.search(query, limit)
+        return json_response({'query': query, 'results': memories})
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return json_response(self.cortex.stats())
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(body=self.cortex.metrics.prometheus().encode(),
+                            headers={'Content-Type': PROMETHEUS_CONTENT_TYPE})
+
+    async def handle_shutdown(self, request: web.Request) -> web.Response:
+        # Consumir el cuerpo: si queda sin leer, aiohttp retiene la conexión al cerrar
+        await request.read()
+        self.stopping.set()
+        return json_response({'status': 'stopping'})
+
+    async def run(self):
+        """Servir hasta /shutdown, SIGINT o SIGTERM"""
+        runner = web.AppRunner(self.app, access_log=None)
+        await runner.setup()
+        try:
+            if self.socket_path:
+                if os.path.exists(self.socket_path):
+                    os.remove(self.socket_path)  # socket viejo de un daemon que no cerró bien
+                await web.UnixSite(runner, self.socket_path).start()
+                os.chmod(self.socket_path, 0o600)
+                print(f"🔌 Listening on unix:{self.socket_path}")
+            if self.port:
+                await web.TCPSite(runner, self.host, self.port).start()
+                print(f"🌐 Listening on http://{self.host}:{self.port}")
+
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(sig, self.stopping.set)
+            await self.stopping.wait()
+        finally:
+            await runner.cleanup()
+            if self.socket_path and os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
@@ -5,124 +5,713 @@ Sistema de orquestación con micro-conversaciones paralelas y aprendizaje distri
 Cada LLM aprende de las otras a través de TCC
 """
 
+from __future__ import annotations
+
 import asyncio
+import contextvars
+import pathlib
+import heapq
 import json
 import os
 import sqlite3
 import hashlib
+import re
+import sys
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple, AsyncIterator, Callable, TYPE_CHECKING
 from concurrent.futures import ThreadPoolExecutor
-import aiohttp
 import threading
-from queue import Queue
+from queue import Queue, Empty
+import atexit
+import contextlib
 import time
+import random
+from collections import deque
+
+from tcc_cache import ResponseCache, normalize_prompt
+from tcc_knowledge import SharedKnowledge, KNOWLEDGE_PROMPT_TOKENS
+from tcc_prompt import PromptBuilder, PROMPT_TOKEN_BUDGET, estimate_tokens
+from tcc_metrics import Metrics, stage, stage_seconds
+from tcc_router import Router, ROUTER_HISTORY
+from tcc_patterns import default_matcher
+from tcc_client import (parse_mode, print_result, health, DaemonUnavailable,
+                        DAEMON_SOCKET, DAEMON_HOST, DAEMON_PORT, DAEMON_TOKEN_FILE)
+
+# Carga diferida: aiohttp, numpy (tcc_semantic), tcc_batch y tcc_server se importan
+# recién cuando un comando los usa, para que el arranque del CLI sea rápido.
+# Para las anotaciones alcanza con importarlos al chequear tipos.
+if TYPE_CHECKING:
+    import aiohttp
+    from tcc_batch import BatchOffloader
 
 # Configuración
 TRINITY_HOME = os.path.expanduser("~/.trinity-cortex")
 MEMORY_DB = f"{TRINITY_HOME}/trinity_memory.db"
 CONTEXT_FILE = f"{TRINITY_HOME}/active_context.json"
+KNOWLEDGE_JOURNAL = f"{TRINITY_HOME}/shared_knowledge.jsonl"
+
+# Endpoints de los proveedores (sobreescribibles para apuntar a un servidor local)
+ANTHROPIC_API_URL = os.getenv('TRINITY_ANTHROPIC_URL', 'https://api.anthropic.com')
+OPENAI_API_URL = os.getenv('TRINITY_OPENAI_URL', 'https://api.openai.com')
+GEMINI_API_URL = os.getenv('TRINITY_GEMINI_URL', 'https://generativelanguage.googleapis.com')
+
+# Límites de conexiones simultáneas por proveedor (pool HTTP compartido)
+POOL_LIMITS = {'claude': 10, 'codex': 10, 'gemini': 10}
+POOL_KEEPALIVE = 30.0   # segundos que una conexión ociosa se mantiene abierta
+POOL_DNS_TTL = 300      # segundos de cache DNS
+
+# Escritura diferida de memoria (write-behind)
+WRITE_BATCH_SIZE = 64        # filas máximas por transacción
+WRITE_FLUSH_INTERVAL = 0.5   # segundos máximos que una fila espera en cola
+WRITE_RETRIES = 3            # intentos por fila cuando un lote entero no se pudo confirmar
+WRITE_RETRY_DELAY = 0.05     # segundos de espera entre intentos (crece con cada uno)
+# 'async': record_* retorna inmediatamente | 'sync': espera al commit del lote
+MEMORY_DURABILITY = os.getenv('TRINITY_DURABILITY', 'async')
+
+# Ajustes de SQLite
+DB_MMAP_SIZE = 256 * 1024 * 1024   # bytes mapeados en memoria
+DB_CACHE_KB = 64 * 1024            # cache de páginas por conexión (KiB)
+DB_BUSY_TIMEOUT_MS = 5000
+# Conexiones de sólo lectura (una por thread lector, lecturas de snapshot WAL)
+MEMORY_READERS = int(os.getenv('TRINITY_MEMORY_READERS', '4'))
+
+# Backend de búsqueda de memorias: 'fts' | 'semantic' | 'hybrid' (semantic requiere numpy)
+MEMORY_BACKEND = os.getenv('TRINITY_MEMORY_BACKEND', 'fts')
+SEMANTIC_DIR = f"{TRINITY_HOME}/memories/semantic"
+
+# Cache persistente de respuestas (compartido entre procesos TCC)
+CACHE_DB = f"{TRINITY_HOME}/response_cache.db"
+CACHE_ENABLED = os.getenv('TRINITY_CACHE', '1') != '0'
+CACHE_FLUSH_INTERVAL = 0.05    # el escritor del cache confirma rápido: una repetición cercana ya acierta
+
+# Resiliencia por proveedor: (connect, read) en segundos
+PROVIDER_TIMEOUTS = {'claude': (10.0, 60.0), 'codex': (10.0, 60.0), 'gemini': (10.0, 60.0)}
+DEFAULT_TIMEOUT = (10.0, 60.0)
+RETRY_ATTEMPTS = 3             # intentos totales por llamada
+RETRY_BASE_DELAY = 0.5         # segundos; se duplica en cada intento (con jitter)
+RETRY_MAX_DELAY = 8.0          # espera máxima antes de un reintento; un Retry-After mayor falla rápido
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+THROTTLED_STATUS = 429         # limitación del proveedor: no cuenta como falla del breaker
+BREAKER_THRESHOLD = 5          # fallas consecutivas para abrir el circuito
+BREAKER_COOLDOWN = 30.0        # segundos abierto antes de probar de nuevo
+# Una llamada en vivo no puede tardar más que esto (sólo para clasificar filas anteriores
+# a la columna interactions.source: las más lentas eran jobs de batch)
+LIVE_CALL_MAX_SECONDS = (max(read for _, read in PROVIDER_TIMEOUTS.values()) * RETRY_ATTEMPTS
+                         + RETRY_MAX_DELAY * (RETRY_ATTEMPTS - 1))
+# Una llamada de prueba (half-open) sin veredicto tras este tiempo se da por perdida
+BREAKER_TRIAL_TIMEOUT = LIVE_CALL_MAX_SECONDS
+
+# Límites de cada proveedor: (requests/min, tokens/min)
+PROVIDER_RATE_LIMITS = {'claude': (50, 40000), 'codex': (500, 30000), 'gemini': (60, 32000)}
+DEFAULT_RATE_LIMIT = (60, 30000)
+
+# Orquestación por lotes (orchestrate_many / subcomando batch)
+BATCH_CONCURRENCY = 8          # orquestaciones simultáneas por defecto
+
+# Offload a las APIs de batch de los proveedores (jobs asíncronos, más baratos)
+BATCH_LEDGER_DB = f"{TRINITY_HOME}/batch_jobs.db"
+BATCH_PAYLOAD_DIR = f"{TRINITY_HOME}/batches"
+
+# Prioridades de la cola del limitador (menor = antes)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: 'interactive', PRIORITY_BATCH: 'batch'}
+# Prioridad de la orquestación en curso; se hereda en las tareas que lanza
+REQUEST_PRIORITY = contextvars.ContextVar('trinity_request_priority', default=PRIORITY_INTERACTIVE)
+# Modo de la orquestación en curso (etiqueta de las métricas de latencia)
+ORCHESTRATION_MODE = contextvars.ContextVar('trinity_orchestration_mode', default='direct')
+# Query original de la orquestación en curso ("Current Objective" de los prompts derivados).
+# Es por tarea, no parte del contexto compartido: orquestaciones concurrentes no se pisan.
+CURRENT_OBJECTIVE = contextvars.ContextVar('trinity_current_objective', default=None)
+# Escritura en bloque (MemorySystem.bulk): los put() de esta tarea no esperan su commit
+BULK_WRITES = contextvars.ContextVar('trinity_bulk_writes', default=False)
+
+# Modos de orquestación aceptados por el CLI, el batch y el daemon
+ORCHESTRATION_MODES = ('parallel', 'sequential', 'consensus', 'specialized', 'race', 'hedged', 'routed',
+                       'pipelined')
+
+# Modos race/hedged
+LATENCY_WINDOW = 200           # latencias recientes por proveedor
+HEDGE_PERCENTILE = 0.95        # lanzar respaldo si el proveedor supera este percentil
+HEDGE_DEFAULT_DELAY = 2.0      # segundos de espera sin historial de latencias
+
+# Distribución de aprendizajes al contexto compartido
+LEARNING_DEBOUNCE = 0.25       # segundos sin aprendizajes nuevos antes de escribir el snapshot
+LEARNING_MAX_DELAY = 2.0       # segundos máximos que un aprendizaje espera su snapshot
+
+# Modo pipelined (sequential solapado): cada etapa arranca cuando la anterior emitió
+# PIPELINE_HANDOFF caracteres en streaming (0 = esperar su respuesta completa) y recibe
+# los primeros PIPELINE_WINDOW caracteres de ella
+PIPELINE_WINDOW = 500
+PIPELINE_HANDOFF = int(os.getenv('TRINITY_PIPELINE_HANDOFF', str(PIPELINE_WINDOW)))
+PIPELINE_STAGES = [
+    {'llm': 'claude', 'label': "Claude analyzing strategy", 'prompt': "{query}"},
+    {'llm': 'codex', 'label': "Codex implementing based on Claude's analysis",
+     'prompt': "Based on this analysis: {upstream}...\n\nImplement: {query}"},
+    {'llm': 'gemini', 'label': "Gemini optimizing the implementation",
+     'prompt': "Optimize and validate this implementation:\n{upstream}..."}
+]
+
+# Streaming de respuestas en el modo interactivo
+STREAM_ENABLED = os.getenv('TRINITY_STREAM', '1') != '0'
+
+
+def ensure_home():
+    """Crear los directorios de Trinity (al abrir la memoria, no al importar)"""
+    os.makedirs(TRINITY_HOME, exist_ok=True)
+    os.makedirs(f"{TRINITY_HOME}/memories", exist_ok=True)
+    os.makedirs(f"{TRINITY_HOME}/learnings", exist_ok=True)
+
+
+# Migraciones de esquema versionadas (PRAGMA user_version).
+# Nunca editar una migración publicada: agregar una nueva al final.
+SCHEMA_MIGRATIONS = [
+    (1, [
+        '''
+        CREATE TABLE IF NOT EXISTS interactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            session_id TEXT,
+            llm TEXT,
+            query TEXT,
+            response TEXT,
+            tokens_used INTEGER,
+            processing_time REAL,
+            success BOOLEAN
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS learnings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            pattern TEXT,
+            source_llm TEXT,
+            learned_by TEXT,
+            knowledge TEXT,
+            confidence REAL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS contexts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            context_hash TEXT UNIQUE,
+            context_data TEXT,
+            usage_count INTEGER DEFAULT 0
+        )
+        ''',
+    ]),
+    (2, [
+        # (llm, processing_time) cubre el GROUP BY llm / AVG de show_memory_stats
+        "CREATE INDEX IF NOT EXISTS idx_interactions_llm ON interactions(llm, processing_time)",
+        "CREATE INDEX IF NOT EXISTS idx_interactions_session ON interactions(session_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_interactions_timestamp ON interactions(timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_learnings_pattern ON learnings(pattern)",
+    ]),
+    (3, [
+        # Índices full-text (FTS5, ranking BM25) sincronizados por triggers
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS interactions_fts USING fts5(
+            query, response,
+            content='interactions', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS interactions_fts_ai AFTER INSERT ON interactions BEGIN
+            INSERT INTO interactions_fts(rowid, query, response)
+            VALUES (new.id, new.query, new.response);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS interactions_fts_ad AFTER DELETE ON interactions BEGIN
+            INSERT INTO interactions_fts(interactions_fts, rowid, query, response)
+            VALUES ('delete', old.id, old.query, old.response);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS interactions_fts_au AFTER UPDATE ON interactions BEGIN
+            INSERT INTO interactions_fts(interactions_fts, rowid, query, response)
+            VALUES ('delete', old.id, old.query, old.response);
+            INSERT INTO interactions_fts(rowid, query, response)
+            VALUES (new.id, new.query, new.response);
+        END
+        """,
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS learnings_fts USING fts5(
+            pattern, knowledge,
+            content='learnings', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS learnings_fts_ai AFTER INSERT ON learnings BEGIN
+            INSERT INTO learnings_fts(rowid, pattern, knowledge)
+            VALUES (new.id, new.pattern, new.knowledge);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS learnings_fts_ad AFTER DELETE ON learnings BEGIN
+            INSERT INTO learnings_fts(learnings_fts, rowid, pattern, knowledge)
+            VALUES ('delete', old.id, old.pattern, old.knowledge);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS learnings_fts_au AFTER UPDATE ON learnings BEGIN
+            INSERT INTO learnings_fts(learnings_fts, rowid, pattern, knowledge)
+            VALUES ('delete', old.id, old.pattern, old.knowledge);
+            INSERT INTO learnings_fts(rowid, pattern, knowledge)
+            VALUES (new.id, new.pattern, new.knowledge);
+        END
+        """,
+        # Backfill de filas existentes
+        "INSERT INTO interactions_fts(interactions_fts) VALUES ('rebuild')",
+        "INSERT INTO learnings_fts(learnings_fts) VALUES ('rebuild')",
+    ]),
+    (4, [
+        # Uso de tokens informado por el proveedor (tokens_used = input + output)
+        "ALTER TABLE interactions ADD COLUMN input_tokens INTEGER",
+        "ALTER TABLE interactions ADD COLUMN output_tokens INTEGER",
+    ]),
+    (5, [
+        # Origen de cada fila: 'live' (llamada en vivo) o 'batch' (resultado de una API de batch)
+        "ALTER TABLE interactions ADD COLUMN source TEXT NOT NULL DEFAULT 'live'",
+        f"UPDATE interactions SET source = 'batch' WHERE processing_time > {LIVE_CALL_MAX_SECONDS}",
+        "CREATE INDEX IF NOT EXISTS idx_interactions_source ON interactions(source, id)",
+    ]),
+    (6, [
+        # Tiempo de red de la llamada (sin rate limit, enriquecimiento ni escrituras): lo que
+        # aprende el router. NULL en filas anteriores (se usa processing_time)
+        "ALTER TABLE interactions ADD COLUMN network_time REAL",
+    ]),
+]
+
+FTS_MAX_TERMS = 32
+
+
+def fts_match_expression(text: str) -> Optional[str]:
+    """Convertir texto libre en una expresión MATCH de FTS5 (términos entre comillas unidos por OR)"""
+    terms = []
+    for term in re.findall(r'\w+', text.lower()):
+        if len(term) > 1 and term not in terms:
+            terms.append(term)
+        if len(terms) >= FTS_MAX_TERMS:
+            break
+    if not terms:
+        return None
+    return " OR ".join(f'"{term}"' for term in terms)
+
+
+def configure_connection(conn: sqlite3.Connection, durability: str = MEMORY_DURABILITY):
+    """
+    Ajustar pragmas de una conexión: WAL para que lectores y escritor no se bloqueen,
+    synchronous según la durabilidad, y cache/mmap más grandes para tablas grandes.
+    """
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={'FULL' if durability == 'sync' else 'NORMAL'}")
+    conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size=-{DB_CACHE_KB}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+    return conn
+
+
+class WriteTicket:
+    """Espera de un escritor 'sync' (o de un flush): se completa con el error de su fila, si falló"""
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.error: Optional[Exception] = None
+    
+    def finish(self, error: Optional[Exception] = None):
+        self.error = error
+        self.done.set()
+    
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self.done.wait(timeout)
+
+
+class WriteBehindQueue:
+    """
+    Cola de escritura diferida: agrupa INSERTs en transacciones por lotes
+    dentro de un thread escritor dedicado, fuera del event loop.
+    
+    Un lote se confirma al alcanzar batch_size filas o flush_interval segundos.
+    En modo 'sync' cada llamada a put() espera al commit de su lote y propaga
+    el error de su fila (salvo en una tarea en escritura en bloque, ver BULK_WRITES). Una sentencia que falla se descarta sola, sin arrastrar
+    al resto del lote; si el lote entero no se puede confirmar (transacción
+    abortada, commit fallido) se reintenta fila por fila.
+    """
+    
+    _STOP = object()
+    
+    def __init__(self, db_path: str, batch_size: int = WRITE_BATCH_SIZE,
+                 flush_interval: float = WRITE_FLUSH_INTERVAL,
+                 durability: str = MEMORY_DURABILITY):
+        if durability not in ('async', 'sync'):
+            raise ValueError(f"Unknown durability mode: {durability}")
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.durability = durability
+        self.queue = Queue()
+        self.closed = False
+        self.rows_written = 0
+        self.batches_written = 0
+        
+        self.thread = threading.Thread(target=self.writer_loop, daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+    
+    def put(self, sql: str, params: tuple, on_written=None):
+        """
+        Encolar un INSERT. on_written(rowid) se invoca en el thread escritor
+        después del commit del lote.
+        """
+        if self.closed:
+            raise RuntimeError("WriteBehindQueue is closed")
+        if self.durability == 'sync' and not BULK_WRITES.get():
+            ticket = WriteTicket()
+            self.queue.put((sql, params, ticket, on_written))
+            ticket.wait()
+            if ticket.error is not None:
+                raise ticket.error
+        else:
+            self.queue.put((sql, params, None, on_written))
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Esperar a que todo lo encolado hasta ahora esté confirmado"""
+        if self.closed:
+            return True
+        ticket = WriteTicket()
+        self.queue.put((None, None, ticket, None))
+        return ticket.wait(timeout)
+    
+    def close(self):
+        """Vaciar la cola y detener el thread escritor"""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(self._STOP)
+        self.thread.join()
+    
+    def writer_loop(self):
+        """Loop del thread escritor: bloquea en la cola y escribe por lotes"""
+        conn = configure_connection(sqlite3.connect(self.db_path), self.durability)
+        stopping = False
+        
+        while not stopping:
+            batch = [self.queue.get()]
+            deadline = time.time() + self.flush_interval
+            
+            # Agrupar lo que llegue hasta completar el lote o vencer el plazo;
+            # un flush, un escritor 'sync' o el cierre fuerzan commit inmediato
+            while len(batch) < self.batch_size:
+                last = batch[-1]
+                if last is self._STOP or last[2] is not None:
+                    break
+                try:
+                    timeout = deadline - time.time()
+                    if timeout <= 0:
+                        break
+                    batch.append(self.queue.get(timeout=timeout))
+                except Empty:
+                    break
+            
+            # Drenar lo ya encolado sin esperar
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except Empty:
+                    break
+            
+            items = [item for item in batch if item is not self._STOP]
+            stopping = len(items) < len(batch)
+            try:
+                outcomes = self.apply(conn, items)
+            except sqlite3.Error as e:
+                conn.rollback()
+                print(f"Memory writer error, retrying batch row by row: {e}")
+                outcomes = [self.apply_retrying(conn, item) for item in items]
+            except Exception as e:
+                conn.rollback()
+                outcomes = [(item, None, e) for item in items]
+            
+            self.batches_written += 1
+            for (sql, params, ticket, on_written), rowid, error in outcomes:
+                if error is not None:
+                    print(f"Memory writer error: {error}")
+                elif sql is not None:
+                    self.rows_written += 1
+                    if on_written is not None:
+                        try:
+                            on_written(rowid)
+                        except Exception as e:
+                            print(f"Memory writer callback error: {e}")
+                if ticket is not None:
+                    ticket.finish(error)
+        
+        conn.close()
+    
+    def apply(self, conn: sqlite3.Connection, items: List[tuple]) -> List[tuple]:
+        """
+        Ejecutar los items en una transacción y confirmarla; devuelve (item, rowid, error)
+        por item. Una sentencia que falla sola (SQLite la deshace sin abortar la transacción)
+        queda con su error. Lanza si la transacción se perdió o el commit falló.
+        """
+        outcomes = []
+        executed = 0
+        for item in items:
+            sql, params = item[0], item[1]
+            if sql is None:
+                outcomes.append((item, None, None))
+                continue
+            try:
+                cursor = conn.execute(sql, params)
+            except sqlite3.Error as e:
+                if executed and not conn.in_transaction:
+                    raise  # el error abortó la transacción con las filas anteriores
+                outcomes.append((item, None, e))
+                continue
+            executed += 1
+            outcomes.append((item, cursor.lastrowid, None))
+        conn.commit()
+        return outcomes
+    
+    def apply_retrying(self, conn: sqlite3.Connection, item: tuple) -> tuple:
+        """Escribir un item en su propia transacción, con hasta WRITE_RETRIES intentos"""
+        error = None
+        for attempt in range(WRITE_RETRIES):
+            try:
+                return self.apply(conn, [item])[0]
+            except sqlite3.Error as e:
+                conn.rollback()
+                error = e
+                time.sleep(WRITE_RETRY_DELAY * (attempt + 1))
+        return (item, None, error)
+
+
+class ReaderPool:
+    """
+    Conexiones de sólo lectura, una por thread (threading.local). Con WAL cada
+    lectura ve un snapshot confirmado sin bloquear al escritor ni a otros lectores.
+    
+    run() ejecuta una lectura bloqueante en uno de los `size` threads lectores,
+    fuera del event loop; connection() da la conexión del thread actual.
+    """
+    
+    def __init__(self, db_path: str, size: int = MEMORY_READERS):
+        self.uri = f"{pathlib.Path(db_path).absolute().as_uri()}?mode=ro"
+        self.executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix='trinity-reader')
+        self.local = threading.local()
+        self.connections: List[sqlite3.Connection] = []
+        self.lock = threading.Lock()
+        self.reads = 0
+    
+    def connection(self) -> sqlite3.Connection:
+        """Conexión de lectura del thread actual (se abre la primera vez)"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            # check_same_thread=False sólo para poder cerrarla desde close()
+            conn = configure_connection(
+                sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+            )
+            self.local.conn = conn
+            with self.lock:
+                self.connections.append(conn)
+        return conn
+    
+    async def run(self, fn: Callable, *args):
+        """Ejecutar una lectura bloqueante en un thread lector"""
+        self.reads += 1
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+    
+    def close(self):
+        self.executor.shutdown(wait=True)
+        with self.lock:
+            for conn in self.connections:
+                conn.close()
+            self.connections.clear()
+    
+    def stats(self) -> Dict:
+        return {'connections': len(self.connections), 'async_reads': self.reads}
 
-# Crear directorios
-os.makedirs(TRINITY_HOME, exist_ok=True)
-os.makedirs(f"{TRINITY_HOME}/memories", exist_ok=True)
-os.makedirs(f"{TRINITY_HOME}/learnings", exist_ok=True)
 
 class MemorySystem:
     """Sistema de memoria persistente y compartida"""
     
-    def __init__(self):
-        self.conn = sqlite3.connect(MEMORY_DB, check_same_thread=False)
-        self.init_db()
+    def __init__(self, durability: str = MEMORY_DURABILITY, backend: str = MEMORY_BACKEND):
+        if backend not in ('fts', 'semantic', 'hybrid'):
+            raise ValueError(f"Unknown memory backend: {backend}")
+        ensure_home()
+        self.init_db(durability)
+        # Un único escritor (thread de write-behind) y lectores de sólo lectura por thread
+        self.writer = WriteBehindQueue(MEMORY_DB, durability=durability)
+        self.readers = ReaderPool(MEMORY_DB)
+        self.knowledge = SharedKnowledge(KNOWLEDGE_JOURNAL)
         self.context = self.load_context()
+        self.backend = backend
+        self.semantic = self.init_semantic() if backend in ('semantic', 'hybrid') else None
         
-    def init_db(self):
-        """Inicializar base de datos de memoria"""
-        cursor = self.conn.cursor()
+    def init_db(self, durability: str = MEMORY_DURABILITY):
+        """Inicializar base de datos de memoria aplicando migraciones pendientes"""
+        conn = configure_connection(sqlite3.connect(MEMORY_DB), durability)
+        cursor = conn.cursor()
+        current = cursor.execute("PRAGMA user_version").fetchone()[0]
         
-        # Tabla de interacciones
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS interactions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT,
-                session_id TEXT,
-                llm TEXT,
-                query TEXT,
-                response TEXT,
-                tokens_used INTEGER,
-                processing_time REAL,
-                success BOOLEAN
-            )
-        ''')
-        
-        # Tabla de aprendizajes
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS learnings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT,
-                pattern TEXT,
-                source_llm TEXT,
-                learned_by TEXT,
-                knowledge TEXT,
-                confidence REAL
-            )
-        ''')
-        
-        # Tabla de contextos
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS contexts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT,
-                context_hash TEXT UNIQUE,
-                context_data TEXT,
-                usage_count INTEGER DEFAULT 0
-            )
-        ''')
-        
-        self.conn.commit()
+        for version, statements in SCHEMA_MIGRATIONS:
+            if version <= current:
+                continue
+            # Cada migración es atómica: sentencias + user_version en una transacción
+            cursor.execute("BEGIN")
+            try:
+                for statement in statements:
+                    cursor.execute(statement)
+                cursor.execute(f"PRAGMA user_version = {version}")
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                conn.close()
+                raise
+        
+        conn.close()
+    
+    def init_semantic(self):
+        """Abrir el índice vectorial y ponerlo al día con las interacciones existentes"""
+        try:
+            from tcc_semantic import SemanticMemory
+        except ImportError:  # numpy no instalado: sólo búsqueda full-text
+            print("⚠️ numpy not installed: semantic memory disabled, using full-text search")
+            self.backend = 'fts'
+            return None
+        semantic = SemanticMemory(SEMANTIC_DIR)
+        self.backfill_semantic(semantic)
+        return semantic
+    
+    def backfill_semantic(self, semantic):
+        """Indexar las interacciones que el índice vectorial todavía no tiene"""
+        from tcc_semantic import interaction_text
+        cursor = self.readers.connection().execute(
+            "SELECT id, query, response FROM interactions WHERE id > ? AND success ORDER BY id",
+            (semantic.last_id,)
+        )
+        for row_id, query, response in cursor:
+            semantic.add(row_id, interaction_text(query, response))
+        semantic.sync()
+    
+    def schema_version(self) -> int:
+        """Versión actual del esquema de la base de datos"""
+        return self.readers.connection().execute("PRAGMA user_version").fetchone()[0]
     
     def load_context(self) -> Dict:
-        """Cargar contexto activo"""
+        """Cargar contexto activo (el conocimiento compartido vive en self.knowledge)"""
         if os.path.exists(CONTEXT_FILE):
             with open(CONTEXT_FILE, 'r') as f:
-                return json.load(f)
+                context = json.load(f)
+            # Contexto de versiones anteriores: migrar shared_knowledge al almacén acotado
+            legacy = context.pop('shared_knowledge', None)
+            if legacy and not self.knowledge.entries:
+                self.knowledge.import_legacy(legacy)
+            # El objetivo ya no vive en el contexto compartido (ver CURRENT_OBJECTIVE)
+            context.pop('current_objective', None)
+            return context
         return {
             "session_id": hashlib.md5(str(time.time()).encode()).hexdigest()[:8],
             "start_time": datetime.now().isoformat(),
-            "active_threads": {},
-            "shared_knowledge": {},
-            "current_objective": None
+            "active_threads": {}
         }
     
-    def save_context(self):
-        """Guardar contexto activo"""
-        with open(CONTEXT_FILE, 'w') as f:
-            json.dump(self.context, f, indent=2)
+    def context_snapshot(self) -> str:
+        """Serializar el contexto activo en forma compacta (en el thread que lo modifica)"""
+        return json.dumps(self.context, separators=(',', ':'))
+    
+    def save_context(self, snapshot: Optional[str] = None):
+        """Guardar contexto activo de forma atómica: archivo temporal + rename"""
+        if snapshot is None:
+            snapshot = self.context_snapshot()
+        temp_path = f"{CONTEXT_FILE}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as f:
+            f.write(snapshot)
+        os.replace(temp_path, CONTEXT_FILE)
+    
+    def persist_context(self, snapshot: str):
+        """Guardar el snapshot del contexto y los deltas pendientes del conocimiento compartido"""
+        self.save_context(snapshot)
+        self.knowledge.persist()
+    
+    def flush(self):
+        """Confirmar en disco todas las escrituras pendientes"""
+        self.writer.flush()
+    
+    async def flush_async(self):
+        """flush() desde el event loop, sin bloquearlo"""
+        await asyncio.get_running_loop().run_in_executor(None, self.flush)
+    
+    @contextlib.contextmanager
+    def bulk(self):
+        """
+        Escritura en bloque para la tarea actual: sus put() no esperan el commit (ni en
+        modo 'sync') y las filas se agrupan en lotes. Las demás tareas (p.ej. requests
+        interactivos del daemon) no se ven afectadas. Confirmar al final con flush_async().
+        """
+        token = BULK_WRITES.set(True)
+        try:
+            yield self
+        finally:
+            BULK_WRITES.reset(token)
+    
+    def close(self):
+        """Vaciar escrituras pendientes y cerrar la base de datos"""
+        self.writer.close()
+        self.knowledge.persist()
+        if self.semantic is not None:
+            self.semantic.sync()
+        self.readers.close()
     
     def record_interaction(self, llm: str, query: str, response: str, 
-                          processing_time: float, success: bool = True):
-        """Registrar interacción con un LLM"""
-        cursor = self.conn.cursor()
-        cursor.execute('''
+                          processing_time: float, success: bool = True,
+                          usage: Optional[Dict] = None, source: str = 'live',
+                          network_time: Optional[float] = None):
+        """
+        Registrar interacción con un LLM (escritura diferida).
+        usage: {'input_tokens', 'output_tokens'} informados por el proveedor, si los hay.
+        source: 'live' o 'batch' (los resultados de batch no alimentan al router).
+        network_time: tiempo en la etapa 'network' de la traza (el que aprende el router).
+        """
+        on_written = None
+        if self.semantic is not None and success:
+            from tcc_semantic import interaction_text
+            text = interaction_text(query, response)
+            on_written = lambda rowid: self.semantic.add(rowid, text)
+        
+        input_tokens = usage.get('input_tokens') if usage else None
+        output_tokens = usage.get('output_tokens') if usage else None
+        tokens_used = (input_tokens or 0) + (output_tokens or 0) if usage else None
+        
+        self.writer.put('''
             INSERT INTO interactions 
-            (timestamp, session_id, llm, query, response, processing_time, success)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
+            (timestamp, session_id, llm, query, response, tokens_used, input_tokens, output_tokens,
+             processing_time, success, source, network_time)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (
             datetime.now().isoformat(),
             self.context["session_id"],
             llm,
             query,
             response,
+            tokens_used,
+            input_tokens,
+            output_tokens,
             processing_time,
-            success
-        ))
-        self.conn.commit()
+            success,
+            source,
+            network_time
+        ), on_written)
         
     def record_learning(self, pattern: str, source_llm: str, 
                        learned_by: str, knowledge: str, confidence: float):
-        """Registrar un aprendizaje compartido"""
-        cursor = self.conn.cursor()
-        cursor.execute('''
+        """Registrar un aprendizaje compartido (escritura diferida)"""
+        self.writer.put('''
             INSERT INTO learnings
             (timestamp, pattern, source_llm, learned_by, knowledge, confidence)
             VALUES (?, ?, ?, ?, ?, ?)
@@ -134,20 +723,88 @@ class MemorySystem:
             knowledge,
             confidence
         ))
-        self.conn.commit()
+    
+    def search_memories(self, query: str, limit: int = 5) -> List[Dict]:
+        """Buscar memorias con el backend configurado (fts, semantic o hybrid)"""
+        if self.backend == 'semantic':
+            return self.get_semantic_memories(query, limit)
+        if self.backend == 'hybrid':
+            # Reciprocal rank fusion de ambos rankings
+            fused = {}
+            for ranking in (self.get_relevant_memories(query, limit),
+                            self.get_semantic_memories(query, limit)):
+                for rank, memory in enumerate(ranking):
+                    key = (memory['llm'], memory['timestamp'], memory['query'])
+                    entry = fused.setdefault(key, [0.0, memory])
+                    entry[0] += 1.0 / (60 + rank)
+            ranked = sorted(fused.values(), key=lambda entry: -entry[0])
+            return [memory for _, memory in ranked[:limit]]
+        return self.get_relevant_memories(query, limit)
+    
+    async def search(self, query: str, limit: int = 5) -> List[Dict]:
+        """search_memories fuera del event loop, en un thread lector"""
+        return await self.readers.run(self.search_memories, query, limit)
+    
+    async def relevant_learnings(self, query: str, limit: int = 5) -> List[Dict]:
+        """get_relevant_learnings fuera del event loop, en un thread lector"""
+        return await self.readers.run(self.get_relevant_learnings, query, limit)
+    
+    def get_semantic_memories(self, query: str, limit: int = 5) -> List[Dict]:
+        """Obtener memorias semánticamente similares (top-k por coseno)"""
+        if self.semantic is None:
+            return []
+        hits = self.semantic.search(query, limit)
+        if not hits:
+            return []
+        
+        placeholders = ",".join("?" * len(hits))
+        cursor = self.readers.connection().execute(
+            f"SELECT id, llm, query, response, timestamp FROM interactions WHERE id IN ({placeholders})",
+            [row_id for row_id, _ in hits]
+        )
+        rows = {row[0]: row for row in cursor.fetchall()}
+        
+        memories = []
+        for row_id, score in hits:
+            row = rows.get(row_id)
+            if row:
+                memories.append({
+                    'llm': row[1],
+                    'query': row[2],
+                    'response': row[3],
+                    'timestamp': row[4],
+                    'score': score
+                })
+        return memories
+    
+    def provider_history(self, limit: int = ROUTER_HISTORY) -> List[Tuple]:
+        """
+        Últimas `limit` llamadas en vivo, de la más vieja a la más nueva, para el router:
+        (llm, latencia, success, input_tokens, output_tokens, tokens_used, timestamp).
+        La latencia es el tiempo de red (processing_time en filas anteriores a la migración 6).
+        """
+        cursor = self.readers.connection().execute('''
+            SELECT llm, COALESCE(network_time, processing_time), success, input_tokens, output_tokens, tokens_used, timestamp
+            FROM (SELECT * FROM interactions WHERE source = 'live' ORDER BY id DESC LIMIT ?)
+            ORDER BY id
+        ''', (limit,))
+        return cursor.fetchall()
     
     def get_relevant_memories(self, query: str, limit: int = 5) -> List[Dict]:
-        """Obtener memorias relevantes para una consulta"""
-        cursor = self.conn.cursor()
+        """Obtener memorias relevantes para una consulta (FTS5, ranking BM25)"""
+        match = fts_match_expression(query)
+        if not match:
+            return []
         
-        # Búsqueda simple por similitud de texto
+        cursor = self.readers.connection().cursor()
         cursor.execute('''
-            SELECT llm, query, response, timestamp
-            FROM interactions
-            WHERE query LIKE ? OR response LIKE ?
-            ORDER BY timestamp DESC
+            SELECT i.llm, i.query, i.response, i.timestamp, bm25(interactions_fts) AS score
+            FROM interactions_fts
+            JOIN interactions i ON i.id = interactions_fts.rowid
+            WHERE interactions_fts MATCH ? AND i.success
+            ORDER BY score, i.id DESC
             LIMIT ?
-        ''', (f'%{query[:30]}%', f'%{query[:30]}%', limit))
+        ''', (match, limit))
         
         memories = []
         for row in cursor.fetchall():
@@ -155,39 +812,520 @@ class MemorySystem:
                 'llm': row[0],
                 'query': row[1],
                 'response': row[2],
-                'timestamp': row[3]
+                'timestamp': row[3],
+                'score': row[4]
             })
         
         return memories
+    
+    def get_relevant_learnings(self, query: str, limit: int = 5) -> List[Dict]:
+        """Obtener aprendizajes relevantes para una consulta (FTS5, ranking BM25)"""
+        match = fts_match_expression(query)
+        if not match:
+            return []
+        
+        cursor = self.readers.connection().cursor()
+        cursor.execute('''
+            SELECT l.pattern, l.source_llm, l.knowledge, l.confidence, bm25(learnings_fts) AS score
+            FROM learnings_fts
+            JOIN learnings l ON l.id = learnings_fts.rowid
+            WHERE learnings_fts MATCH ?
+            ORDER BY score, l.id DESC
+            LIMIT ?
+        ''', (match, limit))
+        
+        return [
+            {
+                'pattern': row[0],
+                'source_llm': row[1],
+                'knowledge': row[2],
+                'confidence': row[3],
+                'score': row[4]
+            }
+            for row in cursor.fetchall()
+        ]
+    
+    def rebuild_search_index(self):
+        """Reconstruir los índices full-text desde las tablas (backfill)"""
+        for table in ('interactions_fts', 'learnings_fts'):
+            self.writer.put(f"INSERT INTO {table}({table}) VALUES ('rebuild')", ())
+            self.writer.put(f"INSERT INTO {table}({table}) VALUES ('optimize')", ())
+        self.flush()
+        if self.semantic is not None:
+            self.semantic.reset()
+            self.backfill_semantic(self.semantic)
+
+
+class SessionPool:
+    """
+    Pool de sesiones HTTP compartidas por proveedor.
+    Reutiliza conexiones TCP/TLS (keep-alive) y cachea DNS entre micro-conversaciones.
+    """
+    
+    def __init__(self, limits: Optional[Dict[str, int]] = None,
+                 keepalive_timeout: float = POOL_KEEPALIVE, dns_ttl: int = POOL_DNS_TTL):
+        self.limits = {**POOL_LIMITS, **(limits or {})}
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_ttl = dns_ttl
+        self.sessions: Dict[str, aiohttp.ClientSession] = {}
+    
+    def get(self, provider: str) -> aiohttp.ClientSession:
+        """Obtener (o crear) la sesión del proveedor; debe llamarse dentro del event loop"""
+        import aiohttp
+        session = self.sessions.get(provider)
+        if session is None or session.closed:
+            limit = self.limits.get(provider, 10)
+            connector = aiohttp.TCPConnector(
+                limit=limit,
+                limit_per_host=limit,
+                use_dns_cache=True,
+                ttl_dns_cache=self.dns_ttl,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            session = aiohttp.ClientSession(connector=connector)
+            self.sessions[provider] = session
+        return session
+    
+    async def close(self):
+        """Cerrar todas las sesiones abiertas"""
+        sessions = list(self.sessions.values())
+        self.sessions.clear()
+        for session in sessions:
+            if not session.closed:
+                await session.close()
+
+
+class SingleFlight:
+    """
+    Coalescencia de llamadas concurrentes idénticas (single-flight):
+    mientras una llamada con la misma clave está en vuelo, las duplicadas
+    esperan la misma tarea y reciben su resultado o su error.
+    La llamada compartida corre en su propia tarea: cancelar a un llamador
+    (también al primero) no la cancela mientras quede alguien esperándola.
+    """
+    
+    def __init__(self):
+        self.inflight: Dict[Any, asyncio.Task] = {}
+        self.waiters: Dict[asyncio.Task, int] = {}
+        self.calls = 0
+        self.coalesced = 0
+    
+    async def do(self, key, factory):
+        """Ejecutar factory() una sola vez por clave en vuelo; devuelve (resultado, coalesced)"""
+        task = self.inflight.get(key)
+        coalesced = task is not None
+        if coalesced:
+            self.coalesced += 1
+        else:
+            self.calls += 1
+            task = asyncio.ensure_future(factory())
+            self.inflight[key] = task
+            task.add_done_callback(lambda done: self.forget(key, done))
+        
+        self.waiters[task] = self.waiters.get(task, 0) + 1
+        try:
+            # shield: cancelar a un llamador no cancela la llamada compartida
+            return await asyncio.shield(task), coalesced
+        finally:
+            self.waiters[task] -= 1
+            if not self.waiters[task]:
+                del self.waiters[task]
+                if not task.done():
+                    # Nadie más la espera: cancelarla y esperar su limpieza
+                    task.cancel()
+                    await asyncio.wait({task})
+    
+    def forget(self, key, task: asyncio.Task):
+        if self.inflight.get(key) is task:
+            del self.inflight[key]
+        if not task.cancelled():
+            task.exception()  # marcar como consumida si todos los llamadores se fueron
+    
+    def stats(self) -> Dict:
+        return {
+            'calls': self.calls,
+            'coalesced': self.coalesced,
+            'in_flight': len(self.inflight)
+        }
+
+
+class LLMError(Exception):
+    """
+    Error de un proveedor LLM (HTTP no exitoso, timeout, API key faltante, etc.).
+    retryable indica si vale la pena reintentar; retry_after es la espera pedida por el proveedor.
+    """
+    
+    def __init__(self, message: str, status: Optional[int] = None,
+                 retryable: bool = False, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """
+    Limitador del lado cliente para un proveedor: dos token buckets (requests/min y
+    tokens/min) y una cola por prioridad. Las consultas interactivas pasan antes que
+    las de batch; dentro de una misma prioridad el orden es FIFO.
+    """
+    
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.request_rate = requests_per_minute / 60.0
+        self.token_rate = tokens_per_minute / 60.0
+        self.request_capacity = float(requests_per_minute)
+        self.token_capacity = float(tokens_per_minute)
+        self.requests_available = self.request_capacity
+        self.tokens_available = self.token_capacity
+        self.updated = time.monotonic()
+        self.waiters = []
+        self.sequence = 0
+        self.dispatcher = None
+        self.granted = 0
+        self.throttled = 0
+        self.wait_time = 0.0
+    
+    def refill(self):
+        now = time.monotonic()
+        elapsed = now - self.updated
+        self.updated = now
+        self.requests_available = min(self.request_capacity, self.requests_available + elapsed * self.request_rate)
+        self.tokens_available = min(self.token_capacity, self.tokens_available + elapsed * self.token_rate)
+    
+    def deficit(self, tokens: float) -> float:
+        """Segundos hasta que haya cupo para un request de `tokens` tokens (0 si ya hay)"""
+        self.refill()
+        wait_requests = max(0.0, 1 - self.requests_available) / self.request_rate
+        wait_tokens = max(0.0, tokens - self.tokens_available) / self.token_rate
+        return max(wait_requests, wait_tokens)
+    
+    def consume(self, tokens: float):
+        self.requests_available -= 1
+        self.tokens_available -= tokens
+        self.granted += 1
+    
+    async def acquire(self, tokens: int, priority: int = None):
+        """Esperar cupo para un request que estima usar `tokens` tokens"""
+        if priority is None:
+            priority = REQUEST_PRIORITY.get()
+        tokens = min(float(tokens), self.token_capacity)
+        
+        if not self.waiters and self.deficit(tokens) == 0:
+            self.consume(tokens)
+            return
+        
+        self.throttled += 1
+        started = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        self.sequence += 1
+        heapq.heappush(self.waiters, (priority, self.sequence, tokens, future))
+        if self.dispatcher is None or self.dispatcher.done():
+            self.dispatcher = asyncio.ensure_future(self.dispatch())
+        try:
+            await future
+        finally:
+            self.wait_time += time.monotonic() - started
+    
+    async def dispatch(self):
+        """Atender la cola en orden de prioridad a medida que los buckets se recargan"""
+        while self.waiters:
+            priority, sequence, tokens, future = self.waiters[0]
+            if future.done():  # cancelado mientras esperaba
+                heapq.heappop(self.waiters)
+                continue
+            wait = self.deficit(tokens)
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            heapq.heappop(self.waiters)
+            self.consume(tokens)
+            future.set_result(None)
+    
+    def stats(self) -> Dict:
+        queued = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, _, future in self.waiters:
+            if not future.done():
+                queued[PRIORITY_NAMES.get(priority, str(priority))] += 1
+        return {
+            'queued': queued,
+            'granted': self.granted,
+            'throttled': self.throttled,
+            'wait_time': self.wait_time
+        }
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker por proveedor: tras BREAKER_THRESHOLD fallas consecutivas se abre
+    y rechaza llamadas durante BREAKER_COOLDOWN segundos; luego deja pasar una de prueba
+    (half-open) que lo cierra si tiene éxito o lo vuelve a abrir si falla. Si la prueba
+    no vuelve en BREAKER_TRIAL_TIMEOUT segundos, se deja pasar otra.
+    hold() lo mantiene abierto hasta una hora dada (Retry-After) sin contar una falla.
+    """
+    
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.held_until = 0.0
+        self.trial_in_flight = False
+        self.trial_started = 0.0
+    
+    @property
+    def state(self) -> str:
+        if time.time() < self.held_until:
+            return 'open'
+        if self.opened_at is None:
+            return 'closed'
+        if time.time() - self.opened_at >= self.cooldown:
+            return 'half_open'
+        return 'open'
+    
+    def allow(self) -> bool:
+        """¿Se puede llamar al proveedor ahora?"""
+        state = self.state
+        if state == 'closed':
+            return True
+        if state == 'half_open' and (not self.trial_in_flight
+                                     or time.time() - self.trial_started >= BREAKER_TRIAL_TIMEOUT):
+            self.trial_in_flight = True
+            self.trial_started = time.time()
+            return True
+        return False
+    
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+    
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.failures >= self.threshold or self.opened_at is not None:
+            self.opened_at = time.time()
+    
+    def release(self):
+        """Liberar la llamada de prueba sin veredicto (p.ej. cancelada o error del cliente)"""
+        self.trial_in_flight = False
+    
+    def hold(self, seconds: float):
+        """Rechazar llamadas durante `seconds` (el proveedor pidió esperar), sin contarlo como falla"""
+        self.held_until = max(self.held_until, time.time() + seconds)
+        self.trial_in_flight = False
+    
+    def held_for(self) -> float:
+        """Segundos que faltan para que termine un hold()"""
+        return max(0.0, self.held_until - time.time())
+
+
+def status_error(label: str, response: aiohttp.ClientResponse) -> LLMError:
+    """Clasificar una respuesta HTTP no exitosa (con el Retry-After pedido, sin recortar)"""
+    return LLMError(
+        f"{label} error: {response.status}",
+        response.status,
+        retryable=response.status in RETRYABLE_STATUS,
+        retry_after=parse_retry_after(response.headers.get('Retry-After'))
+    )
+
+
+def parse_retry_after(header: Optional[str]) -> Optional[float]:
+    """Segundos de un Retry-After, en segundos o como fecha HTTP (None si falta o es inválido)"""
+    if not header:
+        return None
+    try:
+        return max(0.0, float(header))
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime
+    try:
+        return max(0.0, parsedate_to_datetime(header).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int) -> float:
+    """Backoff exponencial con jitter completo"""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)))
 
 
 class LLMConnector:
     """Conector base para LLMs con micro-conversaciones"""
     
-    def __init__(self, name: str, memory: MemorySystem):
+    label = 'LLM'
+    model = None
+    max_tokens = 1024
+    
+    def __init__(self, name: str, memory: MemorySystem,
+                 session_pool: Optional[SessionPool] = None,
+                 cache: Optional[ResponseCache] = None,
+                 metrics: Optional[Metrics] = None,
+                 router: Optional[Router] = None):
         self.name = name
         self.memory = memory
+        self.session_pool = session_pool or SessionPool()
+        self.cache = cache
+        self.metrics = metrics or Metrics(trace_path=None)
+        self.router = router
         self.conversation_history = []
         self.active = True
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.breaker = CircuitBreaker()
+        self.rate_limiter = RateLimiter(*PROVIDER_RATE_LIMITS.get(name, DEFAULT_RATE_LIMIT))
+        self.prompt_stats = {'prompts': 0, 'tokens': 0, 'truncated': 0, 'dropped': 0}
+    
+    def cache_params(self) -> Dict:
+        """Parámetros de generación que forman parte de la clave de cache"""
+        return {'max_tokens': self.max_tokens}
         
-    async def micro_conversation(self, query: str, context: Dict) -> Dict:
-        """Mantener micro-conversación con el LLM"""
+    async def micro_conversation(self, query: str, context: Dict,
+                                 memories: Optional[List[Dict]] = None) -> Dict:
+        """Mantener micro-conversación con el LLM (con traza de latencia por etapa)"""
         start_time = time.time()
+        trace = self.metrics.start(self.name, ORCHESTRATION_MODE.get())
         
-        # Enriquecer query con contexto y memorias
-        enriched_query = self.enrich_query(query, context)
+        try:
+            with trace.stage('cache_lookup'):
+                cached = await self.cached_result(query, start_time)
+            if cached:
+                trace.outcome = 'cached'
+                return cached
+            
+            # Enriquecer query con contexto y memorias
+            enriched_query = await self.enrich_query(query, context, memories)
+            
+            try:
+                # Llamar al LLM específico
+                usage = {}
+                response = await self.call_llm(enriched_query, usage)
+                return self.complete_conversation(query, response, start_time, usage)
+                
+            except Exception as e:
+                trace.outcome = 'error'
+                return self.fail_conversation(query, e, start_time)
+        except asyncio.CancelledError:
+            trace.outcome = 'cancelled'
+            raise
+        except Exception:
+            trace.outcome = 'error'
+            raise
+        finally:
+            self.metrics.finish(trace)
+    
+    async def stream_conversation(self, query: str, context: Dict,
+                                  memories: Optional[List[Dict]] = None) -> AsyncIterator[Dict]:
+        """
+        Micro-conversación en streaming. Emite {'llm', 'chunk'} por cada fragmento
+        y al final {'llm', 'result'} con el mismo resultado que micro_conversation
+        más 'time_to_first_token'.
+        """
+        start_time = time.time()
+        trace = self.metrics.start(self.name, ORCHESTRATION_MODE.get())
         
         try:
-            # Llamar al LLM específico
-            response = await self.call_llm(enriched_query)
+            with trace.stage('cache_lookup'):
+                cached = await self.cached_result(query, start_time)
+            if cached:
+                trace.outcome = 'cached'
+                cached['time_to_first_token'] = cached['processing_time']
+                yield {'llm': self.name, 'chunk': cached['response']}
+                yield {'llm': self.name, 'result': cached}
+                return
             
-            # Extraer aprendizajes
-            learnings = self.extract_learnings(response)
+            enriched_query = await self.enrich_query(query, context, memories)
+            chunks = []
+            first_token = None
+            usage = {}
             
-            # Registrar en memoria
-            processing_time = time.time() - start_time
+            try:
+                async for chunk in self.stream_llm(enriched_query, usage):
+                    if first_token is None:
+                        first_token = time.time() - start_time
+                    chunks.append(chunk)
+                    yield {'llm': self.name, 'chunk': chunk}
+                
+                result = self.complete_conversation(query, "".join(chunks), start_time, usage)
+                
+            except Exception as e:
+                trace.outcome = 'error'
+                result = self.fail_conversation(query, e, start_time)
+            
+            result['time_to_first_token'] = first_token
+            yield {'llm': self.name, 'result': result}
+        except (asyncio.CancelledError, GeneratorExit):
+            trace.outcome = 'cancelled'
+            raise
+        except Exception:
+            trace.outcome = 'error'
+            raise
+        finally:
+            self.metrics.finish(trace)
+    
+    async def cached_result(self, query: str, start_time: float) -> Optional[Dict]:
+        """
+        Respuesta cacheada (exacta o casi-duplicada): sin llamada al proveedor ni
+        nueva fila en memoria. La clave usa la query original y no la enriquecida:
+        el enriquecimiento cambia con cada interacción registrada y nunca acertaría.
+        Los prompts derivados sólo aciertan por coincidencia exacta. La lectura
+        (SQLite, con busy timeout) corre en un thread, fuera del event loop.
+        """
+        if not self.cache:
+            return None
+        cached = await asyncio.get_running_loop().run_in_executor(
+            None, self.cache.lookup, self.name, self.model, query, self.cache_params(),
+            not self.derived_prompt(query)
+        )
+        if cached is None:
+            return None
+        response, similarity = cached
+        return {
+            'llm': self.name,
+            'response': response,
+            'learnings': self.extract_learnings(response),
+            'processing_time': time.time() - start_time,
+            'success': True,
+            'cached': True,
+            'similarity': similarity
+        }
+    
+    @staticmethod
+    def derived_prompt(query: str) -> bool:
+        """
+        Prompt armado por un modo a partir del objetivo (etapas de sequential y pipelined,
+        segunda ronda de consensus, specialized): comparte mucho texto con otros prompts
+        del mismo modo, así que no se busca ni se indexa como casi-duplicado.
+        """
+        objective = CURRENT_OBJECTIVE.get()
+        return objective is not None and query != objective
+    
+    def complete_conversation(self, query: str, response: str, start_time: float,
+                              usage: Optional[Dict] = None) -> Dict:
+        """
+        Cachear la respuesta (encolada en el escritor del cache), extraer aprendizajes
+        y registrar en memoria (con el uso de tokens)
+        """
+        with stage('db_write'):
+            if self.cache:
+                params = self.cache_params()
+                key = ResponseCache.make_key(self.name, self.model, query, params)
+                self.cache.put(key, self.name, self.model, response,
+                               None if self.derived_prompt(query) else query, params)
+        
+        # Extraer aprendizajes
+        with stage('learnings'):
+            learnings = self.extract_learnings(response)
+        
+        # Registrar en memoria. El router aprende sólo el tiempo de red: la espera del rate
+        # limiter, el enriquecimiento y las escrituras no dependen del proveedor
+        processing_time = time.time() - start_time
+        network_time = stage_seconds('network')
+        self.latencies.append(processing_time)
+        if self.router:
+            self.router.observe(self.name, processing_time if network_time is None else network_time,
+                                True, usage)
+        with stage('db_write'):
             self.memory.record_interaction(
-                self.name, query, response, processing_time, True
+                self.name, query, response, processing_time, True, usage, network_time=network_time
             )
             
             # Compartir aprendizajes
@@ -199,166 +1337,489 @@ class LLMConnector:
                     learning['knowledge'],
                     learning.get('confidence', 0.8)
                 )
-            
-            return {
-                'llm': self.name,
-                'response': response,
-                'learnings': learnings,
-                'processing_time': processing_time,
-                'success': True
-            }
-            
-        except Exception as e:
-            return {
-                'llm': self.name,
-                'error': str(e),
-                'processing_time': time.time() - start_time,
-                'success': False
-            }
-    
-    def enrich_query(self, query: str, context: Dict) -> str:
-        """Enriquecer query con contexto y memorias relevantes"""
-        memories = self.memory.get_relevant_memories(query, limit=3)
         
-        enriched = f"{query}\n\n"
-        
-        if context.get('current_objective'):
-            enriched += f"Current Objective: {context['current_objective']}\n"
-        
-        if memories:
-            enriched += "Relevant memories:\n"
-            for mem in memories:
-                enriched += f"- {mem['llm']}: {mem['query'][:100]}...\n"
-        
-        if context.get('shared_knowledge'):
-            enriched += f"\nShared knowledge: {json.dumps(context['shared_knowledge'], indent=2)}\n"
+        result = {
+            'llm': self.name,
+            'response': response,
+            'learnings': learnings,
+            'processing_time': processing_time,
+            'success': True
+        }
+        if usage:
+            result['usage'] = usage
+        return result
+    
+    def fail_conversation(self, query: str, error: Exception, start_time: float) -> Dict:
+        """Registrar la llamada fallida (el router aprende la tasa de error) y armar el resultado"""
+        processing_time = time.time() - start_time
+        network_time = stage_seconds('network')
+        if self.router:
+            self.router.observe(self.name, processing_time if network_time is None else network_time, False)
+        with stage('db_write'):
+            self.memory.record_interaction(self.name, query, str(error), processing_time, False,
+                                           network_time=network_time)
+        return {
+            'llm': self.name,
+            'error': str(error),
+            'processing_time': processing_time,
+            'success': False
+        }
+    
+    async def enrich_query(self, query: str, context: Dict,
+                           memories: Optional[List[Dict]] = None) -> str:
+        """
+        Enriquecer query con contexto, memorias relevantes y conocimiento compartido
+        dentro de PROMPT_TOKEN_BUDGET: la query entra siempre; objetivo, memorias y
+        conocimiento (en ese orden de prioridad) se recortan o descartan si no alcanza.
+        `memories` ya buscadas (p. ej. precargadas por el modo pipelined) evitan la búsqueda.
+        """
+        with stage('memory'):
+            if memories is None:
+                memories = await self.memory.search(query, limit=3)
         
+        with stage('enrich'):
+            return self.build_prompt(query, context, memories)
+    
+    def build_prompt(self, query: str, context: Dict, memories: List[Dict]) -> str:
+        """Armar el prompt enriquecido con PromptBuilder y actualizar prompt_stats"""
+        prompt = PromptBuilder(PROMPT_TOKEN_BUDGET)
+        prompt.add('query', query, priority=0, required=True)
+        
+        objective = CURRENT_OBJECTIVE.get()
+        if objective and objective != query:
+            prompt.add('objective', objective, priority=1, header="Current Objective: ")
+        
+        prompt.add('memories', "\n".join(f"- {mem['llm']}: {mem['query'][:100]}..." for mem in memories),
+                   priority=2, header="Relevant memories:\n")
+        prompt.add('knowledge', self.memory.knowledge.prompt_section(KNOWLEDGE_PROMPT_TOKENS),
+                   priority=3, header="Shared knowledge:\n")
+        
+        enriched, report = prompt.build()
+        self.prompt_stats['prompts'] += 1
+        self.prompt_stats['tokens'] += report['tokens']
+        self.prompt_stats['truncated'] += len(report['truncated'])
+        self.prompt_stats['dropped'] += len(report['dropped'])
         return enriched
     
     def extract_learnings(self, response: str) -> List[Dict]:
-        """Extraer patrones y aprendizajes de la respuesta"""
+        """Extraer patrones y aprendizajes de la respuesta (categoría 'learning' del registro de patrones)"""
+        matcher = default_matcher()
         learnings = []
-        
-        # Análisis básico de patrones
-        if "import" in response or "def " in response or "class " in response:
-            learnings.append({
-                'pattern': 'code_structure',
-                'knowledge': 'Code pattern detected',
-                'confidence': 0.9
-            })
-        
-        if "error" in response.lower() or "bug" in response.lower():
+        for pattern in matcher.scan(response, ('learning',))['learning']:
+            spec = matcher.spec('learning', pattern)
             learnings.append({
-                'pattern': 'error_handling',
-                'knowledge': 'Error or bug mentioned',
-                'confidence': 0.8
+                'pattern': pattern,
+                'knowledge': spec.get('knowledge', pattern),
+                'confidence': spec.get('confidence', 0.8)
             })
-        
-        if "optimize" in response.lower() or "improve" in response.lower():
-            learnings.append({
-                'pattern': 'optimization',
-                'knowledge': 'Optimization suggestion',
-                'confidence': 0.85
-            })
-        
         return learnings
     
-    async def call_llm(self, query: str) -> str:
-        """Llamada específica al LLM (override en subclases)"""
+    def build_request(self, query: str, stream: bool = False) -> Tuple[str, Dict, Dict]:
+        """(url, headers, payload) de la llamada al proveedor (override en subclases)"""
+        raise NotImplementedError
+    
+    def parse_response(self, data: Dict) -> str:
+        """Extraer el texto de una respuesta completa (override en subclases)"""
+        raise NotImplementedError
+    
+    def parse_stream_event(self, event: Dict) -> Optional[str]:
+        """Extraer el fragmento de texto de un evento SSE (override en subclases)"""
         raise NotImplementedError
+    
+    def parse_usage(self, data: Dict) -> Optional[Dict]:
+        """{'input_tokens', 'output_tokens'} informados en una respuesta completa (override en subclases)"""
+        return None
+    
+    def parse_stream_usage(self, event: Dict) -> Optional[Dict]:
+        """Uso de tokens (parcial o acumulado) informado en un evento SSE"""
+        return self.parse_usage(event)
+    
+    async def call_llm(self, query: str, usage: Optional[Dict] = None) -> str:
+        """
+        Llamada al LLM esperando la respuesta completa (con timeouts, reintentos y circuit breaker).
+        Si se pasa `usage`, se completa con los tokens que informa el proveedor.
+        """
+        url, headers, payload = self.build_request(query)
+        
+        estimated_tokens = self.estimate_tokens(query)
+        
+        async def request():
+            with stage('rate_limit'):
+                await self.rate_limiter.acquire(estimated_tokens)
+            with stage('network'):
+                async with self.session.post(url, headers=headers, json=payload,
+                                             timeout=self.timeout) as response:
+                    if response.status != 200:
+                        raise status_error(self.label, response)
+                    data = await response.json()
+            text = self.parse_response(data)
+            if usage is not None:
+                usage.update(self.parse_usage(data) or {})
+            return text
+        
+        return await self.with_resilience(request)
+    
+    async def stream_llm(self, query: str, usage: Optional[Dict] = None) -> AsyncIterator[str]:
+        """
+        Llamada al LLM en streaming (SSE): itera los fragmentos de texto a medida que llegan.
+        Sólo se reintenta antes del primer fragmento; después un error se propaga.
+        Si se pasa `usage`, se completa con los tokens que informan los eventos.
+        """
+        url, headers, payload = self.build_request(query, stream=True)
+        self.check_breaker()
+        estimated_tokens = self.estimate_tokens(query)
+        attempt = 0
+        started = False
+        verdict = False
+        
+        try:
+            while True:
+                try:
+                    with stage('rate_limit'):
+                        await self.rate_limiter.acquire(estimated_tokens)
+                    # Incluye el tiempo del consumidor entre fragmentos (el stream no se bufferiza)
+                    with stage('network'):
+                        async with self.session.post(url, headers=headers, json=payload,
+                                                     timeout=self.timeout) as response:
+                            if response.status != 200:
+                                raise status_error(self.label, response)
+                            async for event in iter_sse(response):
+                                if usage is not None:
+                                    usage.update(self.parse_stream_usage(event) or {})
+                                text = self.parse_stream_event(event)
+                                if text:
+                                    started = True
+                                    yield text
+                    self.breaker.record_success()
+                    verdict = True
+                    return
+                except Exception as e:
+                    error = self.classify_error(e)
+                    if started:
+                        raise error from e
+                    if not self.should_retry(error, attempt):
+                        verdict = True
+                        raise error from e
+                    await asyncio.sleep(error.retry_after or backoff_delay(attempt))
+                    attempt += 1
+        finally:
+            # Sin veredicto: cancelado, consumidor que abandona el stream (GeneratorExit)
+            # o error a mitad del stream; liberar la llamada de prueba del breaker
+            if not verdict:
+                self.breaker.release()
+    
+    def estimate_tokens(self, query: str) -> int:
+        """Tokens estimados de un request: prompt (estimación local) + max_tokens"""
+        return estimate_tokens(query) + self.max_tokens
+    
+    def check_breaker(self):
+        """Fallar rápido si el circuit breaker del proveedor está abierto"""
+        if not self.breaker.allow():
+            held = self.breaker.held_for()
+            if held:
+                raise LLMError(f"{self.label} unavailable: throttled for {held:.0f}s more",
+                               THROTTLED_STATUS, retry_after=held)
+            raise LLMError(f"{self.label} unavailable: circuit open")
+    
+    def classify_error(self, error: Exception) -> LLMError:
+        """Convertir errores de red/timeout en LLMError reintentables"""
+        if isinstance(error, LLMError):
+            return error
+        if isinstance(error, asyncio.TimeoutError):
+            return LLMError(f"{self.label} timeout", retryable=True)
+        import aiohttp
+        if isinstance(error, aiohttp.ClientError):
+            return LLMError(f"{self.label} connection error: {error}", retryable=True)
+        return LLMError(f"{self.label} error: {error}")
+    
+    def should_retry(self, error: LLMError, attempt: int) -> bool:
+        """
+        Registrar la falla en el breaker y decidir si se reintenta. Un 429 es limitación,
+        no caída: no cuenta como falla. Si el proveedor pide esperar más que RETRY_MAX_DELAY,
+        se falla ya y el breaker queda abierto hasta entonces.
+        """
+        if error.retryable and error.status != THROTTLED_STATUS:
+            self.breaker.record_failure()
+        else:
+            self.breaker.release()
+        if error.retry_after is not None and error.retry_after > RETRY_MAX_DELAY:
+            self.breaker.hold(error.retry_after)
+            return False
+        return error.retryable and attempt + 1 < RETRY_ATTEMPTS and self.breaker.state == 'closed'
+    
+    async def with_resilience(self, operation: Callable):
+        """Ejecutar una llamada con circuit breaker y reintentos con backoff exponencial + jitter"""
+        self.check_breaker()
+        attempt = 0
+        while True:
+            try:
+                result = await operation()
+                self.breaker.record_success()
+                return result
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception as e:
+                error = self.classify_error(e)
+                if not self.should_retry(error, attempt):
+                    raise error from e
+                await asyncio.sleep(error.retry_after or backoff_delay(attempt))
+                attempt += 1
+    
+    @property
+    def timeout(self) -> aiohttp.ClientTimeout:
+        """Deadlines de conexión y de lectura del proveedor"""
+        import aiohttp
+        connect, read = PROVIDER_TIMEOUTS.get(self.name, DEFAULT_TIMEOUT)
+        return aiohttp.ClientTimeout(total=None, sock_connect=connect, sock_read=read)
+    
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        """Percentil de las latencias recientes (None sin historial)"""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(percentile * len(ordered)))]
+    
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Sesión HTTP compartida de este proveedor"""
+        return self.session_pool.get(self.name)
+
+
+async def iter_sse(response: aiohttp.ClientResponse) -> AsyncIterator[Dict]:
+    """Iterar los eventos 'data:' (JSON) de una respuesta Server-Sent Events"""
+    async for raw_line in response.content:
+        line = raw_line.decode('utf-8').strip()
+        if not line.startswith('data:'):
+            continue
+        data = line[5:].strip()
+        if not data or data == '[DONE]':
+            continue
+        yield json.loads(data)
 
 
 class ClaudeConnector(LLMConnector):
     """Conector para Claude con micro-conversaciones"""
     
-    async def call_llm(self, query: str) -> str:
+    label = 'Claude'
+    model = 'claude-3-sonnet-20240229'
+    
+    def build_request(self, query: str, stream: bool = False) -> Tuple[str, Dict, Dict]:
         api_key = os.getenv('ANTHROPIC_API_KEY')
         if not api_key:
-            return "Claude API key not configured"
+            raise LLMError("Claude API key not configured")
         
-        async with aiohttp.ClientSession() as session:
-            headers = {
-                'x-api-key': api_key,
-                'anthropic-version': '2023-06-01',
-                'content-type': 'application/json'
-            }
-            
-            payload = {
-                'model': 'claude-3-sonnet-20240229',
-                'max_tokens': 1024,
-                'messages': [{'role': 'user', 'content': query}]
-            }
-            
-            async with session.post(
-                'https://api.anthropic.com/v1/messages',
-                headers=headers,
-                json=payload
-            ) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return data['content'][0]['text']
-                else:
-                    return f"Claude error: {response.status}"
+        headers = {
+            'x-api-key': api_key,
+            'anthropic-version': '2023-06-01',
+            'content-type': 'application/json'
+        }
+        
+        payload = {
+            'model': self.model,
+            'max_tokens': self.max_tokens,
+            'messages': [{'role': 'user', 'content': query}]
+        }
+        if stream:
+            payload['stream'] = True
+        
+        return f'{ANTHROPIC_API_URL}/v1/messages', headers, payload
+    
+    def parse_response(self, data: Dict) -> str:
+        return data['content'][0]['text']
+    
+    def parse_usage(self, data: Dict) -> Optional[Dict]:
+        usage = data.get('usage')
+        if not usage:
+            return None
+        return {'input_tokens': usage.get('input_tokens', 0), 'output_tokens': usage.get('output_tokens', 0)}
+    
+    def parse_stream_usage(self, event: Dict) -> Optional[Dict]:
+        # message_start trae el uso del prompt; message_delta, los tokens de salida acumulados
+        if event.get('type') == 'message_start':
+            return self.parse_usage(event.get('message', {}))
+        if event.get('type') == 'message_delta' and event.get('usage'):
+            return {'output_tokens': event['usage'].get('output_tokens', 0)}
+        return None
+    
+    def parse_stream_event(self, event: Dict) -> Optional[str]:
+        if event.get('type') == 'error':
+            raise LLMError(f"Claude error: {event.get('error', {}).get('message', 'stream error')}")
+        if event.get('type') == 'content_block_delta':
+            return event['delta'].get('text')
+        return None
 
 
 class CodexConnector(LLMConnector):
     """Conector para OpenAI/Codex con micro-conversaciones"""
     
-    async def call_llm(self, query: str) -> str:
+    label = 'Codex'
+    model = 'gpt-4'
+    
+    def build_request(self, query: str, stream: bool = False) -> Tuple[str, Dict, Dict]:
         api_key = os.getenv('OPENAI_API_KEY')
         if not api_key:
-            return "OpenAI API key not configured"
+            raise LLMError("OpenAI API key not configured")
         
-        async with aiohttp.ClientSession() as session:
-            headers = {
-                'Authorization': f'Bearer {api_key}',
-                'Content-Type': 'application/json'
-            }
-            
-            payload = {
-                'model': 'gpt-4',
-                'messages': [
-                    {'role': 'system', 'content': 'You are Codex, specialized in code generation and technical implementation.'},
-                    {'role': 'user', 'content': query}
-                ],
-                'max_tokens': 1024
-            }
-            
-            async with session.post(
-                'https://api.openai.com/v1/chat/completions',
-                headers=headers,
-                json=payload
-            ) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return data['choices'][0]['message']['content']
-                else:
-                    return f"Codex error: {response.status}"
+        headers = {
+            'Authorization': f'Bearer {api_key}',
+            'Content-Type': 'application/json'
+        }
+        
+        payload = {
+            'model': self.model,
+            'messages': [
+                {'role': 'system', 'content': 'You are Codex, specialized in code generation and technical implementation.'},
+                {'role': 'user', 'content': query}
+            ],
+            'max_tokens': self.max_tokens
+        }
+        if stream:
+            payload['stream'] = True
+            payload['stream_options'] = {'include_usage': True}  # último chunk con el uso
+        
+        return f'{OPENAI_API_URL}/v1/chat/completions', headers, payload
+    
+    def parse_response(self, data: Dict) -> str:
+        return data['choices'][0]['message']['content']
+    
+    def parse_usage(self, data: Dict) -> Optional[Dict]:
+        usage = data.get('usage')
+        if not usage:
+            return None
+        return {'input_tokens': usage.get('prompt_tokens', 0), 'output_tokens': usage.get('completion_tokens', 0)}
+    
+    def parse_stream_event(self, event: Dict) -> Optional[str]:
+        if 'error' in event:
+            raise LLMError(f"Codex error: {event['error'].get('message', 'stream error')}")
+        choices = event.get('choices') or [{}]
+        return choices[0].get('delta', {}).get('content')
 
 
 class GeminiConnector(LLMConnector):
     """Conector para Gemini con micro-conversaciones"""
     
-    async def call_llm(self, query: str) -> str:
+    label = 'Gemini'
+    model = 'gemini-pro'
+    
+    def build_request(self, query: str, stream: bool = False) -> Tuple[str, Dict, Dict]:
         api_key = os.getenv('GEMINI_API_KEY') or os.getenv('GOOGLE_API_KEY')
         if not api_key:
-            return "Gemini API key not configured"
+            raise LLMError("Gemini API key not configured")
+        
+        base = f"{GEMINI_API_URL}/v1beta/models/{self.model}"
+        if stream:
+            url = f"{base}:streamGenerateContent?alt=sse&key={api_key}"
+        else:
+            url = f"{base}:generateContent?key={api_key}"
+        
+        payload = {
+            'contents': [{
+                'parts': [{'text': query}]
+            }],
+            'generationConfig': {'maxOutputTokens': self.max_tokens}
+        }
         
-        async with aiohttp.ClientSession() as session:
-            url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent?key={api_key}"
+        return url, {}, payload
+    
+    def parse_response(self, data: Dict) -> str:
+        return data['candidates'][0]['content']['parts'][0]['text']
+    
+    def parse_usage(self, data: Dict) -> Optional[Dict]:
+        # En streaming cada chunk trae el uso acumulado: el último gana
+        usage = data.get('usageMetadata')
+        if not usage:
+            return None
+        return {'input_tokens': usage.get('promptTokenCount', 0),
+                'output_tokens': usage.get('candidatesTokenCount', 0)}
+    
+    def parse_stream_event(self, event: Dict) -> Optional[str]:
+        if 'error' in event:
+            raise LLMError(f"Gemini error: {event['error'].get('message', 'stream error')}")
+        candidates = event.get('candidates') or [{}]
+        parts = candidates[0].get('content', {}).get('parts', [])
+        return "".join(part.get('text', '') for part in parts)
+
+
+class KnowledgeDistributor:
+    """
+    Distribuye los aprendizajes al contexto compartido desde el event loop.
+    
+    Bloquea en la cola sin polling; agrupa las ráfagas hasta LEARNING_DEBOUNCE
+    segundos sin novedades (como mucho LEARNING_MAX_DELAY) y escribe un único
+    snapshot atómico del contexto por lote.
+    """
+    
+    _STOP = object()
+    
+    def __init__(self, memory: MemorySystem, debounce: float = LEARNING_DEBOUNCE,
+                 max_delay: float = LEARNING_MAX_DELAY):
+        self.memory = memory
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.task: Optional[asyncio.Task] = None
+        self.distributed = 0
+        self.snapshots = 0
+    
+    def put(self, learning: Dict):
+        """Encolar un aprendizaje; el loop distribuidor arranca con el primero"""
+        if self.task is None:
+            self.task = asyncio.ensure_future(self.run())
+        self.queue.put_nowait(learning)
+    
+    async def close(self):
+        """Distribuir lo pendiente, escribir el último snapshot y detener el loop"""
+        if self.task is None:
+            return
+        self.queue.put_nowait(self._STOP)
+        await self.task
+        self.task = None
+    
+    async def run(self):
+        """Loop distribuidor: un snapshot del contexto por ráfaga de aprendizajes"""
+        loop = asyncio.get_running_loop()
+        stopping = False
+        
+        while not stopping:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_delay
             
-            payload = {
-                'contents': [{
-                    'parts': [{'text': query}]
-                }]
-            }
+            # Esperar a que la ráfaga se calme (o venza el plazo máximo)
+            while batch[-1] is not self._STOP:
+                timeout = min(self.debounce, deadline - loop.time())
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
             
-            async with session.post(url, json=payload) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return data['candidates'][0]['content']['parts'][0]['text']
-                else:
-                    return f"Gemini error: {response.status}"
+            learnings = [item for item in batch if item is not self._STOP]
+            stopping = len(learnings) < len(batch)
+            if not learnings:
+                continue
+            try:
+                for learning in learnings:
+                    self.distribute_learning(learning)
+                # Serializar en el loop (dueño del contexto); escribir fuera de él
+                snapshot = self.memory.context_snapshot()
+                await loop.run_in_executor(None, self.memory.persist_context, snapshot)
+                self.distributed += len(learnings)
+                self.snapshots += 1
+            except Exception as e:
+                print(f"Learning distributor error: {e}")
+    
+    def distribute_learning(self, learning: Dict):
+        """Distribuir aprendizaje a otros LLMs"""
+        self.memory.knowledge.add(learning.get('source_llm'), learning.get('knowledge'))
+    
+    def stats(self) -> Dict:
+        return {
+            'pending': self.queue.qsize(),
+            'distributed': self.distributed,
+            'snapshots': self.snapshots
+        }
 
 
 class TrinityCortex:
@@ -369,43 +1830,41 @@ class TrinityCortex:
     
     def __init__(self):
         self.memory = MemorySystem()
+        self.session_pool = SessionPool()
+        # Escrituras del cache en su propia cola diferida: nunca esperan un commit en el loop
+        self.cache = (ResponseCache(CACHE_DB, writer=WriteBehindQueue(
+                          CACHE_DB, flush_interval=CACHE_FLUSH_INTERVAL, durability='async'))
+                      if CACHE_ENABLED else None)
+        self.metrics = Metrics(modes=ORCHESTRATION_MODES + ('direct',))
+        self.router = Router()
+        self.router.load(self.memory.provider_history(ROUTER_HISTORY * 3))
         self.llms = {
-            'claude': ClaudeConnector('claude', self.memory),
-            'codex': CodexConnector('codex', self.memory),
-            'gemini': GeminiConnector('gemini', self.memory)
+            'claude': ClaudeConnector('claude', self.memory, self.session_pool, self.cache,
+                                      self.metrics, self.router),
+            'codex': CodexConnector('codex', self.memory, self.session_pool, self.cache,
+                                    self.metrics, self.router),
+            'gemini': GeminiConnector('gemini', self.memory, self.session_pool, self.cache,
+                                      self.metrics, self.router)
         }
-        self.learning_queue = Queue()
+        self.distributor = KnowledgeDistributor(self.memory)
         self.active_objective = None
-        
-        # Iniciar thread de aprendizaje
-        self.learning_thread = threading.Thread(target=self.learning_loop, daemon=True)
-        self.learning_thread.start()
+        self.inflight = SingleFlight()
+        self.batch_offloader = None
     
-    def learning_loop(self):
-        """Loop continuo de aprendizaje y distribución de conocimiento"""
-        while True:
-            try:
-                if not self.learning_queue.empty():
-                    learning = self.learning_queue.get()
-                    # Distribuir aprendizaje a otros LLMs
-                    self.distribute_learning(learning)
-                time.sleep(0.1)
-            except Exception as e:
-                print(f"Learning loop error: {e}")
-    
-    def distribute_learning(self, learning: Dict):
-        """Distribuir aprendizaje a otros LLMs"""
-        source_llm = learning.get('source_llm')
-        knowledge = learning.get('knowledge')
-        
-        # Actualizar contexto compartido
-        if 'shared_knowledge' not in self.memory.context:
-            self.memory.context['shared_knowledge'] = {}
-        
-        self.memory.context['shared_knowledge'][source_llm] = knowledge
-        self.memory.save_context()
+    async def close(self):
+        """Liberar recursos: cerrar el pool HTTP y vaciar la memoria a disco"""
+        await self.distributor.close()
+        await self.session_pool.close()
+        self.memory.close()
+        if self.batch_offloader:
+            self.batch_offloader.ledger.close()
+        if self.cache:
+            self.cache.close()
+        self.metrics.close()
     
-    async def orchestrate(self, query: str, mode: str = 'parallel') -> Dict:
+    async def orchestrate(self, query: str, mode: str = 'parallel',
+                          on_chunk: Optional[Callable[[str, str], None]] = None,
+                          priority: int = PRIORITY_INTERACTIVE) -> Dict:
         """
         Orquestar micro-conversaciones con múltiples LLMs
         
@@ -414,32 +1873,163 @@ class TrinityCortex:
         - sequential: Cada LLM construye sobre el anterior
         - consensus: Los LLMs llegan a un consenso
         - specialized: Cada LLM maneja su especialidad
+        - race: Gana la primera respuesta exitosa; las demás se cancelan
+        - hedged: Empieza por el proveedor más rápido y lanza respaldos sólo
+                  si supera su percentil de latencia (HEDGE_PERCENTILE)
+        - routed: Un solo proveedor, el más barato que cumple el SLO según el router
+        - pipelined: Sequential con etapas solapadas: cada IA arranca desde la salida
+                     parcial (en streaming) de la anterior
+        
+        on_chunk(llm, texto) recibe los fragmentos en streaming (modos parallel y pipelined).
+        priority ordena los requests en los limitadores (PRIORITY_INTERACTIVE / PRIORITY_BATCH).
         """
         
         print(f"\n🔱 TRINITY CORTEX - Orchestration Mode: {mode}")
         print(f"📝 Query: {query}\n")
         
-        self.memory.context['current_objective'] = query
+        token = REQUEST_PRIORITY.set(priority)
+        mode_token = ORCHESTRATION_MODE.set(mode)
+        
+        # Orquestaciones idénticas concurrentes comparten una sola ejecución. La tarea
+        # compartida hereda el contexto del primero (prioridad, escrituras en bulk), así que
+        # ambos van en la clave; quien hace streaming necesita sus propios fragmentos
+        key = (mode, normalize_prompt(query), tuple(sorted(self.llms)), priority, BULK_WRITES.get())
+        try:
+            if on_chunk:
+                result, coalesced = await self.run_orchestration(query, mode, on_chunk), False
+            else:
+                result, coalesced = await self.inflight.do(
+                    key, lambda: self.run_orchestration(query, mode, on_chunk)
+                )
+        finally:
+            ORCHESTRATION_MODE.reset(mode_token)
+            REQUEST_PRIORITY.reset(token)
+        if coalesced:
+            print("🔁 Coalesced with an identical in-flight orchestration")
+            return {**result, 'coalesced': True}
+        return result
+    
+    async def orchestrate_many(self, queries, mode: str = 'parallel',
+                               concurrency: int = BATCH_CONCURRENCY) -> AsyncIterator[Dict]:
+        """
+        Orquestar muchas queries con concurrencia acotada, con prioridad de batch.
+        Emite {'index', 'query', 'result'} (o 'error') a medida que cada una termina,
+        no en el orden de entrada. Las escrituras de memoria se confirman en bloque.
+        """
+        pending = enumerate(queries)
+        running = {}
+        
+        async def orchestrate_bulk(query: str) -> Dict:
+            # Escritura en bloque sólo en la tarea de esta query, no en todo el proceso
+            with self.memory.bulk():
+                return await self.orchestrate(query, mode, priority=PRIORITY_BATCH)
+        
+        def launch() -> bool:
+            """Lanzar la siguiente query de la entrada, si queda alguna"""
+            item = next(pending, None)
+            if item is None:
+                return False
+            index, query = item
+            task = asyncio.ensure_future(orchestrate_bulk(query))
+            running[task] = (index, query)
+            return True
+        
+        try:
+            while len(running) < concurrency and launch():
+                pass
+            while running:
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    index, query = running.pop(task)
+                    item = {'index': index, 'query': query}
+                    try:
+                        item['result'] = task.result()
+                    except Exception as e:
+                        item['error'] = str(e)
+                    launch()
+                    yield item
+        finally:
+            # Consumidor que abandona el generador: no dejar orquestaciones colgadas
+            await self.cancel_tasks(set(running), running)
+            await self.memory.flush_async()
+    
+    @property
+    def batches(self) -> BatchOffloader:
+        """Offloader a las APIs de batch (Claude y Codex), creado al primer uso"""
+        if self.batch_offloader is None:
+            from tcc_batch import AnthropicBatchAPI, OpenAIBatchAPI, BatchLedger, BatchOffloader
+            apis = {
+                'claude': AnthropicBatchAPI(self.llms['claude'], ANTHROPIC_API_URL),
+                'codex': OpenAIBatchAPI(self.llms['codex'], OPENAI_API_URL)
+            }
+            self.batch_offloader = BatchOffloader(self.memory, apis, BatchLedger(BATCH_LEDGER_DB),
+                                                  BATCH_PAYLOAD_DIR, connector_errors=(LLMError,))
+        return self.batch_offloader
+    
+    async def submit_batch(self, queries: List[str], providers: Optional[List[str]] = None,
+                           output_path: Optional[str] = None) -> List[str]:
+        """
+        Enviar queries no urgentes a las APIs de batch de los proveedores.
+        Devuelve los ids locales de los jobs; los resultados llegan con resume_batches().
+        """
+        return await self.batches.submit(queries, providers, output_path)
+    
+    async def resume_batches(self, poll_interval: Optional[float] = None):
+        """Hacer polling de los jobs abiertos del registro (también de ejecuciones anteriores) hasta volcarlos"""
+        await self.batches.wait(poll_interval)
+    
+    async def run_orchestration(self, query: str, mode: str,
+                                on_chunk: Optional[Callable[[str, str], None]] = None) -> Dict:
+        """Ejecutar el modo de orquestación pedido con `query` como objetivo de sus prompts"""
+        objective_token = CURRENT_OBJECTIVE.set(query)
+        try:
+            return await self.run_mode(query, mode, on_chunk)
+        finally:
+            CURRENT_OBJECTIVE.reset(objective_token)
+    
+    async def run_mode(self, query: str, mode: str,
+                       on_chunk: Optional[Callable[[str, str], None]] = None) -> Dict:
+        """Despachar el modo de orquestación y medir su tiempo de pared"""
+        started = time.perf_counter()
         
         if mode == 'parallel':
-            return await self.parallel_orchestration(query)
+            result = await self.parallel_orchestration(query, on_chunk)
         elif mode == 'sequential':
-            return await self.sequential_orchestration(query)
+            result = await self.sequential_orchestration(query)
         elif mode == 'consensus':
-            return await self.consensus_orchestration(query)
+            result = await self.consensus_orchestration(query)
         elif mode == 'specialized':
-            return await self.specialized_orchestration(query)
+            result = await self.specialized_orchestration(query)
+        elif mode == 'race':
+            result = await self.race_orchestration(query)
+        elif mode == 'hedged':
+            result = await self.hedged_orchestration(query)
+        elif mode == 'routed':
+            result = await self.routed_orchestration(query)
+        elif mode == 'pipelined':
+            result = await self.pipelined_orchestration(query, on_chunk)
         else:
-            return await self.parallel_orchestration(query)
+            result = await self.parallel_orchestration(query, on_chunk)
+        
+        wall_time = time.perf_counter() - started
+        self.metrics.observe('trinity_orchestration_seconds', wall_time, mode=mode)
+        result['wall_time'] = wall_time
+        if 'summary' in result:
+            result['summary']['total_processing_time'] = wall_time
+        return result
     
-    async def parallel_orchestration(self, query: str) -> Dict:
-        """Todas las IAs procesan en paralelo"""
+    async def parallel_orchestration(self, query: str,
+                                     on_chunk: Optional[Callable[[str, str], None]] = None) -> Dict:
+        """Todas las IAs procesan en paralelo (con on_chunk, en streaming multiplexado)"""
         print("🔄 Initiating parallel micro-conversations...")
         
         # Crear tareas paralelas
         tasks = []
         for name, llm in self.llms.items():
-            task = llm.micro_conversation(query, self.memory.context)
+            if on_chunk:
+                task = self.consume_stream(llm, query, self.memory.context, on_chunk)
+            else:
+                task = llm.micro_conversation(query, self.memory.context)
             tasks.append(task)
         
         # Ejecutar en paralelo
@@ -449,16 +2039,135 @@ class TrinityCortex:
         consolidated = self.consolidate_results(results)
         
         # Compartir aprendizajes
+        self.share_learnings(results)
+        
+        return consolidated
+    
+    def share_learnings(self, results: List[Dict]):
+        """Encolar los aprendizajes de los resultados exitosos para distribuirlos"""
         for result in results:
             if result.get('success') and result.get('learnings'):
                 for learning in result['learnings']:
-                    self.learning_queue.put({
+                    self.distributor.put({
                         'source_llm': result['llm'],
                         'knowledge': learning['knowledge']
                     })
+    
+    async def race_orchestration(self, query: str) -> Dict:
+        """Todas las IAs compiten: gana la primera respuesta exitosa"""
+        print("🏁 Initiating race between micro-conversations...")
+        
+        tasks = {
+            asyncio.ensure_future(llm.micro_conversation(query, self.memory.context)): name
+            for name, llm in self.llms.items()
+        }
+        pending = set(tasks)
+        winner = None
+        failures = []
         
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if result.get('success') and winner is None:
+                        winner = result
+                    else:
+                        failures.append(result)
+        finally:
+            cancelled = await self.cancel_tasks(pending, tasks)
+        
+        return self.race_result('race', winner, failures, cancelled)
+    
+    async def hedged_orchestration(self, query: str) -> Dict:
+        """
+        Pedido con respaldo diferido: se consulta al proveedor más rápido y, si no
+        responde dentro de su percentil HEDGE_PERCENTILE de latencia (o falla),
+        se lanza el siguiente. Gana la primera respuesta exitosa.
+        """
+        print("🛡️ Initiating hedged micro-conversations...")
+        
+        order = sorted(
+            self.llms,
+            key=lambda name: self.llms[name].latency_percentile(0.5) or HEDGE_DEFAULT_DELAY
+        )
+        tasks = {}
+        pending = set()
+        winner = None
+        failures = []
+        
+        def launch():
+            name = order[len(tasks)]
+            task = asyncio.ensure_future(self.llms[name].micro_conversation(query, self.memory.context))
+            tasks[task] = name
+            pending.add(task)
+            return name
+        
+        try:
+            launch()
+            while winner is None and (pending or len(tasks) < len(order)):
+                if not pending:
+                    launch()
+                    continue
+                
+                # Plazo de cobertura: percentil de latencia del último proveedor lanzado
+                timeout = None
+                if len(tasks) < len(order):
+                    last = self.llms[order[len(tasks) - 1]]
+                    timeout = last.latency_percentile(HEDGE_PERCENTILE) or HEDGE_DEFAULT_DELAY
+                
+                done, pending = await asyncio.wait(pending, timeout=timeout,
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    print(f"  ⏩ Hedging with {launch()} after {timeout:.2f}s")
+                    continue
+                
+                for task in done:
+                    result = task.result()
+                    if result.get('success') and winner is None:
+                        winner = result
+                    else:
+                        failures.append(result)
+                        if winner is None and len(tasks) < len(order):
+                            print(f"  ⏩ {result['llm']} failed, falling back to {launch()}")
+        finally:
+            cancelled = await self.cancel_tasks(pending, tasks)
+        
+        return self.race_result('hedged', winner, failures, cancelled)
+    
+    async def cancel_tasks(self, pending: set, names: Dict) -> List[str]:
+        """
+        Cancelar micro-conversaciones perdedoras y esperar su cierre: la petición HTTP
+        se aborta y, como la memoria se escribe sólo al completar, no quedan filas parciales.
+        """
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        return [names[task] for task in pending]
+    
+    def race_result(self, mode: str, winner: Optional[Dict], failures: List[Dict],
+                    cancelled: List[str]) -> Dict:
+        """Consolidar el resultado de race/hedged"""
+        results = ([winner] if winner else []) + failures
+        consolidated = self.consolidate_results(results)
+        consolidated['mode'] = mode
+        consolidated['winner'] = winner['llm'] if winner else None
+        consolidated['cancelled'] = cancelled
+        self.share_learnings(results)
         return consolidated
     
+    async def consume_stream(self, llm: LLMConnector, query: str, context: Dict,
+                             on_chunk: Callable[[str, str], None]) -> Dict:
+        """Reenviar los fragmentos de una micro-conversación en streaming y devolver su resultado"""
+        result = None
+        async for event in llm.stream_conversation(query, context):
+            if 'chunk' in event:
+                on_chunk(event['llm'], event['chunk'])
+            else:
+                result = event['result']
+        return result
+    
     async def sequential_orchestration(self, query: str) -> Dict:
         """Cada IA construye sobre la anterior"""
         print("🔗 Initiating sequential micro-conversations...")
@@ -492,6 +2201,88 @@ class TrinityCortex:
         
         return self.consolidate_results(results)
     
+    async def pipelined_orchestration(self, query: str,
+                                      on_chunk: Optional[Callable[[str, str], None]] = None) -> Dict:
+        """
+        Sequential solapado: las etapas de PIPELINE_STAGES corren en streaming y cada una
+        arranca cuando la anterior llega a su punto de traspaso (PIPELINE_HANDOFF caracteres),
+        en lugar de esperar a que termine. Con el traspaso por defecto el prompt de cada
+        etapa es el mismo que en sequential. Las memorias de la query se buscan una sola vez,
+        mientras arranca la primera etapa, y se reutilizan en todas. Si una etapa falla se
+        cancelan las siguientes.
+        """
+        print("⛓️ Initiating pipelined sequential micro-conversations...")
+        
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        memories = asyncio.ensure_future(self.memory.search(query, limit=3))
+        # handoffs[i]: ventana de la salida de la etapa i para la siguiente (None si falló)
+        handoffs = [loop.create_future() for _ in PIPELINE_STAGES]
+        timeline = [{'llm': spec['llm']} for spec in PIPELINE_STAGES]
+        
+        def elapsed() -> float:
+            return round(time.perf_counter() - started, 4)
+        
+        def hand_off(index: int, text: Optional[str]):
+            if not handoffs[index].done():
+                handoffs[index].set_result(text)
+                if text is not None and index + 1 < len(PIPELINE_STAGES):
+                    timeline[index]['handoff'] = elapsed()
+        
+        async def run_stage(index: int, spec: Dict) -> Optional[Dict]:
+            upstream = ""
+            if index:
+                upstream = await handoffs[index - 1]
+                if upstream is None:
+                    hand_off(index, None)
+                    return None
+            
+            downstream = index + 1 < len(PIPELINE_STAGES)
+            handoff = PIPELINE_STAGES[index + 1].get('handoff', PIPELINE_HANDOFF) if downstream else 0
+            window = PIPELINE_STAGES[index + 1].get('window', PIPELINE_WINDOW) if downstream else 0
+            prompt = spec['prompt'].format(query=query, upstream=upstream)
+            llm = self.llms[spec['llm']]
+            
+            print(f"  {index + 1}\ufe0f\u20e3 {spec['label']}...")
+            timeline[index]['start'] = elapsed()
+            streamed = []
+            size = 0
+            result = None
+            async for event in llm.stream_conversation(prompt, self.memory.context, await memories):
+                if 'chunk' in event:
+                    streamed.append(event['chunk'])
+                    size += len(event['chunk'])
+                    if on_chunk:
+                        on_chunk(event['llm'], event['chunk'])
+                    if downstream and handoff and size >= handoff:
+                        hand_off(index, "".join(streamed)[:window])
+                else:
+                    result = event['result']
+            timeline[index]['end'] = elapsed()
+            hand_off(index, result['response'][:window] if result.get('success') else None)
+            return result
+        
+        tasks = [asyncio.ensure_future(run_stage(index, spec)) for index, spec in enumerate(PIPELINE_STAGES)]
+        results = []
+        try:
+            for task in tasks:
+                result = await task
+                if result is None:
+                    break
+                results.append(result)
+                if not result.get('success'):
+                    break
+        finally:
+            # Una etapa que falló después del traspaso cancela las que ya arrancaron
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        
+        consolidated = self.consolidate_results(results)
+        consolidated['pipeline'] = timeline
+        return consolidated
+    
     async def consensus_orchestration(self, query: str) -> Dict:
         """Las IAs llegan a un consenso"""
         print("🤝 Initiating consensus building...")
@@ -530,47 +2321,52 @@ class TrinityCortex:
         specialties = self.identify_specialties(query)
         
         results = []
-        
-        if 'strategy' in specialties or 'analysis' in specialties:
-            print("  📊 Claude handling strategy/analysis...")
-            claude_query = f"Provide strategic analysis for: {query}"
-            result = await self.llms['claude'].micro_conversation(claude_query, self.memory.context)
+        routing = {}
+        
+        # Cada especialidad va a su especialista salvo que el router lo vea fuera del SLO
+        # (lento o fallando): entonces al proveedor viable más barato
+        for specialty in specialties:
+            spec = default_matcher().spec('specialty', specialty)
+            specialist = spec.get('provider') if spec.get('provider') in self.llms else None
+            name = self.router.choose(self.available_llms(), preferred=specialist)[0]
+            routing[specialty] = name
+            note = f" (rerouted from {self.llms[specialist].label})" if specialist and name != specialist else ""
+            print(f"  {spec.get('icon', '🎯')} {self.llms[name].label} handling {specialty}{note}...")
+            prompt = spec.get('prompt', "{query}").format(query=query)
+            result = await self.llms[name].micro_conversation(prompt, self.memory.context)
             results.append(result)
         
-        if 'code' in specialties or 'implementation' in specialties:
-            print("  💻 Codex handling implementation...")
-            codex_query = f"Provide code implementation for: {query}"
-            result = await self.llms['codex'].micro_conversation(codex_query, self.memory.context)
-            results.append(result)
+        consolidated = self.consolidate_results(results)
+        consolidated['routing'] = routing
+        return consolidated
+    
+    async def routed_orchestration(self, query: str) -> Dict:
+        """
+        Un solo proveedor: el más barato cuyo p95 estimado cumple el SLO (ROUTER_SLO).
+        Si falla se pasa al siguiente del ranking del router.
+        """
+        print("🧭 Initiating routed micro-conversation...")
         
-        if 'research' in specialties or 'optimization' in specialties:
-            print("  🔬 Gemini handling research/optimization...")
-            gemini_query = f"Research and optimize: {query}"
-            result = await self.llms['gemini'].micro_conversation(gemini_query, self.memory.context)
+        results = []
+        for name in self.router.choose(self.available_llms()):
+            print(f"  🧭 Routing to {self.llms[name].label}...")
+            result = await self.llms[name].micro_conversation(query, self.memory.context)
             results.append(result)
+            if result.get('success'):
+                break
         
-        return self.consolidate_results(results)
+        consolidated = self.consolidate_results(results)
+        consolidated['routed_to'] = results[-1]['llm']
+        return consolidated
+    
+    def available_llms(self) -> List[str]:
+        """Proveedores con el circuito no abierto (todos, si no queda ninguno)"""
+        return [name for name, llm in self.llms.items() if llm.breaker.state != 'open'] or list(self.llms)
     
     def identify_specialties(self, query: str) -> List[str]:
-        """Identificar qué especialidades necesita la query"""
-        specialties = []
-        
-        query_lower = query.lower()
-        
-        # Patterns para detectar necesidades
-        if any(word in query_lower for word in ['strategy', 'plan', 'analyze', 'design']):
-            specialties.append('strategy')
-        
-        if any(word in query_lower for word in ['code', 'implement', 'function', 'api', 'script']):
-            specialties.append('code')
-        
-        if any(word in query_lower for word in ['research', 'optimize', 'improve', 'compare']):
-            specialties.append('research')
-        
-        if not specialties:
-            specialties = ['strategy', 'code', 'research']
-        
-        return specialties
+        """Identificar qué especialidades necesita la query (todas si ninguna coincide)"""
+        matcher = default_matcher()
+        return matcher.scan(query, ('specialty',))['specialty'] or list(matcher.registry.get('specialty', {}))
     
     def consolidate_results(self, results: List[Dict]) -> Dict:
         """Consolidar resultados de múltiples LLMs"""
@@ -586,11 +2382,27 @@ class TrinityCortex:
             'summary': {
                 'successful': len(successful),
                 'failed': len(failed),
-                'total_processing_time': sum(r.get('processing_time', 0) for r in results),
-                'learnings_extracted': sum(len(r.get('learnings', [])) for r in results)
+                # Tiempo de pared: run_orchestration lo reemplaza por el medido; acá, la
+                # conversación más lenta (exacto para rondas paralelas)
+                'total_processing_time': max((r.get('processing_time', 0) for r in results), default=0),
+                # Suma de los tiempos de cada proveedor (costo agregado, no latencia)
+                'provider_time': sum(r.get('processing_time', 0) for r in results),
+                'learnings_extracted': sum(len(r.get('learnings', [])) for r in results),
+                'cached': sum(1 for r in results if r.get('cached'))
             }
         }
         
+        reported = [r['usage'] for r in results if r.get('usage')]
+        if reported:
+            consolidated['summary']['tokens'] = {
+                'input': sum(u.get('input_tokens', 0) for u in reported),
+                'output': sum(u.get('output_tokens', 0) for u in reported)
+            }
+        
+        ttft = {r['llm']: r['time_to_first_token'] for r in results if r.get('time_to_first_token') is not None}
+        if ttft:
+            consolidated['summary']['time_to_first_token'] = ttft
+        
         # Crear respuesta unificada
         if successful:
             unified = "\n\n".join([
@@ -601,9 +2413,10 @@ class TrinityCortex:
         
         return consolidated
     
-    def show_memory_stats(self):
-        """Mostrar estadísticas de memoria"""
-        cursor = self.memory.conn.cursor()
+    def stats(self) -> Dict:
+        """Estadísticas de memoria, proveedores, orquestaciones y cache"""
+        self.memory.flush()
+        cursor = self.memory.readers.connection().cursor()
         
         # Total interacciones
         cursor.execute("SELECT COUNT(*) FROM interactions")
@@ -615,27 +2428,122 @@ class TrinityCortex:
         
         # Interacciones por LLM
         cursor.execute("""
-            SELECT llm, COUNT(*), AVG(processing_time) 
+            SELECT llm, COUNT(*), AVG(processing_time), SUM(NOT success)
             FROM interactions 
             GROUP BY llm
         """)
+        per_llm = {row[0]: {'interactions': row[1], 'avg_time': row[2] or 0.0, 'failures': row[3] or 0}
+                   for row in cursor.fetchall()}
+        
+        return {
+            'total_interactions': total_interactions,
+            'total_learnings': total_learnings,
+            'session_id': self.memory.context['session_id'],
+            'per_llm': per_llm,
+            'breakers': {name: {'state': llm.breaker.state, 'failures': llm.breaker.failures}
+                         for name, llm in self.llms.items()},
+            'rate_limiters': {name: llm.rate_limiter.stats() for name, llm in self.llms.items()},
+            'prompts': {name: llm.prompt_stats for name, llm in self.llms.items()},
+            'latency': self.metrics.summary(),
+            'router': self.router.stats(),
+            'orchestrations': self.inflight.stats(),
+            'learnings': self.distributor.stats(),
+            'readers': self.memory.readers.stats(),
+            'knowledge': self.memory.knowledge.stats(),
+            'cache': self.cache.stats() if self.cache else None
+        }
+    
+    def show_memory_stats(self):
+        """Mostrar estadísticas de memoria"""
+        stats = self.stats()
         
         print("\n📊 TRINITY MEMORY STATISTICS")
         print("=" * 40)
-        print(f"Total Interactions: {total_interactions}")
-        print(f"Total Learnings: {total_learnings}")
-        print(f"Session ID: {self.memory.context['session_id']}")
+        print(f"Total Interactions: {stats['total_interactions']}")
+        print(f"Total Learnings: {stats['total_learnings']}")
+        print(f"Session ID: {stats['session_id']}")
         print("\nPer LLM Statistics:")
         
-        for row in cursor.fetchall():
-            print(f"  {row[0]}: {row[1]} interactions, {row[2]:.2f}s avg")
+        for llm, row in stats['per_llm'].items():
+            print(f"  {llm}: {row['interactions']} interactions ({row['failures']} failed), "
+                  f"{row['avg_time']:.2f}s avg")
+        
+        print("\nCircuit Breakers:")
+        for name, breaker in stats['breakers'].items():
+            print(f"  {name}: {breaker['state']} ({breaker['failures']} consecutive failures)")
+        
+        print("\nRate Limiters:")
+        for name, limiter in stats['rate_limiters'].items():
+            queued = ", ".join(f"{lane} {count}" for lane, count in limiter['queued'].items())
+            print(f"  {name}: queued ({queued}), {limiter['granted']} granted, "
+                  f"{limiter['throttled']} throttled, {limiter['wait_time']:.1f}s waited")
+        
+        router = stats['router']
+        print(f"\nRouting (SLO {router['slo']:.1f}s p95, {router['explorations']} explorations):")
+        for name, estimate in router['providers'].items():
+            p95 = f"{estimate['p95']:.2f}s" if estimate['p95'] is not None else "n/a"
+            print(f"  {name}: p95 {p95}, {estimate['error_rate'] * 100:.0f}% errors, "
+                  f"${estimate['expected_cost']:.5f}/call, {router['decisions'].get(name, 0)} routed"
+                  f"{'' if estimate['viable'] else ' (over SLO)'}")
+        
+        inflight = stats['orchestrations']
+        print(f"\nOrchestrations: {inflight['calls']} executed, {inflight['coalesced']} coalesced")
+        
+        learnings = stats['learnings']
+        print(f"Learnings: {learnings['distributed']} distributed in {learnings['snapshots']} "
+              f"context snapshots, {learnings['pending']} pending")
+        knowledge = stats['knowledge']
+        print(f"Shared Knowledge: {knowledge['entries']} entries (~{knowledge['tokens']} tokens), "
+              f"{knowledge['evictions']} evicted, journal {knowledge['journal_lines']} lines")
+        
+        if stats['latency']:
+            # Detalle por proveedor/etapa/modo en stats()['latency'] y en `tcc metrics`
+            print("\nLatency (p50 / p95 / p99 ms):")
+            groups = (('trinity_orchestration_seconds', 'mode'), ('trinity_conversation_seconds', 'provider'),
+                      ('trinity_stage_seconds', 'stage'))
+            for metric, label in groups:
+                for row in self.metrics.grouped(metric, label):
+                    print(f"  {label} {row[label]:<13} {format_percentiles(row)}  n={row['count']}")
+        
+        if stats['cache']:
+            cache = stats['cache']
+            print("\nResponse Cache:")
+            print(f"  {cache['entries']} entries, {cache['hits']} hits, {cache['near_hits']} near hits, "
+                  f"{cache['misses']} misses ({cache['hit_rate'] * 100:.1f}% hit rate)")
         
         print("=" * 40)
 
 
+def format_percentiles(row: Dict) -> str:
+    return " / ".join(f"{row[p] * 1000:7.1f}" for p in ('p50', 'p95', 'p99'))
+
+
+class StreamPrinter:
+    """Renderiza fragmentos en streaming de varios LLMs: cada línea completa con su etiqueta"""
+    
+    def __init__(self):
+        self.buffers: Dict[str, str] = {}
+        self.received = False
+    
+    def __call__(self, llm: str, chunk: str):
+        self.received = True
+        buffer = self.buffers.get(llm, '') + chunk
+        *lines, buffer = buffer.split('\n')
+        for line in lines:
+            print(f"[{llm.upper()}] {line}", flush=True)
+        self.buffers[llm] = buffer
+    
+    def flush(self):
+        for llm, buffer in self.buffers.items():
+            if buffer:
+                print(f"[{llm.upper()}] {buffer}", flush=True)
+        self.buffers.clear()
+
+
 async def interactive_mode():
     """Modo interactivo de Trinity Cortex"""
     cortex = TrinityCortex()
+    streaming = STREAM_ENABLED
     
     print("""
     ╔══════════════════════════════════════════╗
@@ -649,7 +2557,13 @@ async def interactive_mode():
       'seq: query'          - Sequential orchestration
       'consensus: query'    - Consensus mode
       'spec: query'         - Specialized mode
+      'race: query'         - First successful response wins
+      'hedged: query'       - Fastest provider, backups after p95 latency
+      'route: query'        - Cheapest provider within the latency SLO
+      'pipe: query'         - Sequential chain with overlapping (streamed) stages
       'memory'              - Show memory statistics
+      'reindex'             - Rebuild full-text memory index
+      'stream'              - Toggle streaming output
       'clear'               - Clear screen
       'exit'                - Exit TCC
     """)
@@ -669,46 +2583,178 @@ async def interactive_mode():
                 cortex.show_memory_stats()
                 continue
             
+            if user_input == 'reindex':
+                cortex.memory.rebuild_search_index()
+                print("✅ Memory search index rebuilt")
+                continue
+            
             if user_input == 'clear':
                 os.system('clear' if os.name != 'nt' else 'cls')
                 continue
             
-            # Determinar modo
-            mode = 'parallel'
-            query = user_input
+            if user_input == 'stream':
+                streaming = not streaming
+                print(f"Streaming {'on' if streaming else 'off'}")
+                continue
             
-            if user_input.startswith('seq:'):
-                mode = 'sequential'
-                query = user_input[4:].strip()
-            elif user_input.startswith('consensus:'):
-                mode = 'consensus'
-                query = user_input[10:].strip()
-            elif user_input.startswith('spec:'):
-                mode = 'specialized'
-                query = user_input[5:].strip()
+            # Determinar modo
+            mode, query = parse_mode(user_input)
             
             # Ejecutar orquestación
-            result = await cortex.orchestrate(query, mode)
-            
-            # Mostrar resultados
-            print("\n" + "=" * 50)
-            if result.get('unified_response'):
-                print(result['unified_response'])
+            printer = StreamPrinter() if streaming else None
+            result = await cortex.orchestrate(query, mode, on_chunk=printer)
+            if printer:
+                printer.flush()
             
-            print("\n📊 Summary:")
-            summary = result.get('summary', {})
-            print(f"  ✓ Successful: {summary.get('successful', 0)}")
-            print(f"  ✗ Failed: {summary.get('failed', 0)}")
-            print(f"  ⏱️ Total Time: {summary.get('total_processing_time', 0):.2f}s")
-            print(f"  🧠 Learnings: {summary.get('learnings_extracted', 0)}")
+            # Mostrar resultados (si no se vieron ya en streaming)
+            print_result(result, streamed=bool(printer and printer.received))
             
         except KeyboardInterrupt:
             print("\n\nInterrupted by user")
             break
         except Exception as e:
             print(f"Error: {e}")
+    
+    await cortex.close()
+
+
+def reindex_command():
+    """Reconstruir el índice full-text de una base de memoria existente"""
+    memory = MemorySystem()
+    memory.rebuild_search_index()
+    print(f"✅ Memory search index rebuilt ({MEMORY_DB})")
+    memory.close()
+
+
+def read_batch_queries(path: str) -> List[Dict]:
+    """Leer queries de un JSONL: cada línea es {"query": ..., "id": ...} o un string JSON"""
+    entries = []
+    with open(path, 'r') as f:
+        for number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if isinstance(entry, str):
+                entry = {'query': entry}
+            if not isinstance(entry, dict) or not entry.get('query'):
+                raise ValueError(f"{path}:{number}: expected a string or an object with 'query'")
+            entries.append(entry)
+    return entries
+
+
+async def batch_command(argv: List[str]):
+    """Orquestar las queries de un archivo JSONL y escribir los resultados en JSONL"""
+    import argparse
+    parser = argparse.ArgumentParser(prog='tcc_v3.py batch',
+                                     description='Run a JSONL file of queries through Trinity Cortex')
+    parser.add_argument('input', help='JSONL file with one query per line')
+    parser.add_argument('output', help='JSONL file for the results (in completion order)')
+    parser.add_argument('--mode', default='parallel',
+                        choices=ORCHESTRATION_MODES)
+    parser.add_argument('--concurrency', type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument('--offload', action='store_true',
+                        help="submit through the providers' batch APIs instead of live calls")
+    parser.add_argument('--providers', default='claude,codex',
+                        help='comma-separated providers for --offload')
+    parser.add_argument('--poll-interval', type=float)
+    args = parser.parse_args(argv)
+    
+    entries = read_batch_queries(args.input)
+    cortex = TrinityCortex()
+    started = time.time()
+    failed = 0
+    
+    if args.offload:
+        try:
+            open(args.output, 'w').close()
+            await cortex.submit_batch([e['query'] for e in entries],
+                                      args.providers.split(','), os.path.abspath(args.output))
+            await cortex.resume_batches(args.poll_interval)
+        finally:
+            await cortex.close()
+        print(f"✅ Batch offload done: {len(entries)} queries, "
+              f"{time.time() - started:.1f}s → {args.output}")
+        return
+    
+    try:
+        with open(args.output, 'w') as out:
+            async for item in cortex.orchestrate_many([e['query'] for e in entries],
+                                                      args.mode, args.concurrency):
+                entry = entries[item['index']]
+                record = {'index': item['index'], 'query': item['query']}
+                if 'id' in entry:
+                    record['id'] = entry['id']
+                if 'error' in item:
+                    record['error'] = item['error']
+                else:
+                    record.update(item['result'])
+                if not record.get('success'):
+                    failed += 1
+                out.write(json.dumps(record, default=str) + "\n")
+                out.flush()
+    finally:
+        await cortex.close()
+    
+    print(f"✅ Batch done: {len(entries)} queries, {failed} failed, "
+          f"{time.time() - started:.1f}s → {args.output}")
+
+
+async def serve_command(argv: List[str]):
+    """Daemon `tcc serve`: un TrinityCortex caliente detrás de una API HTTP local"""
+    import argparse
+    from tcc_server import TrinityServer, daemon_token
+    
+    parser = argparse.ArgumentParser(prog='tcc serve', description='Run the Trinity Cortex daemon')
+    parser.add_argument('--socket', default=DAEMON_SOCKET, help='Unix socket path ("" to disable)')
+    parser.add_argument('--host', default=DAEMON_HOST)
+    parser.add_argument('--port', type=int, default=DAEMON_PORT,
+                        help='TCP port on --host (default: disabled); clients need the daemon token')
+    args = parser.parse_args(argv)
+    
+    try:
+        running = health()
+        print(f"⚠️ A Trinity Cortex daemon is already running (pid {running['pid']})")
+        return
+    except (DaemonUnavailable, OSError):
+        pass
+    
+    cortex = TrinityCortex()
+    server = TrinityServer(cortex, args.socket or None, args.host, args.port or None,
+                           daemon_token(DAEMON_TOKEN_FILE), ORCHESTRATION_MODES)
+    print(f"🔱 Trinity Cortex daemon started (pid {os.getpid()})")
+    try:
+        await server.run()
+    finally:
+        await cortex.close()
+        print("Trinity Cortex daemon stopped")
+
+
+async def batch_resume_command(argv: List[str]):
+    """Retomar los jobs de batch abiertos del registro local hasta volcarlos a memoria"""
+    import argparse
+    parser = argparse.ArgumentParser(prog='tcc_v3.py batch-resume',
+                                     description='Resume pending provider batch jobs')
+    parser.add_argument('--poll-interval', type=float)
+    args = parser.parse_args(argv)
+    
+    cortex = TrinityCortex()
+    try:
+        print(f"📦 Batch jobs: {cortex.batches.ledger.stats() or 'none'}")
+        await cortex.resume_batches(args.poll_interval)
+    finally:
+        await cortex.close()
 
 
 if __name__ == "__main__":
-    # Ejecutar modo interactivo
-    asyncio.run(interactive_mode())
+    if sys.argv[1:2] == ['reindex']:
+        reindex_command()
+    elif sys.argv[1:2] == ['batch']:
+        asyncio.run(batch_command(sys.argv[2:]))
+    elif sys.argv[1:2] == ['serve']:
+        asyncio.run(serve_command(sys.argv[2:]))
+    elif sys.argv[1:2] == ['batch-resume']:
+        asyncio.run(batch_resume_command(sys.argv[2:]))
+    else:
+        # Ejecutar modo interactivo
+        asyncio.run(interactive_mode())
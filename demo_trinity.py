@@ -5,19 +5,26 @@ Author: Gonzalo Haedo
 For: IV.AI Application Demo
 """
 
+import os
+import sys
 import time
 import json
+import hashlib
 import random
 from datetime import datetime
 from typing import Dict, List, Optional
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'core'))
+from tcc_cache import LSHIndex, NEAR_DUP_THRESHOLD, normalize_prompt
+from tcc_patterns import default_matcher
+
 class TrinityCortex:
     """
     Intelligent orchestration system for multiple LLMs
     Reduces API costs by 90% through smart routing and caching
     """
     
-    def __init__(self):
+    def __init__(self, similarity_threshold: float = NEAR_DUP_THRESHOLD):
         self.models = {
             'claude': {'name': 'Claude-3-Opus', 'cost_per_1k': 0.015, 'strengths': ['creative', 'coding', 'analysis']},
             'gpt4': {'name': 'GPT-4-Turbo', 'cost_per_1k': 0.010, 'strengths': ['general', 'reasoning', 'math']},
@@ -35,34 +42,51 @@ class TrinityCortex:
         self.memory_cache = {}
         self.context_memory = []
         
+        # Near-duplicate index (MinHash LSH) for paraphrased queries
+        self.near_index = LSHIndex(threshold=similarity_threshold)
+        self.near_hits = 0
+        
+        # Shared keyword registry (intents), compiled once
+        self.patterns = default_matcher()
+    
+    @staticmethod
+    def cache_key(query: str) -> str:
+        """Stable cache key (Python's hash() is randomized per process)"""
+        return hashlib.sha256(normalize_prompt(query).encode('utf-8')).hexdigest()
+        
     def analyze_query_intent(self, query: str) -> Dict:
         """
         Analyze query to determine optimal routing
         Similar to IV.AI's Magnet component
         """
-        query_lower = query.lower()
-        
-        # Determine query type
-        if any(word in query_lower for word in ['create', 'write', 'imagine', 'story']):
-            return {'type': 'creative', 'complexity': 'high', 'optimal_model': 'claude'}
-        elif any(word in query_lower for word in ['analyze', 'explain', 'compare']):
-            return {'type': 'analytical', 'complexity': 'medium', 'optimal_model': 'gemini'}
-        elif any(word in query_lower for word in ['calculate', 'solve', 'math']):
-            return {'type': 'mathematical', 'complexity': 'medium', 'optimal_model': 'gpt4'}
-        else:
-            return {'type': 'general', 'complexity': 'low', 'optimal_model': 'gpt4'}
+        # Determine query type: the first matching intent in registry order wins
+        intents = self.patterns.scan(query, ('intent',))['intent']
+        if intents:
+            spec = self.patterns.spec('intent', intents[0])
+            return {'type': intents[0], 'complexity': spec.get('complexity', 'medium'),
+                    'optimal_model': spec.get('optimal_model', 'gpt4')}
+        return {'type': 'general', 'complexity': 'low', 'optimal_model': 'gpt4'}
     
     def check_memory_cache(self, query: str) -> Optional[Dict]:
         """
-        Check if we have this query in cache
+        Check if we have this query (or a close paraphrase) in cache
         Similar to IV.AI's Glue component for data persistence
         """
-        query_hash = hash(query)
-        if query_hash in self.memory_cache:
-            cache_entry = self.memory_cache[query_hash]
-            # Check if cache is still valid (within 1 hour)
-            if time.time() - cache_entry['timestamp'] < 3600:
-                return cache_entry
+        query_key = self.cache_key(query)
+        similarity = 1.0
+        if query_key not in self.memory_cache:
+            nearest = self.near_index.query(query)
+            if nearest is None:
+                return None
+            query_key, similarity = nearest
+        
+        cache_entry = self.memory_cache[query_key]
+        # Check if cache is still valid (within 1 hour)
+        if time.time() - cache_entry['timestamp'] < 3600:
+            return {**cache_entry, 'similarity': similarity}
+        
+        del self.memory_cache[query_key]
+        self.near_index.remove(query_key)
         return None
     
     def route_to_optimal_model(self, query: str, force_quality: bool = False) -> Dict:
@@ -74,13 +98,16 @@ class TrinityCortex:
         cached = self.check_memory_cache(query)
         if cached:
             self.cache_hits += 1
+            if cached['similarity'] < 1.0:
+                self.near_hits += 1
             self.saved_cost += 0.01  # Average cost saved per cache hit
             return {
                 'response': cached['response'],
                 'model_used': 'CACHE',
                 'cost': 0,
                 'time': 0.01,
-                'cache_hit': True
+                'cache_hit': True,
+                'similarity': cached['similarity']
             }
         
         # Analyze query intent
@@ -109,12 +136,14 @@ class TrinityCortex:
         response = f"[{model_info['name']}] Processed query: '{query[:50]}...' | Intent: {intent['type']}"
         
         # Store in cache
-        self.memory_cache[hash(query)] = {
+        query_key = self.cache_key(query)
+        self.memory_cache[query_key] = {
             'query': query,
             'response': response,
             'timestamp': time.time(),
             'model': selected_model
         }
+        self.near_index.add(query_key, query)
         
         # Update metrics
         self.total_requests += 1
@@ -163,6 +192,7 @@ class TrinityCortex:
         return {
             'total_requests': self.total_requests,
             'cache_hits': self.cache_hits,
+            'near_duplicate_hits': self.near_hits,
             'cache_hit_rate': f"{(self.cache_hits / self.total_requests * 100) if self.total_requests > 0 else 0:.1f}%",
             'total_cost': f"${self.total_cost:.4f}",
             'cost_saved': f"${self.saved_cost:.4f}",
@@ -185,8 +215,9 @@ def run_demo():
     print("="*60)
     print()
     
-    # Initialize Trinity
-    cortex = TrinityCortex()
+    # Initialize Trinity (explicit near-duplicate threshold: the core default of 0
+    # disables paraphrase matching, and the demo shows it)
+    cortex = TrinityCortex(similarity_threshold=0.8)
     
     # Demo queries showcasing different capabilities
     test_queries = [
@@ -195,6 +226,7 @@ def run_demo():
         "Calculate the compound interest for a $10,000 investment",
         "Translate this text to Spanish",
         "Analyze the quarterly sales data and identify trends",  # Duplicate to show caching
+        "Analyze the quarterly sales data and identify the trends",  # Paraphrase (near-duplicate)
         "Explain the concept of quantum computing",
         "Generate a marketing slogan for a tech startup",
         "What are the latest AI developments?",
@@ -202,7 +234,7 @@ def run_demo():
         "Debug this Python code snippet"
     ]
     
-    print("Processing 10 diverse queries...\n")
+    print(f"Processing {len(test_queries)} diverse queries...\n")
     print("-"*60)
     
     # Process queries one by one to show real-time metrics
@@ -213,7 +245,9 @@ def run_demo():
         print(f"├─ Model: {result['model_used']}")
         print(f"├─ Cost: ${result['cost']:.4f}")
         print(f"├─ Time: {result['time']:.2f}s")
-        if result.get('cache_hit'):
+        if result.get('cache_hit') and result['similarity'] < 1.0:
+            print(f"└─ ✅ NEAR-DUPLICATE HIT (similarity {result['similarity']:.2f}) - Saved ${0.01:.4f}")
+        elif result.get('cache_hit'):
             print(f"└─ ✅ CACHE HIT - Saved ${0.01:.4f}")
         else:
             print(f"└─ Intent: {result.get('intent', {}).get('type', 'unknown')}")
@@ -240,7 +274,7 @@ def run_demo():
     print("\n" + "="*60)
     print("💡 Key Innovation: Intelligent routing based on query intent")
     print("🎯 Result: 90% cost reduction without sacrificing quality")
-    print("🚀 Ready to scale: Can handle 250+ requests/second")
+    print("📏 Measure real throughput: python benchmarks/orchestration.py")
     print("="*60)
 
 
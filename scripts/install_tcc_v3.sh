@@ -6,6 +6,8 @@ echo "🔱 Installing Trinity Cortex v3.0..."
 
 # Instalar dependencias Python
 pip install --user aiohttp sqlite3 asyncio
+# Opcional: memoria semántica (TRINITY_MEMORY_BACKEND=semantic|hybrid)
+pip install --user numpy
 
 # Crear estructura
 mkdir -p ~/.trinity-cortex/{memories,learnings,cache}
@@ -13,12 +15,20 @@ mkdir -p ~/.trinity-cortex/{memories,learnings,cache}
 # Copiar TCC v3
 if [ -f "tcc_v3.py" ]; then
     cp tcc_v3.py ~/.trinity-cortex/
-    chmod +x ~/.trinity-cortex/tcc_v3.py
+    cp tcc_cache.py tcc_knowledge.py tcc_prompt.py tcc_metrics.py tcc_router.py tcc_patterns.py ~/.trinity-cortex/
+    cp tcc_batch.py ~/.trinity-cortex/
+    cp tcc_client.py tcc_server.py ~/.trinity-cortex/
+    cp tcc ~/.trinity-cortex/tcc_cli
+    [ -f "tcc_semantic.py" ] && cp tcc_semantic.py ~/.trinity-cortex/
+    chmod +x ~/.trinity-cortex/tcc_v3.py ~/.trinity-cortex/tcc_cli
     
-    # Crear wrapper script
+    # Crear wrapper script: sin argumentos modo interactivo, con argumentos cliente del daemon
     cat > ~/.trinity-cortex/tcc << 'EOF'
 #!/bin/bash
-python3 ~/.trinity-cortex/tcc_v3.py "$@"
+if [ $# -eq 0 ]; then
+    exec python3 ~/.trinity-cortex/tcc_v3.py
+fi
+exec python3 ~/.trinity-cortex/tcc_cli "$@"
 EOF
     chmod +x ~/.trinity-cortex/tcc
     
@@ -42,6 +52,7 @@ fi
 echo ""
 echo "🔱 To start Trinity Cortex:"
 echo "   tcc                    # Interactive mode"
+echo "   tcc serve              # Warm daemon (then: tcc 'query', tcc status, tcc stop)"
 echo ""
 echo "Orchestration modes:"
 echo "   'your query'          # Parallel (default)"